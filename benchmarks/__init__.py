@@ -0,0 +1,2 @@
+"""Benchmarks for gridgran on synthetic data (see synthetic.py and
+run_benchmarks.py). Run with python -m benchmarks"""
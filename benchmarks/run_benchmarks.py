@@ -0,0 +1,429 @@
+"""Module with benchmark cases for the main stages of processing - reading
+layers (read), joining points to the grid (prep), checking and shuffling 1km
+cells (check), making output tables (output), writing them (write),
+calculating distance moved (distance), making the water mask (water) and a
+full GridGranulatorGPKG run (end_to_end) - on synthetic data (see
+synthetic.py).
+
+Each case is run in its own process so its peak RSS isn't affected by cases
+run before it. Results are printed and can be appended to a json lines file
+and compared to a baseline file to show regressions, e.g.
+
+    python -m benchmarks --scale la --density mixed --output results.jsonl
+    python -m benchmarks --scale la --density mixed --baseline results.jsonl
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import gridgran
+from benchmarks import synthetic
+
+CLASSIFICATION_DICT = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 49,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 24,
+}
+
+CLASSIFICATION_SETTINGS = {
+    "classification_dict": CLASSIFICATION_DICT,
+    "cls_2_threshold_1000m": False,
+    "cls_2_threshold_500m": False,
+    "cls_2_threshold_250m": False,
+    "cls_2_threshold_125m": False
+}
+
+
+def get_peak_rss_mb():
+    """Returns peak resident set size of this process in MB (None where the
+    resource module isn't available, i.e. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+def prep(grid_125m, points, options):
+    """Returns grid and points joined and aggregated to 125m"""
+    return gridgran.prep_points_and_grid_from_dataframes(
+        grid_125m, points, CLASSIFICATION_DICT,
+        join_method=options['join_method'],
+        compact_dtypes=options['compact_dtypes'],
+        sparse=options['sparse'])
+
+
+def check_cells(df_grid_125, df_grid_pt, km_origins, checker='dataframe'):
+    """Checks and shuffles every populated 1km cell in turn, as
+    GridGranulatorGPKG does with n_jobs=None, and returns lists of dissolved
+    grids and points"""
+    df_grid_125, grid_offsets = gridgran.partition_by_id(df_grid_125,
+                                                         'ID1000m')
+    df_grid_pt, pt_offsets = gridgran.partition_by_id(df_grid_pt, 'ID1000m')
+    grid_list = []
+    point_list = []
+    for cell_id in gridgran.get_populated_ids(df_grid_pt, 'ID1000m'):
+        grid_diss, point_final = gridgran.granulate_cell(
+            gridgran.get_partition(df_grid_125, grid_offsets, cell_id),
+            gridgran.get_partition(df_grid_pt, pt_offsets, cell_id),
+            km_origins,
+            CLASSIFICATION_SETTINGS,
+            checker=checker)
+        if grid_diss is not None:
+            grid_list.append(grid_diss)
+            point_list.append(point_final)
+    return grid_list, point_list
+
+
+def write_layers(folder, grid_1km, grid_125m, points, reader=None):
+    """Writes layers to folder, as a geopackage or (for the 'parquet'
+    reader) a GeoParquet file per layer, and returns path to read them
+    from"""
+    layers = [('1000m', grid_1km), ('125m', grid_125m), ('points', points)]
+    if reader == 'parquet':
+        for layer, gdf in layers:
+            gdf.to_parquet(folder.joinpath(f'{layer}.parquet'))
+        return folder
+    gpkg = folder.joinpath('in.gpkg')
+    for layer, gdf in layers:
+        gdf.to_file(gpkg, layer=layer, driver='GPKG')
+    return gpkg
+
+
+def get_out_path(folder, output_format):
+    """Returns output path in folder - a geopackage for 'gpkg', else a
+    folder (see gridgran.OUTPUT_BACKENDS)"""
+    return folder.joinpath('out.gpkg' if output_format == 'gpkg' else 'out')
+
+
+def bench_read(grid_1km, grid_125m, points, options):
+    """Times reading the points, 1km and 125m layers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_layers(Path(tmp), grid_1km, grid_125m, points,
+                            options['reader'])
+        start = time.perf_counter()
+        for layer, prefixes in gridgran.READ_COLUMN_PREFIXES.items():
+            gridgran.read_layer(path, layer=layer, reader=options['reader'],
+                                column_prefixes=prefixes)
+        return time.perf_counter() - start
+
+
+def bench_prep(grid_1km, grid_125m, points, options):
+    """Times joining points to the grid"""
+    start = time.perf_counter()
+    prep(grid_125m, points, options)
+    return time.perf_counter() - start
+
+
+def bench_check(grid_1km, grid_125m, points, options):
+    """Times checking and shuffling all populated 1km cells"""
+    df_grid_125, df_grid_pt = prep(grid_125m, points, options)
+    km_origins = gridgran.get_km_origins(grid_1km, id_col='GridID1km')
+    start = time.perf_counter()
+    check_cells(df_grid_125, df_grid_pt, km_origins, options['checker'])
+    return time.perf_counter() - start
+
+
+def bench_output(grid_1km, grid_125m, points, options):
+    """Times making output tables from checked 1km cells"""
+    df_grid_125, df_grid_pt = prep(grid_125m, points, options)
+    km_origins = gridgran.get_km_origins(grid_1km, id_col='GridID1km')
+    grid_list, point_list = check_cells(df_grid_125, df_grid_pt, km_origins,
+                                        options['checker'])
+    start = time.perf_counter()
+    gridgran.make_output_tables(grid_list, point_list, points, km_origins,
+                                CLASSIFICATION_DICT,
+                                integer_ids=options['compact_dtypes'])
+    return time.perf_counter() - start
+
+
+def bench_write(grid_1km, grid_125m, points, options):
+    """Times writing output tables with the output_format backend"""
+    df_grid_125, df_grid_pt = prep(grid_125m, points, options)
+    km_origins = gridgran.get_km_origins(grid_1km, id_col='GridID1km')
+    grid_list, point_list = check_cells(df_grid_125, df_grid_pt, km_origins,
+                                        options['checker'])
+    tables = gridgran.make_output_tables(grid_list, point_list, points,
+                                         km_origins, CLASSIFICATION_DICT)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        start = time.perf_counter()
+        backend = gridgran.OUTPUT_BACKENDS[options['output_format']](
+            get_out_path(tmp, options['output_format']), 'grid',
+            tmp.joinpath('out.csv'), options['point_partitions'], km_origins)
+        backend.write(*tables)
+        backend.close()
+        return time.perf_counter() - start
+
+
+def bench_distance(grid_1km, grid_125m, points, options):
+    """Times calculating distance moved by points"""
+    df_grid_125, df_grid_pt = prep(grid_125m, points, options)
+    km_origins = gridgran.get_km_origins(grid_1km, id_col='GridID1km')
+    _, point_list = check_cells(df_grid_125, df_grid_pt, km_origins,
+                                options['checker'])
+    point_final = pd.concat(point_list)
+    start = time.perf_counter()
+    gridgran.calculate_dist_point_moved(point_final, points, None,
+                                        km_origins=km_origins)
+    return time.perf_counter() - start
+
+
+def bench_water(grid_1km, grid_125m, points, options):
+    """Times making the water mask of the 125m grid against a synthetic
+    coastline"""
+    land = synthetic.make_synthetic_land(grid_1km)
+    start = time.perf_counter()
+    gridgran.remove_water_cells(grid_125m, land, return_water=True,
+                                method=options['water_method'])
+    return time.perf_counter() - start
+
+
+def bench_end_to_end(grid_1km, grid_125m, points, options):
+    """Times a full GridGranulatorGPKG run, including reading and writing
+    layers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        path = write_layers(tmp, grid_1km, grid_125m, points,
+                            options['reader'])
+        start = time.perf_counter()
+        gridgran.GridGranulatorGPKG(path,
+                                    get_out_path(tmp,
+                                                 options['output_format']),
+                                    'grid',
+                                    tmp.joinpath('out.csv'),
+                                    CLASSIFICATION_SETTINGS,
+                                    join_method=options['join_method'],
+                                    checker=options['checker'],
+                                    n_jobs=options['n_jobs'],
+                                    compact_dtypes=options['compact_dtypes'],
+                                    sparse=options['sparse'],
+                                    reader=options['reader'],
+                                    output_format=options['output_format'],
+                                    point_partitions=options[
+                                        'point_partitions'])
+        return time.perf_counter() - start
+
+
+CASES = {
+    'read': bench_read,
+    'prep': bench_prep,
+    'check': bench_check,
+    'output': bench_output,
+    'write': bench_write,
+    'distance': bench_distance,
+    'water': bench_water,
+    'end_to_end': bench_end_to_end,
+}
+
+
+def run_case(case, scale, density, seed=0, options=None):
+    """Runs benchmark case on synthetic data and returns record of results
+
+    Parameters:
+    -----------
+    case : str
+        Key of CASES
+
+    scale : str/int
+        Key of synthetic.SCALES or number of 1km cells
+
+    density : str
+        One of 'rural', 'suburban', 'urban' or 'mixed'
+
+    seed : int
+        Seed for synthetic data and processing (DEFAULT=0)
+
+    options : dict/None
+        join_method, checker, n_jobs, compact_dtypes, sparse, reader,
+        output_format, point_partitions and water_method used by cases
+        (DEFAULT=None - uses 'arithmetic', 'dataframe', None, False, False,
+        None, 'gpkg', None and 'strtree')
+
+    Returns:
+    --------
+    record : dict
+        Case, data sizes, seconds, cells_per_sec, points_per_sec and
+        peak_rss_mb (of the process, including making the data)
+    """
+    options = dict({'join_method': 'arithmetic', 'checker': 'dataframe',
+                    'n_jobs': None, 'compact_dtypes': False,
+                    'sparse': False, 'reader': None,
+                    'output_format': 'gpkg', 'point_partitions': None,
+                    'water_method': 'strtree'},
+                   **(options or {}))
+    grid_1km, grid_125m, points = synthetic.make_synthetic_data(
+        scale, density, seed)
+    n_populated = len(np.unique(gridgran.get_km_key(points.x, points.y)))
+    np.random.seed(seed)
+    with warnings.catch_warnings():
+        # pandas deprecation warnings would otherwise flood the output
+        warnings.simplefilter('ignore', FutureWarning)
+        seconds = CASES[case](grid_1km, grid_125m, points, options)
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'case': case,
+        'scale': scale,
+        'density': density,
+        'seed': seed,
+        **options,
+        'n_cells_1km': len(grid_1km),
+        'n_populated_cells_1km': n_populated,
+        'n_points': len(points),
+        'seconds': seconds,
+        'cells_per_sec': n_populated / seconds if seconds else None,
+        'points_per_sec': len(points) / seconds if seconds else None,
+        'peak_rss_mb': get_peak_rss_mb(),
+    }
+
+
+def run_case_in_new_process(*args, **kwargs):
+    """Runs run_case() in a new process so peak RSS is only that of the
+    case"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_case, *args, **kwargs).result()
+
+
+def compare_to_baseline(records, baseline_records, tolerance=0.2):
+    """Returns messages for records that are slower or use more memory than
+    the latest baseline record with the same case, scale, density and
+    options by more than tolerance (a proportion)
+
+    Parameters:
+    -----------
+    records : list
+        Records as returned by run_case()
+
+    baseline_records : list
+        Earlier records
+
+    tolerance : float
+        Proportion cells_per_sec can fall by or peak_rss_mb can rise by
+        before it is reported (DEFAULT=0.2)
+
+    Returns:
+    --------
+    regressions : list
+        Message for each regression
+    """
+    def key(record):
+        return (record['case'], str(record['scale']), record['density'],
+                record.get('join_method'), record.get('checker'),
+                record.get('n_jobs'), record.get('compact_dtypes', False),
+                record.get('sparse', False), record.get('reader'),
+                record.get('output_format', 'gpkg'),
+                record.get('point_partitions'),
+                record.get('water_method', 'strtree'))
+    baseline = {key(record): record for record in baseline_records}
+    regressions = []
+    for record in records:
+        base = baseline.get(key(record))
+        if base is None:
+            continue
+        if (base['cells_per_sec'] and record['cells_per_sec'] <
+                base['cells_per_sec'] * (1 - tolerance)):
+            regressions.append(
+                f"{record['case']}: {record['cells_per_sec']:.1f} cells/sec "
+                f"vs {base['cells_per_sec']:.1f} in baseline")
+        if (base['peak_rss_mb'] and record['peak_rss_mb'] and
+                record['peak_rss_mb'] > base['peak_rss_mb'] *
+                (1 + tolerance)):
+            regressions.append(
+                f"{record['case']}: peak RSS {record['peak_rss_mb']:.0f}MB "
+                f"vs {base['peak_rss_mb']:.0f}MB in baseline")
+    return regressions
+
+
+def read_records(path):
+    """Returns records from json lines file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks gridgran on synthetic data')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES),
+                        default=list(CASES))
+    parser.add_argument('--scale', default='la',
+                        help=f'One of {list(synthetic.SCALES)} or a number '
+                             f'of 1km cells')
+    parser.add_argument('--density', default='mixed',
+                        choices=list(synthetic.DENSITY_PROFILES) + ['mixed'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--join-method', default='arithmetic',
+                        choices=['sjoin', 'arithmetic'])
+    parser.add_argument('--checker', default='dataframe',
+                        choices=list(gridgran.DISCLOSURE_CHECKERS))
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help='n_jobs for end_to_end case')
+    parser.add_argument('--compact-dtypes', action='store_true')
+    parser.add_argument('--sparse', action='store_true')
+    parser.add_argument('--reader', default=None,
+                        choices=list(gridgran.READERS),
+                        help='reader for read and end_to_end cases')
+    parser.add_argument('--output-format', default='gpkg',
+                        choices=list(gridgran.OUTPUT_BACKENDS),
+                        help='output backend for write and end_to_end '
+                             'cases')
+    parser.add_argument('--point-partitions', default=None,
+                        choices=list(gridgran.POINT_PARTITIONS),
+                        help='partitioning of point tables for write and '
+                             'end_to_end cases')
+    parser.add_argument('--water-method', default='strtree',
+                        choices=list(gridgran.WATER_METHODS),
+                        help='method for water case')
+    parser.add_argument('--output', type=Path,
+                        help='json lines file results are appended to')
+    parser.add_argument('--baseline', type=Path,
+                        help='json lines file of earlier results to compare '
+                             'to')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+    scale = args.scale if args.scale in synthetic.SCALES else int(args.scale)
+    options = {'join_method': args.join_method, 'checker': args.checker,
+               'n_jobs': args.n_jobs, 'compact_dtypes': args.compact_dtypes,
+               'sparse': args.sparse, 'reader': args.reader,
+               'output_format': args.output_format,
+               'point_partitions': args.point_partitions,
+               'water_method': args.water_method}
+    records = []
+    for case in args.cases:
+        record = run_case_in_new_process(case, scale, args.density,
+                                         args.seed, options)
+        peak = record['peak_rss_mb']
+        print(f"{case}: {record['seconds']:.2f}s, "
+              f"{record['cells_per_sec']:.1f} cells/sec, "
+              f"{record['points_per_sec']:.0f} points/sec, "
+              f"peak RSS {'n/a' if peak is None else f'{peak:.0f}MB'}")
+        records.append(record)
+    if args.output:
+        with open(args.output, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+    if args.baseline:
+        regressions = compare_to_baseline(records,
+                                          read_records(args.baseline),
+                                          args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,254 @@
+"""Module to make synthetic BNG aligned 1km and 125m grids and household
+points at a chosen density and scale, in the same form as the layers read by
+GridGranulatorGPKG ('1000m', '125m' and 'points'), so throughput can be
+measured without real (disclosive) data.
+
+1km cells are laid out in a block as close to square as possible. Each
+populated 1km cell has some of its 125m cells built up and households are
+placed uniformly within those, which gives the mix of empty, sparse and
+dense cells the disclosure checks have to deal with.
+"""
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import gridgran
+
+# Proportion of 1km cells with any households, mean households in a
+# populated 1km cell and proportion of its 125m cells that are built up
+DENSITY_PROFILES = {
+    'rural': {
+        'populated_prp': 0.4,
+        'households_per_km': 25,
+        'built_up_prp': 0.1,
+    },
+    'suburban': {
+        'populated_prp': 0.9,
+        'households_per_km': 800,
+        'built_up_prp': 0.5,
+    },
+    'urban': {
+        'populated_prp': 1.0,
+        'households_per_km': 4000,
+        'built_up_prp': 0.9,
+    },
+}
+
+# Share of 1km cells of each profile for 'mixed' density (roughly England
+# and Wales)
+MIXED_DENSITY_SHARES = {
+    'rural': 0.75,
+    'suburban': 0.2,
+    'urban': 0.05,
+}
+
+# Number of 1km cells
+SCALES = {
+    'tiny': 4,
+    'la': 400,
+    'county': 4000,
+    'region': 20000,
+    'national': 151000,
+}
+
+ORIGIN = (400000, 100000)
+LEVEL_DIGITS = [1, 2, 3, 4]
+
+
+def get_n_cells(scale):
+    """Returns number of 1km cells for scale - either a key of SCALES or a
+    number of cells"""
+    if isinstance(scale, str):
+        return SCALES[scale]
+    return int(scale)
+
+
+def make_km_origins(n_cells, origin=ORIGIN):
+    """Returns dataframe of 1km prefixes and lower left coordinates (as
+    gridgran.get_km_origins()) for n_cells 1km cells laid out in a block as
+    close to square as possible
+
+    Parameters:
+    -----------
+    n_cells : int
+        Number of 1km cells
+
+    origin : tuple
+        Easting and northing of lower left corner of block (DEFAULT=ORIGIN)
+
+    Returns:
+    --------
+    km_origins : pd.DataFrame
+        DataFrame indexed by 1km prefix with x and y columns
+    """
+    width = int(np.ceil(np.sqrt(n_cells)))
+    pos = np.arange(n_cells)
+    x = origin[0] + (pos % width) * 1000
+    y = origin[1] + (pos // width) * 1000
+    # Prefix is a letter followed by 8 digits as with real IDs, here made
+    # from the easting and northing in km
+    prefixes = [f'S{kx:04d}{ky:04d}' for kx, ky in zip(x // 1000, y // 1000)]
+    return pd.DataFrame({'x': x.astype('int64'), 'y': y.astype('int64')},
+                        index=prefixes)
+
+
+def get_125m_ids(prefixes):
+    """Returns IDs of the 64 125m cells in each 1km prefix"""
+    suffixes = [f'{d125}{d250}{d500}' for d500 in LEVEL_DIGITS
+                for d250 in LEVEL_DIGITS for d125 in LEVEL_DIGITS]
+    return np.array([prefix + suffix for prefix in prefixes
+                     for suffix in suffixes], dtype=object)
+
+
+def get_cell_profiles(n_cells, density, rng):
+    """Returns density profile name for each 1km cell"""
+    if density != 'mixed':
+        return np.full(n_cells, density, dtype=object)
+    return rng.choice(list(MIXED_DENSITY_SHARES), size=n_cells,
+                      p=list(MIXED_DENSITY_SHARES.values()))
+
+
+def make_points(km_origins, density, rng):
+    """Returns dataframe of household points (uprn, x, y, people) within
+    km_origins' 1km cells
+
+    Parameters:
+    -----------
+    km_origins : pd.DataFrame
+        1km prefixes and lower left coordinates as returned by
+        make_km_origins()
+
+    density : str
+        Key of DENSITY_PROFILES or 'mixed'
+
+    rng : np.random.Generator
+        Random number generator
+
+    Returns:
+    --------
+    points : pd.DataFrame
+        Household points
+    """
+    n_cells = len(km_origins)
+    profiles = get_cell_profiles(n_cells, density, rng)
+    xs = []
+    ys = []
+    for name, profile in DENSITY_PROFILES.items():
+        cells = np.flatnonzero(profiles == name)
+        cells = cells[rng.random(len(cells)) < profile['populated_prp']]
+        if not len(cells):
+            continue
+        # Built up 125m cells (at least one per populated 1km cell)
+        n_built_up = max(1, round(64 * profile['built_up_prp']))
+        built_up = np.argsort(rng.random((len(cells), 64)),
+                              axis=1)[:, :n_built_up]
+        n_households = rng.poisson(profile['households_per_km'],
+                                   size=len(cells))
+        cell = np.repeat(cells, n_households)
+        sub_cell = built_up[np.repeat(np.arange(len(cells)), n_households),
+                            rng.integers(n_built_up, size=len(cell))]
+        xs.append(km_origins.x.values[cell] + (sub_cell % 8) * 125 +
+                  rng.random(len(cell)) * 125)
+        ys.append(km_origins.y.values[cell] + (sub_cell // 8) * 125 +
+                  rng.random(len(cell)) * 125)
+    x = np.round(np.concatenate(xs), 2) if xs else np.array([])
+    y = np.round(np.concatenate(ys), 2) if ys else np.array([])
+    return pd.DataFrame({
+        'uprn': np.arange(len(x), dtype='int64') + 10 ** 10,
+        'x': x,
+        'y': y,
+        'people': 1 + rng.poisson(1.4, size=len(x)),
+    })
+
+
+def make_synthetic_data(scale='la', density='mixed', seed=0, origin=ORIGIN):
+    """Returns synthetic 1km grid, 125m grid and points
+
+    Parameters:
+    -----------
+    scale : str/int
+        Key of SCALES or number of 1km cells (DEFAULT='la')
+
+    density : str
+        One of 'rural', 'suburban', 'urban' or 'mixed' (DEFAULT='mixed')
+
+    seed : int
+        Seed for random number generator (DEFAULT=0)
+
+    origin : tuple
+        Easting and northing of lower left corner (DEFAULT=ORIGIN)
+
+    Returns:
+    --------
+    grid_1km : gpd.GeoDataFrame
+        1km grid with id and GridID1km columns
+
+    grid_125m : gpd.GeoDataFrame
+        125m grid with id and GridID125m columns
+
+    points : gpd.GeoDataFrame
+        Points with uprn, x, y and people columns
+    """
+    rng = np.random.default_rng(seed)
+    km_origins = make_km_origins(get_n_cells(scale), origin)
+    ids_1km = km_origins.index.values + '000'
+    ids_125m = get_125m_ids(km_origins.index.values)
+    grid_1km = gpd.GeoDataFrame(
+        {'id': np.arange(len(ids_1km)), 'GridID1km': ids_1km},
+        geometry=gridgran.get_cell_geometries(ids_1km, km_origins),
+        crs=27700)
+    grid_125m = gpd.GeoDataFrame(
+        {'id': np.arange(len(ids_125m)), 'GridID125m': ids_125m},
+        geometry=gridgran.get_cell_geometries(ids_125m, km_origins),
+        crs=27700)
+    points = make_points(km_origins, density, rng)
+    points = gpd.GeoDataFrame(
+        points, geometry=gpd.points_from_xy(points.x, points.y), crs=27700)
+    return grid_1km, grid_125m, points
+
+
+def make_synthetic_land(grid_1km, seed=0, n_vertices=20000):
+    """Returns synthetic land polygon, in the form of the BFC highwater
+    layer used as a water mask, whose coast is a random walk across the
+    middle of grid_1km so roughly half of the 125m cells are in the sea
+
+    Parameters:
+    -----------
+    grid_1km : gpd.GeoDataFrame
+        1km grid as returned by make_synthetic_data()
+
+    seed : int
+        Seed for random number generator (DEFAULT=0)
+
+    n_vertices : int
+        Number of vertices along the coast (DEFAULT=20000)
+
+    Returns:
+    --------
+    land : gpd.GeoDataFrame
+        Land polygon with CTRY21NM column
+    """
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = grid_1km.total_bounds
+    x = np.linspace(minx - 1000, maxx + 1000, n_vertices)
+    walk = np.cumsum(rng.normal(size=n_vertices))
+    walk = (walk - walk.mean()) / (np.abs(walk).max() or 1)
+    y = (miny + maxy) / 2 + walk * (maxy - miny) / 4
+    coords = np.column_stack([np.append(x, [maxx + 1000, minx - 1000]),
+                              np.append(y, [miny - 1000, miny - 1000])])
+    return gpd.GeoDataFrame({'CTRY21NM': ['Land']},
+                            geometry=[shapely.Polygon(coords)], crs=27700)
+
+
+def write_synthetic_gpkg(path, scale='la', density='mixed', seed=0,
+                         origin=ORIGIN):
+    """Writes synthetic data to geopackage with '1000m', '125m' and 'points'
+    layers, as read by GridGranulatorGPKG, and returns path. See
+    make_synthetic_data() for parameters."""
+    grid_1km, grid_125m, points = make_synthetic_data(scale, density, seed,
+                                                      origin)
+    for layer, gdf in [('1000m', grid_1km), ('125m', grid_125m),
+                       ('points', points)]:
+        gdf.to_file(path, layer=layer, driver='GPKG')
+    return path
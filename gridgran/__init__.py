@@ -1,10 +1,20 @@
+from .bng import *
+from .id_codec import *
+from .readers import *
+from .writers import *
 from .utils import *
 from .errors import *
+from .metrics import *
 from .top_down_checks import *
 from .grid_disclosure_checker import *
+from .quadtree_disclosure_checker import *
 from .grid_granulator import *
 from .helpers import *
+from .output_writer import *
+from .checkpoint import *
 from .iterate_cells import *
+from .partition import *
+from .sparse import *
 from .shuffle_helpers import *
 from .prep_data_for_processing import *
 from .grid_granulator_multi_core import *
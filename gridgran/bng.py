@@ -0,0 +1,340 @@
+"""Module with functions to work with British National Grid (BNG) cell IDs
+arithmetically rather than through spatial joins.
+
+Cell IDs take the form <1km prefix><125m digit><250m digit><500m digit>,
+where each digit (1-4) is the quadrant of the cell within its parent:
+    1 -> south west, 2 -> south east, 3 -> north west, 4 -> north east
+and a digit of 0 indicates the ID refers to a coarser level (e.g.
+J80070856011 is a 250m cell, J80070856000 a 1km cell).
+
+The numbering of the 1km prefix is not derived here - prefixes are looked up
+from the lower left coordinates of the 1km cells present in a grid layer.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+import shapely.geometry
+
+import gridgran
+
+CELL_SIZES = {
+    'ID125m': 125,
+    'ID250m': 250,
+    'ID500m': 500,
+    'ID1000m': 1000,
+}
+
+KM_KEY_FACTOR = 10000  # Northings (in km) are always below this in BNG
+
+
+def get_km_key(x, y):
+    """Returns integer key for 1km cells containing coordinates x and y
+
+    Parameters:
+    -----------
+    x : np.array
+        Eastings
+
+    y : np.array
+        Northings
+
+    Returns:
+    --------
+    key : np.array
+        Integer key unique to each 1km cell
+    """
+    kx = np.floor_divide(np.asarray(x, dtype='float64'), 1000)
+    ky = np.floor_divide(np.asarray(y, dtype='float64'), 1000)
+    return (kx * KM_KEY_FACTOR + ky).astype('int64')
+
+
+def get_km_origins(gdf_grid, id_col='GridID125m'):
+    """Returns dataframe of 1km ID prefixes with the lower left coordinates
+    of the 1km cell they refer to. Any grid layer (125m-1km) can be used as
+    each cell's centroid falls within its 1km parent.
+
+    Parameters:
+    -----------
+    gdf_grid : gpd.GeoDataFrame
+        Grid cells in EPSG:27700
+
+    id_col : str
+        Column holding cell IDs (DEFAULT='GridID125m')
+
+    Returns:
+    --------
+    km_origins : pd.DataFrame
+        DataFrame indexed by 1km prefix (ID minus last 3 characters) with x
+        and y columns for the lower left corner of the 1km cell
+    """
+    bounds = gdf_grid.geometry.bounds
+    x = np.floor_divide((bounds.minx + bounds.maxx).values / 2, 1000) * 1000
+    y = np.floor_divide((bounds.miny + bounds.maxy).values / 2, 1000) * 1000
+    km_origins = pd.DataFrame({'x': x.astype('int64'),
+                               'y': y.astype('int64')},
+                              index=gdf_grid[id_col].str[:-3].values)
+    km_origins = km_origins[~km_origins.index.duplicated(keep='first')]
+    return km_origins
+
+
+def get_ids_from_coords(x, y, km_origins):
+    """Returns 125m cell IDs for coordinates x and y. Cells are half-open
+    intervals (i.e. a point on the border between two cells will be assigned
+    to the cell to the north/east), so every point falls in exactly one cell.
+    Points on the east/north edge of a 1km cell whose neighbour is not in
+    km_origins (e.g. the outer edge of the grid) are assigned to the edge
+    cell, as they would be by a spatial join.
+
+    Parameters:
+    -----------
+    x : np.array
+        Eastings
+
+    y : np.array
+        Northings
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        get_km_origins()
+
+    Returns:
+    --------
+    ids : np.array
+        Object array of 125m IDs, with None where coordinates do not fall
+        within a 1km cell in km_origins
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    km_index = pd.Index(get_km_key(km_origins.x.values,
+                                   km_origins.y.values))
+    km_pos = km_index.get_indexer(get_km_key(x, y))
+    ox = x - np.floor_divide(x, 1000) * 1000
+    oy = y - np.floor_divide(y, 1000) * 1000
+    # Look up points outside km_origins on the west/south border of their
+    # 1km cell in the cell to the west, south and south west, moving them
+    # into the last 125m column/row of that cell
+    for dx, dy in ((1000, 0), (0, 1000), (1000, 1000)):
+        edge = (km_pos < 0) & ((ox == 0) | (dx == 0)) & \
+            ((oy == 0) | (dy == 0))
+        if not edge.any():
+            continue
+        edge = np.flatnonzero(edge)
+        pos = km_index.get_indexer(get_km_key(x[edge] - dx, y[edge] - dy))
+        edge, pos = edge[pos >= 0], pos[pos >= 0]
+        km_pos[edge] = pos
+        ox[edge] = np.where(dx, 875, ox[edge])
+        oy[edge] = np.where(dy, 875, oy[edge])
+    d500 = 1 + (ox // 500) + 2 * (oy // 500)
+    d250 = 1 + ((ox % 500) // 250) + 2 * ((oy % 500) // 250)
+    d125 = 1 + ((ox % 250) // 125) + 2 * ((oy % 250) // 125)
+    digits = (d125 * 100 + d250 * 10 + d500).astype('int64')
+    # Build strings once per unique cell rather than once per point
+    codes, uniques = pd.factorize(km_pos * 1000 + digits)
+    prefixes = km_origins.index.values
+    unique_ids = np.array(
+        [None if u < 0 else f'{prefixes[u // 1000]}{u % 1000}'
+         for u in uniques], dtype=object)
+    return unique_ids[codes]
+
+
+def get_cell_bounds(ids, km_origins):
+    """Returns bounds of cells of any level (125m-1km) calculated from their
+    IDs - i.e. the lower left corner of the 1km cell plus the offsets of the
+    500m, 250m and 125m quadrants that are present in the ID
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        Cell IDs (or int64 codes of cell IDs - see id_codec)
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        get_km_origins()
+
+    Returns:
+    --------
+    minx, miny, maxx, maxy : np.array
+        Bounds of cells (NaN where ID's 1km prefix is not in km_origins)
+    """
+    # Parse strings once per unique cell rather than once per row
+    codes, uniques = pd.factorize(np.asarray(ids))
+    if uniques.dtype.kind in 'iuf':
+        uniques = gridgran.decode_ids(uniques)
+    km_pos = km_origins.index.get_indexer([i[:-3] for i in uniques])
+    digits = np.array([int(i[-3:]) for i in uniques], dtype='int64')
+    minx = km_origins.x.values.take(km_pos).astype('float64')
+    miny = km_origins.y.values.take(km_pos).astype('float64')
+    minx[km_pos < 0] = np.nan
+    miny[km_pos < 0] = np.nan
+    size = np.full(len(uniques), CELL_SIZES['ID1000m'], dtype='float64')
+    # A digit of 0 means the ID stops at a coarser level
+    for level, digit in [('ID500m', digits % 10),
+                         ('ID250m', (digits // 10) % 10),
+                         ('ID125m', digits // 100)]:
+        present = digit > 0
+        minx += np.where(present, CELL_SIZES[level] * ((digit - 1) % 2), 0)
+        miny += np.where(present, CELL_SIZES[level] * ((digit - 1) // 2), 0)
+        size[present] = CELL_SIZES[level]
+    minx, miny, size = minx[codes], miny[codes], size[codes]
+    return minx, miny, minx + size, miny + size
+
+
+def get_cell_centroids(ids, km_origins):
+    """Returns centroids of cells calculated from their IDs (the inverse of
+    get_ids_from_coords() for 125m IDs)
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        Cell IDs (or int64 codes of cell IDs - see id_codec)
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        get_km_origins()
+
+    Returns:
+    --------
+    x : np.array
+        Eastings of centroids (NaN where ID's 1km prefix is not in
+        km_origins)
+
+    y : np.array
+        Northings of centroids (NaN where ID's 1km prefix is not in
+        km_origins)
+    """
+    minx, miny, maxx, maxy = get_cell_bounds(ids, km_origins)
+    return (minx + maxx) / 2, (miny + maxy) / 2
+
+
+def get_cell_geometries(ids, km_origins):
+    """Returns square polygons of cells of any level (125m-1km) built from
+    their IDs. As every cell is an aligned square, this replaces joining to
+    the 125m polygons and dissolving them.
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        Cell IDs (or int64 codes of cell IDs - see id_codec)
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        get_km_origins()
+
+    Returns:
+    --------
+    geometries : np.array
+        Object array of shapely Polygons (None where ID's 1km prefix is not
+        in km_origins)
+    """
+    minx, miny, maxx, maxy = get_cell_bounds(ids, km_origins)
+    if hasattr(shapely, 'box'):
+        # Vectorised in shapely >= 2
+        return shapely.box(minx, miny, maxx, maxy)
+    return np.array([None if np.isnan(b[0]) else shapely.geometry.box(*b)
+                     for b in zip(minx, miny, maxx, maxy)], dtype=object)
+
+
+def get_parent_ids(ids, level):
+    """Returns IDs of the parents (at level) of cell IDs - i.e. the
+    vectorised equivalent of utils.make_index()
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        125m IDs (or IDs of any level finer than level)
+
+    level : str
+        Parent level from ['ID125m', 'ID250m', 'ID500m', 'ID1000m']
+
+    Returns:
+    --------
+    parent_ids : np.array
+        Object array of parent IDs
+    """
+    n_zeros = {'ID125m': 0, 'ID250m': 1, 'ID500m': 2, 'ID1000m': 3}[level]
+    ids = np.asarray(ids, dtype=object).astype(str)
+    # Replace the digits finer than level (starting at the 125m digit) in a
+    # 2D array of the IDs' characters, where shorter IDs are null padded
+    chars = ids.view('uint32').reshape(len(ids), ids.dtype.itemsize // 4)
+    rows = np.arange(len(ids))
+    lengths = (chars != 0).sum(axis=1)
+    for i in range(n_zeros):
+        chars[rows, lengths - 3 + i] = ord('0')
+    return chars.view(ids.dtype).ravel().astype(object)
+
+
+def make_id_hierarchy(ids):
+    """Returns dataframe of 250m, 500m and 1km parent IDs for 125m IDs.
+    Strings are only built once per unique ID so this scales with the
+    number of cells rather than number of rows (points)
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        125m IDs (or int64 codes of 125m IDs - see id_codec)
+
+    Returns:
+    --------
+    df : pd.DataFrame
+        Dataframe with ID250m, ID500m and ID1000m columns (index matches ids
+        if a Series is given)
+    """
+    index = ids.index if isinstance(ids, pd.Series) else None
+    if np.asarray(ids).dtype.kind in 'iu':
+        # IDs encoded as int64 codes (see id_codec)
+        return pd.DataFrame({level: gridgran.get_parent_codes(ids, level) for
+                             level in ['ID250m', 'ID500m', 'ID1000m']},
+                            index=index)
+    ids = np.asarray(ids, dtype=object)
+    # Rows are usually grouped by cell (i.e. points joined to grids) so only
+    # hash the first ID in each run of repeated IDs
+    starts = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    if len(ids):
+        starts = np.insert(starts, 0, 0)
+    run_lengths = np.diff(np.append(starts, len(ids)))
+    codes, uniques = pd.factorize(ids[starts])
+    codes = np.repeat(codes, run_lengths)
+    df = pd.DataFrame({level: get_parent_ids(uniques, level)[codes] for
+                       level in ['ID250m', 'ID500m', 'ID1000m']},
+                      index=index)
+    return df
+
+
+def get_tile_refs(x, y, size=10000):
+    """Returns BNG grid references (e.g. 'SU41' for a 10km tile) of the
+    tiles of size metres containing coordinates x and y
+
+    Parameters:
+    -----------
+    x : np.array
+        Eastings
+
+    y : np.array
+        Northings
+
+    size : int
+        Tile size in metres from [100000, 10000, 1000] (DEFAULT=10000)
+
+    Returns:
+    --------
+    refs : np.array
+        Object array of grid references
+    """
+    kx = np.floor_divide(np.asarray(x, dtype='float64'), size).astype('int64')
+    ky = np.floor_divide(np.asarray(y, dtype='float64'), size).astype('int64')
+    # Only build strings once per tile
+    keys, codes = np.unique(kx * KM_KEY_FACTOR + ky, return_inverse=True)
+    n_digits = len(str(100000 // size)) - 1
+    refs = []
+    for key in keys:
+        e, n = [i * size for i in divmod(int(key), KM_KEY_FACTOR)]
+        e_100km, n_100km = e // 100000, n // 100000
+        # 500km then 100km squares are lettered A-Z (without I) from the
+        # north west, 5 columns by 5 rows
+        first = (19 - n_100km) - (19 - n_100km) % 5 + (e_100km + 10) // 5
+        second = (19 - n_100km) * 5 % 25 + e_100km % 5
+        letters = ''.join(chr(65 + i + (i > 7)) for i in [first, second])
+        digits = ''.join(f'{i % 100000 // size:0{n_digits}d}' for i in
+                         [e, n]) if n_digits else ''
+        refs.append(letters + digits)
+    return np.array(refs, dtype=object)[codes]
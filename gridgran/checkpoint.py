@@ -0,0 +1,95 @@
+"""Module with class to checkpoint processed 1km cells to a scratch folder so
+that a long run that stops part way through can be resumed, only processing
+the cells that are missing
+"""
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+import gridgran
+
+CHECKPOINT_MANIFEST = 'manifest.txt'
+CHECKPOINT_SETTINGS = 'settings.json'
+
+
+class CellCheckpointStore:
+    """Class saves the result of each processed 1km cell to its own pickle
+    file within directory and appends the cell's ID to a manifest once the
+    file is complete. Opening the store again with the same settings reads
+    the manifest so cells already done can be loaded rather than processed.
+    """
+
+    def __init__(self, directory, settings):
+        """
+        Class instantiation
+
+        Parameters:
+        -----------
+        directory : Path/str
+            Scratch folder for checkpoint (created if it doesn't exist)
+
+        settings : dict
+            JSON serialisable inputs and settings of the run. If directory
+            already holds a checkpoint made with different settings
+            gridgran.CheckpointMismatchException is raised rather than
+            mixing results from different runs.
+        """
+        self.directory = Path(directory).resolve()
+        self.cell_directory = self.directory.joinpath('cells')
+        self.cell_directory.mkdir(parents=True, exist_ok=True)
+        self.manifest = self.directory.joinpath(CHECKPOINT_MANIFEST)
+        settings = json.dumps(settings, sort_keys=True, default=str)
+        settings_path = self.directory.joinpath(CHECKPOINT_SETTINGS)
+        if settings_path.exists():
+            if settings_path.read_text() != settings:
+                raise gridgran.CheckpointMismatchException(
+                    f'Checkpoint in {self.directory} was made with different '
+                    f'inputs or settings - delete it or use another folder')
+        else:
+            settings_path.write_text(settings)
+        self.done = self.read_manifest()
+
+    def read_manifest(self):
+        """Returns set of cell IDs in manifest. A last line without a newline
+        was cut off part way through writing, so is ignored."""
+        if not self.manifest.exists():
+            return set()
+        lines = self.manifest.read_text().split('\n')
+        return set(line for line in lines[:-1] if line)
+
+    def get_cell_path(self, cell_id):
+        """Returns path of pickle file for cell_id"""
+        return self.cell_directory.joinpath(f'{cell_id}.pkl')
+
+    def is_done(self, cell_id):
+        """Returns True if result for cell_id has been saved"""
+        return str(cell_id) in self.done
+
+    def save(self, cell_id, result):
+        """Saves result of cell_id and adds cell_id to manifest
+
+        Parameters:
+        -----------
+        cell_id : str/int
+            ID of 1km cell
+
+        result : object
+            Picklable result of processing cell (i.e. (grid_diss,
+            point_final) as returned by gridgran.granulate_cell())
+        """
+        cell_path = self.get_cell_path(cell_id)
+        tmp_path = cell_path.with_suffix('.tmp')
+        pd.to_pickle(result, tmp_path)
+        # Only complete files are given the cell's name
+        os.replace(tmp_path, cell_path)
+        with open(self.manifest, 'a') as f:
+            f.write(f'{cell_id}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.add(str(cell_id))
+
+    def load(self, cell_id):
+        """Returns result saved for cell_id"""
+        return pd.read_pickle(self.get_cell_path(cell_id))
@@ -11,3 +11,7 @@ class DataFrameNotOverDisclosureLimitException(Exception):
 
 class ClassificationMismatchException(Exception):
     pass
+
+
+class CheckpointMismatchException(Exception):
+    pass
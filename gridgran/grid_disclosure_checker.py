@@ -20,7 +20,8 @@ class GridDisclosureChecker:
                  cls_2_prp=0,
                  num_iterations=100,
                  sample_increase_frequency=10,
-                 number_to_increase_sample=1):
+                 number_to_increase_sample=1,
+                 metrics=None):
         """
         Class instantiation
 
@@ -80,6 +81,10 @@ class GridDisclosureChecker:
             Number by which to increase the sample size every
             sample_increase_frequency iterations
 
+        metrics : (gridgran.RunMetrics/None)
+            If given, shuffle trials are counted to it (see
+            shuffle_helpers.sample_excess_rows_cls_4()) (DEFAULT = None)
+
         """
         self.df = df
         self.df_grid = df_grid
@@ -93,6 +98,7 @@ class GridDisclosureChecker:
         self.num_iterations = num_iterations
         self.sample_increase_frequency = sample_increase_frequency
         self.number_to_increase_sample = number_to_increase_sample
+        self.metrics = metrics
         self.global_grid_list = []  # list to hold grid dataframes as they are
         # processed
         self.global_grid_pt_list = []  # list to hold point dataframes as they
@@ -130,18 +136,25 @@ class GridDisclosureChecker:
                                                     "ID1000m",
                                                     "ID250m",
                                                     class_dict,
-                                                    cls_2_prp=self.cls_2_prp)
+                                                    cls_2_prp=self.cls_2_prp,
+                                                    metrics=self.metrics)
         if child_cells_valid_500:
             class_dict = self.classification_dict.copy()
             if self.classification_settings["cls_2_threshold_250m"]:
                 class_dict['p_2'] = None
                 class_dict['h_2'] = None
+            df_grid_500, grid_offsets_500 = gridgran.partition_by_id(
+                df_grid_500, "ID500m")
+            df_grid_pt_500, pt_offsets_500 = gridgran.partition_by_id(
+                df_grid_pt_500, "ID500m")
             for id_250 in gridgran.get_children_ids(df_500, "ID500m"):
                 df_grid_500_subset, df_grid_pt_500_subset, df_500_subset = \
                     gridgran.subset_by_id(df_grid_500, df_grid_pt_500,
                                           "ID500m", "ID250m", id_250,
                                           class_dict,
-                                          cls_2_prp=self.cls_2_prp, )
+                                          cls_2_prp=self.cls_2_prp,
+                                          grid_offsets=grid_offsets_500,
+                                          pt_offsets=pt_offsets_500)
                 df_grid_250, df_grid_pt_250, df_250, child_cells_valid_250 = \
                     gridgran.check_cells_children_are_valid(
                         df_500_subset,
@@ -151,12 +164,17 @@ class GridDisclosureChecker:
                         "ID500m",
                         "ID125m",
                         class_dict,
-                        cls_2_prp=self.cls_2_prp)
+                        cls_2_prp=self.cls_2_prp,
+                        metrics=self.metrics)
                 if child_cells_valid_250:
                     class_dict = self.classification_dict.copy()
                     if self.classification_settings["cls_2_threshold_125m"]:
                         class_dict['p_2'] = None
                         class_dict['h_2'] = None
+                    df_grid_250, grid_offsets_250 = gridgran.partition_by_id(
+                        df_grid_250, "ID250m")
+                    df_grid_pt_250, pt_offsets_250 = \
+                        gridgran.partition_by_id(df_grid_pt_250, "ID250m")
                     for id_125 in gridgran.get_children_ids(df_250, "ID250m"):
                         df_grid_250_subset, df_grid_pt_250_subset, \
                             df_250_subset = gridgran.subset_by_id(
@@ -165,7 +183,9 @@ class GridDisclosureChecker:
                                 "ID250m",
                                 "ID125m", id_125,
                                 class_dict,
-                                cls_2_prp=self.cls_2_prp)
+                                cls_2_prp=self.cls_2_prp,
+                                grid_offsets=grid_offsets_250,
+                                pt_offsets=pt_offsets_250)
                         df_grid_125, df_grid_pt_125, df_125, \
                             child_cells_valid_125 = \
                             gridgran.check_cells_children_are_valid(
@@ -176,7 +196,8 @@ class GridDisclosureChecker:
                                 "ID250m",
                                 "ID125m",
                                 class_dict,
-                                cls_2_prp=self.cls_2_prp)
+                                cls_2_prp=self.cls_2_prp,
+                                metrics=self.metrics)
                         if child_cells_valid_125:
                             df_grid_125 = df_grid_125.copy()
                             df_grid_125.loc[:, 'dissolve_id'] = \
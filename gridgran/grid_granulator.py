@@ -3,12 +3,131 @@ Main entry class into package that takes all of the arguments and processes
 the data according to this
 """
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+import random
+
 import geopandas as gpd
-import pandas as pd
+import numpy as np
 from pathlib import Path
 
 import gridgran
 
+# Number of 1km cells submitted to each process ahead of the results being
+# taken (bounds the cells held in memory when n_jobs is set)
+CELLS_IN_FLIGHT_PER_JOB = 4
+
+
+def granulate_cell(df_grid_in_cell,
+                   df_grid_pt_in_cell,
+                   km_origins,
+                   classification_settings,
+                   class_2_threshold_prp=0.05,
+                   checker='dataframe',
+                   seed=None,
+                   metrics=None):
+    """Checks and shuffles a single 1km cell and returns its dissolved grid
+    and points. This is a module level function so it can be sent to worker
+    processes.
+
+    Parameters:
+    -----------
+    df_grid_in_cell : pd.DataFrame
+        125m grid dataframe for the 1km cell
+
+    df_grid_pt_in_cell : pd.DataFrame
+        Grids joined to points for the 1km cell. If df_grid_in_cell is sparse
+        (see gridgran.make_sparse()), rows of empty 125m cells are put back
+        before the cell is checked
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        gridgran.get_km_origins()
+
+    classification_settings : dict
+        Classification settings
+
+    class_2_threshold_prp : float
+        See GridGranulatorGPKG (DEFAULT=0.05)
+
+    checker : str
+        Key of gridgran.DISCLOSURE_CHECKERS (DEFAULT='dataframe')
+
+    seed : int/None
+        If given, random and np.random are seeded with this before the cell
+        is processed so the result doesn't depend on which cells were
+        processed before it (DEFAULT=None)
+
+    metrics : gridgran.RunMetrics/None
+        If given, time taken checking and dissolving the cell is added to
+        'check' and 'dissolve' timers and shuffle trials to the
+        'shuffles_attempted' counter (DEFAULT=None)
+
+    Returns:
+    --------
+    grid_diss : gpd.GeoDataFrame/None
+        Dissolved grid (None if the cell has no population)
+
+    point_final : pd.DataFrame/None
+        Points following movement (None if the cell has no population)
+    """
+    if seed is not None:
+        random.seed(int(seed))
+        np.random.seed(seed)
+    if df_grid_pt_in_cell.p.sum() <= 0:
+        return None, None
+    if metrics is None:
+        metrics = gridgran.NULL_METRICS
+    if gridgran.is_sparse(df_grid_in_cell):
+        df_grid_in_cell, df_grid_pt_in_cell = gridgran.add_empty_rows(
+            df_grid_in_cell, df_grid_pt_in_cell)
+    classification_dict = classification_settings['classification_dict']
+    with metrics.time('check'):
+        df = gridgran.aggregrid(df_grid_pt_in_cell,
+                                classification_dict,
+                                level='ID500m',
+                                template=False,
+                                cls_2_prp=class_2_threshold_prp)
+        gran = gridgran.DISCLOSURE_CHECKERS[checker](
+            df,
+            df_grid_in_cell,
+            df_grid_pt_in_cell,
+            classification_settings,
+            threshold_p=classification_dict['p_3'] + 1,
+            threshold_h=classification_dict['h_3'] + 1,
+            cls_2_prp=class_2_threshold_prp,
+            metrics=metrics
+            )
+        grid_final, point_final = gran.execute()
+    with metrics.time('dissolve'):
+        grid_diss = gridgran.make_dissolved_grid(grid_final, km_origins)
+    return grid_diss, point_final
+
+
+def granulate_cell_with_metrics(*args, **kwargs):
+    """Calls granulate_cell() with a new gridgran.RunMetrics and returns its
+    result along with the cell's timers and counters, so metrics recorded in
+    worker processes can be added to those of the main process (see
+    gridgran.RunMetrics.merge())
+
+    Parameters:
+    -----------
+    See granulate_cell() (other than metrics)
+
+    Returns:
+    --------
+    result : tuple
+        (grid_diss, point_final) as returned by granulate_cell()
+
+    metrics_dict : dict
+        Timers and counters of the cell (see gridgran.RunMetrics.to_dict())
+    """
+    metrics = gridgran.RunMetrics()
+    result = gridgran.granulate_cell(*args, metrics=metrics, **kwargs)
+    return result, metrics.to_dict()
+
 
 class GridGranulatorGPKG:
     """Class to take input paths and parameters, iterate over 1km grids and
@@ -22,7 +141,20 @@ class GridGranulatorGPKG:
                  classification_settings,
                  path_to_waterline=None,
                  class_2_threshold_prp=0.05,
-                 fill_values_below_threshold_with='minimum'):
+                 fill_values_below_threshold_with='minimum',
+                 join_method='sjoin',
+                 integer_ids=False,
+                 checker='dataframe',
+                 n_jobs=None,
+                 write_batch_size=None,
+                 checkpoint_dir=None,
+                 metrics=None,
+                 metrics_json=None,
+                 compact_dtypes=False,
+                 sparse=False,
+                 reader=None,
+                 output_format='gpkg',
+                 point_partitions=None):
         """ Initialisation
 
         Parameters:
@@ -30,7 +162,9 @@ class GridGranulatorGPKG:
         gpkg_path : Path/str
             Path to geopackage containing 1000m and 125m grids, as well as
             points layer. The names of these
-            layers should be '1000m', '125m' and 'points' (if present)
+            layers should be '1000m', '125m' and 'points' (if present). Can
+            also be a folder of GeoParquet files named after the layers
+            (1000m.parquet, 125m.parquet and points.parquet)
 
         out_path : Path/str
             Path to geopackage to which output should be save (it can be the \
@@ -58,11 +192,116 @@ class GridGranulatorGPKG:
               to parent level.
 
         fill_values_below_threshold_with : str
-        Options ['minimum', 'star', 'null'] -
+        Options ['minimum', 'star', 'null', 'flag'] -
         In the output grid, cells that finish below the minimum threshold
         will need to be filled with a dummy value so as no to identify
         individuals. The options are 'minimum' (the minimum threshold value),
-        'star' (asterisk '*') or 'null'/NA. (Default='minimum')
+        'star' (asterisk '*'), 'null'/NA or 'flag' (<NA> in nullable
+        integer p/h columns with p_suppressed/h_suppressed flag columns).
+        (Default='minimum')
+
+        join_method : str
+        Options ['sjoin', 'arithmetic'] - method used to join points to
+        125m cells. 'sjoin' spatially joins points to the 125m polygons,
+        'arithmetic' calculates each point's cell from its coordinates
+        (see gridgran.join_pts_to_grid()). (Default='sjoin')
+
+        integer_ids : bool
+        If True, cell IDs are held as int64 codes while processing and only
+        decoded to strings for output (see gridgran.encode_ids()). This
+        reduces memory use and speeds up grouping/joining on large areas.
+        Output is the same either way. (Default=False)
+
+        checker : str
+        Options ['dataframe', 'quadtree'] - implementation used to check and
+        shuffle each 1km cell. 'dataframe' uses GridDisclosureChecker,
+        'quadtree' uses the array backed QuadtreeDisclosureChecker which
+        gives the same results. (Default='dataframe')
+
+        n_jobs : int/None
+        Number of processes used to check and shuffle 1km cells (-1 uses
+        all CPUs). If set, each 1km cell is processed with its own seed
+        drawn from np.random before processing starts, so output for a
+        fixed seed is the same whatever the number of processes. If None,
+        cells are processed in a single process drawing from one shared
+        random stream (the global random state) in turn, as in earlier
+        versions, so for the same seed its output differs from that of any
+        n_jobs value (unless checkpoint_dir is set). (Default=None)
+
+        write_batch_size : int/None
+        If set, outputs are written while processing continues, appending
+        every write_batch_size populated 1km cells to the output layer and
+        csvs (see gridgran.StreamingOutputWriter), so memory use doesn't
+        grow with the area processed. If None, all cells are held and
+        written at the end. (Default=None)
+
+        checkpoint_dir : Path/str/None
+        If set, the result of each processed 1km cell is saved to this
+        scratch folder as soon as it is returned, along with a manifest of
+        cells done (see gridgran.CellCheckpointStore). Re-running with the
+        same inputs and settings loads the cells done from the folder and
+        only processes the missing cells. Each 1km cell is processed with
+        its own seed, as with n_jobs set, so for a fixed seed resumed output
+        is the same as that of an uninterrupted run (and output is the same
+        with or without n_jobs, but differs from a run without
+        checkpoint_dir and n_jobs). (Default=None)
+
+        metrics : gridgran.RunMetrics/None
+        If given, stage timers and counters of cells, points moved and
+        cells dissolved to each level are recorded to it (see
+        gridgran.RunMetrics, which can also be given a callback). With
+        n_jobs set, the check and dissolve timers and shuffle counter of
+        each cell are recorded in its worker process and added as its
+        result is returned. (Default=None)
+
+        metrics_json : Path/str/None
+        If set, metrics are written to this json file at the end of the
+        run (a gridgran.RunMetrics is made if metrics is None).
+        (Default=None)
+
+        compact_dtypes : bool
+        If True, the point and grid tables are held with compact dtypes
+        while processing - int64 ID codes (integer_ids is turned on), int32
+        p/h and int8 classes (see gridgran.make_dtypes_compact()). This cuts
+        their memory use several fold. Output is the same either way.
+        (Default=False)
+
+        sparse : bool
+        If True, the point table only holds rows joined to points - rows of
+        empty 125m cells are recorded in the grid table and put back for
+        one 1km cell at a time as it is checked (see gridgran.make_sparse()).
+        This makes the point table much smaller to sort and subset where
+        most 125m cells are empty. Output is the same either way.
+        (Default=False)
+
+        reader : str/None
+        Options ['fiona', 'pyogrio', 'parquet'] - reader used for the
+        points, 1000m and 125m layers (see gridgran.READERS). Only the
+        columns used - picked from each layer's schema by prefix (see
+        gridgran.READ_COLUMN_PREFIXES) - are kept. 'pyogrio' only reads
+        those columns and reads through Arrow where pyarrow is
+        installed, which is many times faster than 'fiona' on large layers.
+        If None, 'parquet' is used for a folder of GeoParquet files and
+        'fiona' otherwise. (Default=None)
+
+        output_format : str
+        Options ['gpkg', 'parquet', 'flatgeobuf'] - backend used to write
+        outputs (see gridgran.OUTPUT_BACKENDS). 'gpkg' writes the grid and
+        water_mask layers to out_path through Arrow where pyarrow is
+        installed, and points to out_csv. 'parquet' and 'flatgeobuf' write
+        the grid and water mask as GeoParquet/FlatGeobuf files named after
+        the layer in folder out_path, and point tables as Parquet next to
+        out_csv, which are much quicker to write and read back than csv.
+        (Default='gpkg')
+
+        point_partitions : str/None
+        Options [None, '1km', '10km'] - if set, the point tables are written
+        as datasets partitioned by tile rather than single files - a folder
+        named after each table (out_csv without its suffix and
+        points_without_empty_grids) holding a tile=<tile> folder of part
+        files for each 1km prefix ('1km') or BNG 10km square such as SU41
+        ('10km') (see gridgran.OUTPUT_BACKENDS). Queries for an area then
+        only read the tiles they need. (Default=None)
         """
         self.gpkg_path = Path(gpkg_path).resolve()
         self.out_path = Path(out_path).resolve()
@@ -78,82 +317,262 @@ class GridGranulatorGPKG:
         self.class_2_threshold_prp = class_2_threshold_prp
         self.fill_values_below_threshold_with =  \
             fill_values_below_threshold_with
-        self.grid_1km, self.grid_125m, self.points = \
-            self.get_points_and_1km_and_125m()
-        self.iterate_and_process()
+        self.join_method = join_method
+        # Compact dtypes hold IDs as int64 codes
+        self.integer_ids = integer_ids or compact_dtypes
+        self.compact_dtypes = compact_dtypes
+        self.sparse = sparse
+        self.reader = reader
+        self.output_format = output_format
+        self.point_partitions = point_partitions
+        self.checker = checker
+        self.n_jobs = n_jobs
+        self.write_batch_size = write_batch_size
+        self.checkpoint_dir = checkpoint_dir
+        if metrics is None:
+            metrics = gridgran.RunMetrics() if metrics_json else \
+                gridgran.NULL_METRICS
+        self.metrics = metrics
+        with self.metrics.time('total'):
+            with self.metrics.time('read'):
+                self.grid_1km, self.grid_125m, self.points = \
+                    self.get_points_and_1km_and_125m()
+            self.iterate_and_process()
+        if metrics_json:
+            self.metrics.to_json(metrics_json)
 
     def get_points_and_1km_and_125m(self):
         """Returns geodataframes for grids and points"""
-        grid_1km = gpd.read_file(self.gpkg_path,
-                                 layer='1000m')
-        grid_125m = gpd.read_file(self.gpkg_path,
-                                  layer='125m')
-        points = gpd.read_file(self.gpkg_path, layer='points')
+        grid_1km, grid_125m, points = [
+            gridgran.read_layer(
+                self.gpkg_path, layer=layer, reader=self.reader,
+                column_prefixes=gridgran.READ_COLUMN_PREFIXES[layer])
+            for layer in ['1000m', '125m', 'points']]
         grid_1km = grid_1km.to_crs(27700)
         grid_125m = grid_125m.to_crs(27700)
         return grid_1km, grid_125m, points
 
     def iterate_and_process(self):
-        pops = 0
         GLOBAL_GRID_LIST = []
         GLOBAL_POINT_LIST = []
-        df_grid_125, df_grid_pt = \
-            gridgran.prep_points_and_grid_from_dataframes(
-                self.grid_125m,
+        with self.metrics.time('prep'):
+            df_grid_125, df_grid_pt = \
+                gridgran.prep_points_and_grid_from_dataframes(
+                    self.grid_125m,
+                    self.points,
+                    self.classification_dict,
+                    self.class_2_threshold_prp,
+                    join_method=self.join_method,
+                    integer_ids=self.integer_ids,
+                    metrics=self.metrics,
+                    compact_dtypes=self.compact_dtypes,
+                    sparse=self.sparse)
+        # Dissolved polygons are built from IDs so only 1km origins needed
+        km_origins = gridgran.get_km_origins(self.grid_1km,
+                                             id_col='GridID1km')
+        with self.metrics.time('partition'):
+            # Sort everything by 1km cell once so each cell is a slice
+            df_grid_125, grid_offsets = gridgran.partition_by_id(
+                df_grid_125, 'ID1000m')
+            df_grid_pt, pt_offsets = gridgran.partition_by_id(df_grid_pt,
+                                                              'ID1000m')
+            cell_ids = self.grid_1km.GridID1km.values
+            if self.integer_ids:
+                cell_ids = gridgran.encode_ids(cell_ids)
+            # Only cells with population need checking - find them in one
+            # pass
+            populated = np.isin(cell_ids, gridgran.get_populated_ids(
+                df_grid_pt, 'ID1000m'))
+        self.n_cells_skipped = int((~populated).sum())
+        self.metrics.count('cells_skipped', self.n_cells_skipped)
+        print(f'{self.n_cells_skipped} of {len(cell_ids)} 1km cells have no '
+              f'population and are skipped')
+        # With n_jobs or checkpoint_dir set, each cell is processed with its
+        # own seed so results don't depend on which cells were processed
+        # before it in this process (or loaded from a checkpoint). Seeds are
+        # drawn for every 1km cell so each cell gets the same seed whichever
+        # cells are skipped
+        seeds = None
+        if self.n_jobs is not None or self.checkpoint_dir:
+            seeds = np.random.randint(2 ** 31 - 1, size=len(cell_ids))
+            seeds = seeds[populated]
+        cell_ids = cell_ids[populated]
+        total_rows = len(cell_ids)
+        print(f'{total_rows} remaining')
+        done = np.zeros(len(cell_ids), dtype=bool)
+        if self.checkpoint_dir:
+            store = gridgran.CellCheckpointStore(
+                self.checkpoint_dir, self.get_checkpoint_settings())
+            done = np.array([store.is_done(cell_id) for cell_id in cell_ids],
+                            dtype=bool)
+            print(f'{done.sum()} 1km cells loaded from checkpoint')
+            self.metrics.count('cells_loaded_from_checkpoint', done.sum())
+        cells = ((gridgran.get_partition(df_grid_125, grid_offsets, cell_id),
+                  gridgran.get_partition(df_grid_pt, pt_offsets, cell_id))
+                 for cell_id in cell_ids[~done])
+        if self.n_jobs is None:
+            cell_seeds = repeat(None) if seeds is None else seeds[~done]
+            results = (gridgran.granulate_cell(
+                df_grid_in_cell,
+                df_grid_pt_in_cell,
+                km_origins,
+                self.classification_settings,
+                self.class_2_threshold_prp,
+                self.checker,
+                seed=seed,
+                metrics=self.metrics) for (df_grid_in_cell,
+                                           df_grid_pt_in_cell), seed in
+                zip(cells, cell_seeds))
+        else:
+            results = self.granulate_cells_in_parallel(cells, km_origins,
+                                                       seeds[~done])
+        if self.checkpoint_dir:
+            results = self.merge_checkpointed_results(store, cell_ids, done,
+                                                      results)
+        if self.write_batch_size:
+            writer = gridgran.StreamingOutputWriter(
+                self.out_path,
+                self.out_layer,
+                self.out_csv,
                 self.points,
+                km_origins,
                 self.classification_dict,
-                self.class_2_threshold_prp)
-        total_rows = len(self.grid_1km)
-        print(f'{total_rows} remaining')
-        for row in self.grid_1km.itertuples():
-            cell_125 = self.grid_125m[
-                self.grid_125m.GridID125m.str.startswith(row.GridID1km[:-3])]
-            df_grid_in_cell = df_grid_125[df_grid_125.ID1000m == row.GridID1km]
-            df_grid_pt_in_cell = df_grid_pt[df_grid_pt.ID1000m ==
-                                            row.GridID1km]
-            if df_grid_pt_in_cell.p.sum() > 0:
-                pop_in = df_grid_pt_in_cell.p.sum()
-                pops += pop_in
-                df = gridgran.aggregrid(df_grid_pt_in_cell,
-                                        self.classification_dict,
-                                        level='ID500m',
-                                        template=False,
-                                        cls_2_prp=self.class_2_threshold_prp)
-                gran = gridgran.GridDisclosureChecker(
-                    df,
-                    df_grid_in_cell,
-                    df_grid_pt_in_cell,
-                    self.classification_settings,
-                    threshold_p=self.classification_dict['p_3'] + 1,
-                    threshold_h=self.classification_dict['h_3'] + 1,
-                    cls_2_prp=self.class_2_threshold_prp
-                    )
-                grid_final, point_final = gran.execute()
-                grid_diss = self.join_and_dissolve(grid_final, cell_125)
-                GLOBAL_GRID_LIST.append(grid_diss)
-                GLOBAL_POINT_LIST.append(point_final)
-            total_rows -= 1
-            if total_rows % 50 == 0:
-                print(f'{total_rows} remaining')
-
-        self.concat_and_save(GLOBAL_GRID_LIST,
-                             GLOBAL_POINT_LIST,
-                             self.out_path,
-                             self.out_layer,
-                             self.out_csv,
-                             self.points,
-                             self.grid_125m)
-
-    def join_and_dissolve(self, grid_final, cell_125):
-        """Dissolve grids based on dissolve id"""
-        cell_125.set_index('GridID125m', inplace=True)
-        grid_joined = cell_125.join(
-            grid_final.set_index('ID125m')).reset_index()
-        grid_diss = grid_joined.copy()[
-            ['p', 'h', 'dissolve_id', 'geometry']].dissolve(by='dissolve_id',
-                                                            aggfunc='sum')
-        grid_diss = grid_diss.copy()[grid_diss.p > 0]
-        return grid_diss
+                self.fill_values_below_threshold_with,
+                self.integer_ids,
+                batch_size=self.write_batch_size,
+                metrics=self.metrics,
+                output_format=self.output_format,
+                point_partitions=self.point_partitions)
+        with self.metrics.time('process_cells'):
+            for grid_diss, point_final in results:
+                if grid_diss is not None:
+                    self.metrics.count_cell(grid_diss, point_final)
+                    if self.write_batch_size:
+                        writer.add(grid_diss, point_final)
+                    else:
+                        GLOBAL_GRID_LIST.append(grid_diss)
+                        GLOBAL_POINT_LIST.append(point_final)
+                total_rows -= 1
+                if total_rows % 50 == 0:
+                    print(f'{total_rows} remaining')
+
+        if self.write_batch_size:
+            self.save_water_mask(writer.close())
+        else:
+            self.concat_and_save(GLOBAL_GRID_LIST,
+                                 GLOBAL_POINT_LIST,
+                                 self.out_path,
+                                 self.out_layer,
+                                 self.out_csv,
+                                 self.points,
+                                 km_origins)
+
+    def granulate_cells_in_parallel(self, cells, km_origins, seeds):
+        """Yields results of gridgran.granulate_cell() for cells, in order,
+        from a pool of self.n_jobs processes. Each cell is processed with its
+        own seed so results are the same for any number of processes.
+
+        Parameters:
+        -----------
+        cells : iterable
+            (df_grid_in_cell, df_grid_pt_in_cell) for each 1km cell - taken
+            lazily, so a generator keeps memory bounded
+
+        km_origins : pd.DataFrame
+            1km prefixes and their lower left coordinates
+
+        seeds : np.array
+            Seed for each cell
+
+        Yields:
+        -------
+        (grid_diss, point_final) for each cell - timers and counters
+        recorded in the worker processes are added to self.metrics
+        """
+        n_cells = len(seeds)
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        args = (km_origins, self.classification_settings,
+                self.class_2_threshold_prp, self.checker)
+        if n_jobs == 1 or n_cells <= 1:
+            for (df_grid_in_cell, df_grid_pt_in_cell), seed in zip(cells,
+                                                                   seeds):
+                yield gridgran.granulate_cell(df_grid_in_cell,
+                                              df_grid_pt_in_cell, *args,
+                                              seed=seed,
+                                              metrics=self.metrics)
+            return
+        # Cells are only taken from cells as earlier results are yielded so
+        # at most n_jobs * CELLS_IN_FLIGHT_PER_JOB cells are held at once
+        max_in_flight = n_jobs * CELLS_IN_FLIGHT_PER_JOB
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = deque()
+            for (df_grid_in_cell, df_grid_pt_in_cell), seed in zip(cells,
+                                                                   seeds):
+                futures.append(executor.submit(
+                    gridgran.granulate_cell_with_metrics, df_grid_in_cell,
+                    df_grid_pt_in_cell, *args, seed=seed))
+                if len(futures) < max_in_flight:
+                    continue
+                result, metrics_dict = futures.popleft().result()
+                self.metrics.merge(metrics_dict)
+                yield result
+            while futures:
+                result, metrics_dict = futures.popleft().result()
+                self.metrics.merge(metrics_dict)
+                yield result
+
+    def get_checkpoint_settings(self):
+        """Returns inputs and settings that must match for a checkpoint to be
+        resumed"""
+        if self.gpkg_path.is_dir():
+            paths = [gridgran.get_parquet_path(self.gpkg_path, layer)
+                     for layer in gridgran.READ_COLUMN_PREFIXES]
+        else:
+            paths = [self.gpkg_path]
+        stats = [path.stat() for path in paths]
+        return {
+            'gpkg_path': self.gpkg_path,
+            'gpkg_size': sum(stat.st_size for stat in stats),
+            'gpkg_mtime_ns': max(stat.st_mtime_ns for stat in stats),
+            'classification_settings': self.classification_settings,
+            'class_2_threshold_prp': self.class_2_threshold_prp,
+            'join_method': self.join_method,
+            'integer_ids': self.integer_ids,
+            'compact_dtypes': self.compact_dtypes,
+            'checker': self.checker,
+        }
+
+    @staticmethod
+    def merge_checkpointed_results(store, cell_ids, done, results):
+        """Yields results for cell_ids in order, loading cells already done
+        from store and saving the others to store as they are returned
+
+        Parameters:
+        -----------
+        store : gridgran.CellCheckpointStore
+            Checkpoint for run
+
+        cell_ids : np.array
+            IDs of 1km cells to process
+
+        done : np.array
+            Boolean array, True where cell in cell_ids is in store
+
+        results : iterable
+            (grid_diss, point_final) for each cell not done, in order
+
+        Yields:
+        -------
+        (grid_diss, point_final) for each cell
+        """
+        results = iter(results)
+        for cell_id, cell_done in zip(cell_ids, done):
+            if cell_done:
+                yield store.load(cell_id)
+            else:
+                result = next(results)
+                store.save(cell_id, result)
+                yield result
 
     def concat_and_save(self,
                         global_grid_list,
@@ -162,41 +581,43 @@ class GridGranulatorGPKG:
                         out_layer,
                         out_csv,
                         points,
-                        grid_125m):
+                        km_origins):
         """Concatenates grid and point lists and saves to outfiles"""
-        grid_final = gpd.GeoDataFrame(pd.concat(global_grid_list),
-                                      crs=27700).reset_index()
-        point_final = pd.concat(global_point_list)
-        point_final = gridgran.calculate_dist_point_moved(point_final, points,
-                                                          grid_125m)
-        point_final_removed = gridgran.make_point_df_removing_grids(
-            point_final)
-        point_final_removed.to_csv(out_csv.parent.joinpath(
-            'points_without_empty_grids.csv'),
-                                   index=False)
-        point_final.to_csv(out_csv, index=False)
-        # Need to choose the correct method to replace values
-        grid_final = gridgran.check_for_below_threshold(
-            grid_final,
-            self.classification_dict['p_3'],
-            self.classification_dict['h_3'],
-            replace_with=self.fill_values_below_threshold_with)
-        grid_final.rename(columns={"dissolve_id": "GridID"}, inplace=True)
-        grid_final['pop_density'] = grid_final.p / grid_final.geometry.area
-        grid_final.to_file(out_file, layer=out_layer, driver='GPKG',
-                           index=False)
+        with self.metrics.time('output_tables'):
+            grid_final, point_final, point_final_removed = \
+                gridgran.make_output_tables(
+                    global_grid_list,
+                    global_point_list,
+                    points,
+                    km_origins,
+                    self.classification_dict,
+                    self.fill_values_below_threshold_with,
+                    self.integer_ids,
+                    self.metrics)
+        with self.metrics.time('write'):
+            backend = gridgran.OUTPUT_BACKENDS[self.output_format](
+                out_file, out_layer, out_csv, self.point_partitions,
+                km_origins)
+            backend.write(grid_final, point_final, point_final_removed)
+            backend.close()
+        self.save_water_mask(grid_final.GridID.values)
+
+    def save_water_mask(self, grid_ids):
+        """Saves 125m cells not in output grid that intersect water to
+        water_mask layer (if path_to_waterline given)"""
         grid_to_clip = self.grid_125m[~self.grid_125m.GridID125m.isin(
-            grid_final.GridID.tolist())]
+            grid_ids)]
         if self.path_to_waterline:
-            water_gdf = gpd.read_file(self.path_to_waterline)
-            grid_125m_water = gridgran.remove_water_cells(
-                grid_to_clip,
-                water_gdf,
-                return_water=True,
-                index_col='GridID125m'
-            )
-            grid_125m_water.to_file(
-                self.out_path,
-                layer='water_mask',
-                driver='GPKG'
-            )
+            with self.metrics.time('water_mask'):
+                water_gdf = gpd.read_file(self.path_to_waterline)
+                grid_125m_water = gridgran.remove_water_cells(
+                    grid_to_clip,
+                    water_gdf,
+                    return_water=True,
+                    index_col='GridID125m'
+                )
+                backend = gridgran.OUTPUT_BACKENDS[self.output_format](
+                    self.out_path, self.out_layer, self.out_csv)
+                backend.write_layer(grid_125m_water.reset_index(),
+                                    gridgran.WATER_MASK_LAYER)
+                backend.close()
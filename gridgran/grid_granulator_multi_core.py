@@ -21,7 +21,10 @@ class GridGranulatorSingleCell:
             outcsv,
             classification_settings,
             class_2_threshold_prp=0.05,
-            fill_values_below_threshold_with='minimum'
+            fill_values_below_threshold_with='minimum',
+            join_method='sjoin',
+            integer_ids=False,
+            checker='dataframe'
     ):
         """Initialisation
 
@@ -60,12 +63,31 @@ class GridGranulatorSingleCell:
               to parent level. DEFAULT 0.05 (5%)
 
         fill_values_below_threshold_with : str
-            Options ['minimum', 'star', 'null'] -
+            Options ['minimum', 'star', 'null', 'flag'] -
             In the output grid, cells that finish below the minimum threshold
             will need to be filled with a dummy value so as no to identify
             individuals. The options are 'minimum' (the minimum threshold
             value),
-            'star' (asterisk '*') or 'null'/NA. (Default='minimum')
+            'star' (asterisk '*'), 'null'/NA or 'flag' (<NA> in nullable
+            integer p/h columns with p_suppressed/h_suppressed flag columns).
+            (Default='minimum')
+
+        join_method : str
+            Options ['sjoin', 'arithmetic'] - method used to join points to
+            125m cells. 'sjoin' spatially joins points to the 125m polygons,
+            'arithmetic' calculates each point's cell from its coordinates
+            (see gridgran.join_pts_to_grid()). (Default='sjoin')
+
+        integer_ids : bool
+            If True, cell IDs are held as int64 codes while processing and
+            only decoded to strings for output (see gridgran.encode_ids()).
+            Output is the same either way. (Default=False)
+
+        checker : str
+            Options ['dataframe', 'quadtree'] - implementation used to check
+            and shuffle each 1km cell. 'dataframe' uses GridDisclosureChecker,
+            'quadtree' uses the array backed QuadtreeDisclosureChecker which
+            gives the same results. (Default='dataframe')
         """
         self.gdf_1km = gdf_1km
         self.gdf_125m = gdf_125m.to_crs(27700)
@@ -80,6 +102,9 @@ class GridGranulatorSingleCell:
         self.class_2_threshold_prp = class_2_threshold_prp
         self.fill_values_below_threshold_with = \
             fill_values_below_threshold_with
+        self.join_method = join_method
+        self.integer_ids = integer_ids
+        self.checker = checker
 
     def iterate_and_process(self):
         """Process children of 1km cell
@@ -90,7 +115,6 @@ class GridGranulatorSingleCell:
         Returns:
             None
         """
-        pops = 0
         GLOBAL_GRID_LIST = []
         GLOBAL_POINT_LIST = []
         df_grid_125, df_grid_pt = \
@@ -98,33 +122,24 @@ class GridGranulatorSingleCell:
                 self.gdf_125m,
                 self.gdf_pts,
                 self.classification_dict,
-                self.class_2_threshold_prp)
+                self.class_2_threshold_prp,
+                join_method=self.join_method,
+                integer_ids=self.integer_ids)
         # for row in self.gdf_1km.itertuples():
         row = self.gdf_1km
-        cell_125 = self.gdf_125m[
-            self.gdf_125m.GridID125m.str.startswith(row.GridID1km[:-3])]
-        df_grid_in_cell = df_grid_125[df_grid_125.ID1000m == row.GridID1km]
-        df_grid_pt_in_cell = df_grid_pt[df_grid_pt.ID1000m ==
-                                        row.GridID1km]
-        if df_grid_pt_in_cell.p.sum() > 0:
-            pop_in = df_grid_pt_in_cell.p.sum()
-            pops += pop_in
-            df = gridgran.aggregrid(df_grid_pt_in_cell,
-                                    self.classification_dict,
-                                    level='ID500m',
-                                    template=False,
-                                    cls_2_prp=self.class_2_threshold_prp)
-            gran = gridgran.GridDisclosureChecker(
-                df,
-                df_grid_in_cell,
-                df_grid_pt_in_cell,
-                self.classification_settings,
-                threshold_p=self.classification_dict['p_3'] + 1,
-                threshold_h=self.classification_dict['h_3'] + 1,
-                cls_2_prp=self.class_2_threshold_prp
-            )
-            grid_final, point_final = gran.execute()
-            grid_diss = self.join_and_dissolve(grid_final, cell_125)
+        cell_id = row.GridID1km
+        if self.integer_ids:
+            cell_id = gridgran.encode_ids([cell_id])[0]
+        df_grid_in_cell = df_grid_125[df_grid_125.ID1000m == cell_id]
+        df_grid_pt_in_cell = df_grid_pt[df_grid_pt.ID1000m == cell_id]
+        grid_diss, point_final = gridgran.granulate_cell(
+            df_grid_in_cell,
+            df_grid_pt_in_cell,
+            gridgran.get_km_origins(self.gdf_125m),
+            self.classification_settings,
+            self.class_2_threshold_prp,
+            self.checker)
+        if grid_diss is not None:
             GLOBAL_GRID_LIST.append(grid_diss)
             GLOBAL_POINT_LIST.append(point_final)
 
@@ -137,17 +152,6 @@ class GridGranulatorSingleCell:
                                                              self.gdf_125m)
         return grid, water, df, df_non_empty
 
-    def join_and_dissolve(self, grid_final, cell_125):
-        """Dissolve grids based on dissolve id"""
-        cell_125.set_index('GridID125m', inplace=True)
-        grid_joined = cell_125.join(
-            grid_final.set_index('ID125m')).reset_index()
-        grid_diss = grid_joined.copy()[
-            ['p', 'h', 'dissolve_id', 'geometry']].dissolve(by='dissolve_id',
-                                                            aggfunc='sum')
-        grid_diss = grid_diss.copy()[grid_diss.p > 0]
-        return grid_diss
-
     def concat_and_save(self,
                         global_grid_list,
                         global_point_list,
@@ -160,6 +164,10 @@ class GridGranulatorSingleCell:
         grid_final = gpd.GeoDataFrame(pd.concat(global_grid_list),
                                       crs=27700).reset_index()
         point_final = pd.concat(global_point_list)
+        if self.integer_ids:
+            grid_final = gridgran.decode_id_columns(grid_final,
+                                                    ['dissolve_id'])
+            point_final = gridgran.decode_id_columns(point_final)
         point_final = gridgran.calculate_dist_point_moved(point_final, points,
                                                           grid_125m)
         point_final_removed = gridgran.make_point_df_removing_grids(
@@ -175,7 +183,7 @@ class GridGranulatorSingleCell:
             self.classification_dict['h_3'],
             replace_with=self.fill_values_below_threshold_with)
         grid_final.rename(columns={"dissolve_id": "GridID"}, inplace=True)
-        grid_final['pop_density'] = grid_final.p / grid_final.geometry.area
+        grid_final['pop_density'] = gridgran.calculate_pop_density(grid_final)
         # grid_final.to_file(out_file, layer=out_layer, driver='GPKG',
         #                    index=False)
         grid_to_clip = self.gdf_125m[~self.gdf_125m.GridID125m.isin(
@@ -10,10 +10,30 @@ cell.
 4. Remove duplicates in instances where points fall in more than one grid - \
 i.e. where points straddle a grid's border
 
+5. Build dissolved output grid polygons from dissolve IDs
+
 """
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+import shapely
+
+import gridgran
+
+# Options for remove_water_cells()'s method
+WATER_METHODS = ('strtree', 'sjoin')
+
+# shapely functions used by remove_water_cells()'s 'strtree' method, added
+# in shapely 2 - 'sjoin' is used with earlier versions
+STRTREE_SHAPELY_FUNCTIONS = ('STRtree', 'bounds', 'prepare', 'contains_xy',
+                             'intersects', 'coverage_union_all', 'is_valid',
+                             'union_all')
+
+
+def has_strtree_functions():
+    """Returns True if shapely has the vectorised functions used by
+    get_cells_intersecting() and dissolve_cells() (shapely >= 2)"""
+    return all(hasattr(shapely, x) for x in STRTREE_SHAPELY_FUNCTIONS)
 
 
 def clip_water(path_to_water, outpath, gpkg, layer=None):
@@ -42,8 +62,91 @@ def clip_water(path_to_water, outpath, gpkg, layer=None):
     gdf_clip.to_file(outpath, index=False)
 
 
+def get_rows_without_nulls(gdf):
+    """Returns boolean array, True for rows of gdf without null attributes
+    or geometry"""
+    return (gdf.drop(columns=gdf.geometry.name).notna().all(axis=1).values &
+            ~(gdf.geometry.isna() | gdf.geometry.is_empty).values)
+
+
+def get_cells_intersecting(gdf_125m, gdf_bfc):
+    """Returns boolean array, True for cells of gdf_125m that intersect
+    gdf_bfc. The cells are held in an STRtree which each BFC polygon,
+    prepared, queries for the cells within its bbox. Cells whose centre is
+    inside the polygon - most cells inland - are found with a vectorised
+    point in polygon test, so the full intersects test is only run on the
+    cells left, along the coast. Rows with null attributes are left out of
+    both, as they are dropped from the join in remove_water_cells().
+
+    Parameters:
+    -----------
+    gdf_125m : gpd.GeoDataFrame
+        Geodataframe of 125m cells
+
+    gdf_bfc : gpd.GeoDataFrame
+        GeoDataFrame of UK highwater boundaries
+
+    Returns:
+    --------
+    intersects : np.array
+        Boolean array aligned to gdf_125m
+    """
+    valid = get_rows_without_nulls(gdf_125m)
+    cells = np.asarray(gdf_125m.geometry.values)[valid]
+    polygons = np.asarray(gdf_bfc.geometry.values)[
+        get_rows_without_nulls(gdf_bfc)]
+    bounds = shapely.bounds(cells)
+    x = (bounds[:, 0] + bounds[:, 2]) / 2
+    y = (bounds[:, 1] + bounds[:, 3]) / 2
+    tree = shapely.STRtree(cells)
+    found = np.zeros(len(cells), dtype=bool)
+    for polygon in polygons:
+        shapely.prepare(polygon)
+        candidates = tree.query(polygon)
+        candidates = candidates[~found[candidates]]
+        inside = shapely.contains_xy(polygon, x[candidates], y[candidates])
+        found[candidates[inside]] = True
+        candidates = candidates[~inside]
+        found[candidates[shapely.intersects(polygon,
+                                            cells[candidates])]] = True
+    intersects = np.zeros(len(gdf_125m), dtype=bool)
+    intersects[valid] = found
+    return intersects
+
+
+def dissolve_cells(gdf, by):
+    """Returns gdf's geometry dissolved into one row (indexed 1 and named
+    by) - as gdf.assign(**{by: 1}).dissolve(by=by)[['geometry']]. Cells
+    don't overlap and share edges, so their coverage union is used, which
+    is much faster than a generic union. If the cells aren't a valid
+    coverage the union is made with shapely.union_all().
+
+    Parameters:
+    -----------
+    gdf : gpd.GeoDataFrame
+        Grid cells
+
+    by : str
+        Name of index
+
+    Returns:
+    --------
+    gdf_diss : gpd.GeoDataFrame
+        Dissolved cells (no rows if gdf is empty)
+    """
+    geoms = np.asarray(gdf.geometry.values)
+    if len(geoms) == 0:
+        return gpd.GeoDataFrame(geometry=[], crs=gdf.crs,
+                                index=pd.Index([], name=by))
+    geom = shapely.coverage_union_all(geoms)
+    if not shapely.is_valid(geom):
+        geom = shapely.union_all(geoms)
+    return gpd.GeoDataFrame(geometry=[geom], crs=gdf.crs,
+                            index=pd.Index([1], name=by))
+
+
 def remove_water_cells(gdf_125m, gdf_bfc, return_water=False,
-                       index_col='GridID125m'):
+                       index_col='GridID125m', method='strtree'):
     """ Returns gdf_125m with cells not intersecting gdf_bfc removed
 
     Parameters:
@@ -62,23 +165,49 @@ def remove_water_cells(gdf_125m, gdf_bfc, return_water=False,
     index_col : str
         Column in gdf_125m to use for IDS - (DEFAULT GridID125m)
 
+    method : str
+        Options ['strtree', 'sjoin'] - 'strtree' finds cells intersecting
+        gdf_bfc with get_cells_intersecting() and dissolves the water mask
+        with dissolve_cells(), 'sjoin' uses gpd.sjoin() and
+        GeoDataFrame.dissolve() as in earlier versions. Results are the
+        same. 'sjoin' is used if shapely is older than 2 (see
+        has_strtree_functions()). (DEFAULT='strtree')
+
+    Raises:
+    -------
+    ValueError
+        If method isn't one of WATER_METHODS
+
     Returns:
     -------
     gdf_125m_land : gpd.GeoDataFrame
         GeoDataFrame of 125m cells with 100% water cells removed
     """
-    gdf_125_int = gpd.sjoin(gdf_125m, gdf_bfc,
-                            how='inner',
-                            predicate='intersects').dropna()
+    if method not in WATER_METHODS:
+        raise ValueError(f'method must be one of {WATER_METHODS}, not '
+                         f'{method!r}')
+    if method == 'strtree' and not has_strtree_functions():
+        method = 'sjoin'
+    if method == 'strtree':
+        intersecting_ids = gdf_125m[index_col].values[
+            get_cells_intersecting(gdf_125m, gdf_bfc)]
+    else:
+        intersecting_ids = gpd.sjoin(gdf_125m, gdf_bfc,
+                                     how='inner',
+                                     predicate='intersects').dropna()[
+                                         index_col]
     if return_water:
         gdf_125m_clip = gdf_125m[
-            ~gdf_125m[index_col].isin(gdf_125_int[index_col])]
-        gdf_125m_clip = gdf_125m_clip.assign(diss_water=1)
-        gdf_125m_clip = gdf_125m_clip.dissolve(by="diss_water")
-        gdf_125m_clip = gdf_125m_clip[['geometry']]
+            ~gdf_125m[index_col].isin(intersecting_ids)]
+        if method == 'strtree':
+            gdf_125m_clip = dissolve_cells(gdf_125m_clip, 'diss_water')
+        else:
+            gdf_125m_clip = gdf_125m_clip.assign(diss_water=1)
+            gdf_125m_clip = gdf_125m_clip.dissolve(by="diss_water")
+            gdf_125m_clip = gdf_125m_clip[['geometry']]
     else:
         gdf_125m_clip = gdf_125m[
-            gdf_125m.GridID125m.isin(gdf_125_int[index_col])]
+            gdf_125m.GridID125m.isin(intersecting_ids)]
 
     return gdf_125m_clip
 
@@ -95,10 +224,13 @@ def calc_dist(row, points, grid_125m):
     return dist
 
 
-def calculate_dist_point_moved(grid_pt, points, grid_125m):
+def calculate_dist_point_moved(grid_pt, points, grid_125m, km_origins=None):
     """Returns gdf_pt with column appended for distance travelled with
     distance travelled calculated for points that were moved to another
-    grid cell
+    grid cell. Start points are joined on uprn and the centroids of the
+    cells points were moved to are calculated from their IDs (see
+    bng.get_cell_centroids()), so all distances are calculated at once
+    rather than row by row with calc_dist()
 
     Parameters:
     -----------
@@ -109,8 +241,13 @@ def calculate_dist_point_moved(grid_pt, points, grid_125m):
     points : gpd.GeoDataFrame
         Dataframe of geometries of points
 
-    grid_125m : gpd.GeoDataFrame
-        GeoDataFrame of all 125m grid cells
+    grid_125m : gpd.GeoDataFrame/None
+        GeoDataFrame of all 125m grid cells (only used to look up 1km
+        origins, so can be None if km_origins given)
+
+    km_origins : pd.DataFrame/None
+        1km prefixes and their lower left coordinates as returned by
+        bng.get_km_origins(). Made from grid_125m if None (DEFAULT=None)
 
     Returns:
     --------
@@ -119,13 +256,53 @@ def calculate_dist_point_moved(grid_pt, points, grid_125m):
         movement with Distance travelled calculated in dist_moved column
     """
     grid_pt['dist_moved'] = 0
-    grid_pt['dist_moved'] = grid_pt.apply(calc_dist,
-                                          axis=1,
-                                          points=points,
-                                          grid_125m=grid_125m)
+    moved = ((grid_pt.ID125m != grid_pt.START_POINT) &
+             grid_pt.uprn.notna()).values
+    if moved.any():
+        uprn_index = pd.Index(points.uprn.values)
+        start_pos = uprn_index.get_indexer(grid_pt.uprn.values[moved])
+        start_x = points.geometry.x.values.take(start_pos)
+        start_y = points.geometry.y.values.take(start_pos)
+        if km_origins is None:
+            km_origins = gridgran.get_km_origins(grid_125m)
+        end_x, end_y = gridgran.get_cell_centroids(
+            grid_pt.ID125m.values[moved], km_origins)
+        dist = np.sqrt((end_x - start_x) ** 2 + (end_y - start_y) ** 2)
+        dist[start_pos < 0] = np.nan
+        grid_pt.loc[moved, 'dist_moved'] = dist
     return grid_pt
 
 
+def make_dissolved_grid(grid_final, km_origins):
+    """Returns grid_final summed by dissolve_id with polygons built from the
+    dissolve IDs (see bng.get_cell_geometries()). Every dissolve group is an
+    aligned 125m-1km square so this gives the same output as joining to the
+    125m polygons and dissolving, without the polygon unions. Cells with no
+    population are dropped.
+
+    Parameters:
+    -----------
+    grid_final : pd.DataFrame
+        125m grid with p, h and dissolve_id columns as returned by
+        GridDisclosureChecker.execute()
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        bng.get_km_origins()
+
+    Returns:
+    --------
+    grid_diss : gpd.GeoDataFrame
+        GeoDataFrame indexed by dissolve_id with geometry, p and h columns
+    """
+    grid_diss = grid_final.groupby('dissolve_id')[['p', 'h']].sum()
+    grid_diss = grid_diss[grid_diss.p > 0]
+    geometry = gridgran.get_cell_geometries(grid_diss.index.values,
+                                            km_origins)
+    grid_diss = gpd.GeoDataFrame(grid_diss, geometry=geometry, crs=27700)
+    return grid_diss[['geometry', 'p', 'h']]
+
+
 def check_threshold(row, threshold_p, threshold_h):
     """Returns True if row.p and row.h are above respective thresholds else
     False
@@ -165,6 +342,9 @@ def check_for_below_threshold(grid_final, threshold_p, threshold_h,
         'null' -> nan/null
         'star' -> column data type will be converted to str and values will
         be replaced with an asterisk (*)
+        'flag' -> p and h are kept as nullable integers (Int64) with
+        values below threshold set to <NA>, and p_suppressed and
+        h_suppressed columns flag which values were suppressed
 
     Parameters:
     -----------
@@ -184,6 +364,8 @@ def check_for_below_threshold(grid_final, threshold_p, threshold_h,
          - 'null' -> nan/null
          - star' -> column data type will be converted to str and values will
         be replaced with an asterisk (*)
+         - 'flag' -> nullable integer <NA> with p_suppressed/h_suppressed
+         flag columns
 
     Returns:
     --------
@@ -192,22 +374,48 @@ def check_for_below_threshold(grid_final, threshold_p, threshold_h,
         above_threshold) indicating whether cell passes or fails disclosure
         test
     """
-    grid_final['above_threshold'] = grid_final.apply(check_threshold,
-                                                     threshold_p=threshold_p,
-                                                     threshold_h=threshold_h,
-                                                     axis=1)
+    # Same test as check_threshold() for all rows at once
+    grid_final['above_threshold'] = (grid_final.p > threshold_p) & \
+                                    (grid_final.h > threshold_h)
+    p_below = grid_final.p <= threshold_p
+    h_below = grid_final.h <= threshold_h
     if replace_with == 'minimum':
-        grid_final.loc[grid_final.p <= threshold_p, 'p'] = threshold_p + 1
-        grid_final.loc[grid_final.h <= threshold_h, 'h'] = threshold_h + 1
+        grid_final.loc[p_below, 'p'] = threshold_p + 1
+        grid_final.loc[h_below, 'h'] = threshold_h + 1
     elif replace_with == 'null':
-        grid_final.loc[grid_final.p <= threshold_p, 'p'] = np.nan
-        grid_final.loc[grid_final.h <= threshold_h, 'h'] = np.nan
+        grid_final.loc[p_below, 'p'] = np.nan
+        grid_final.loc[h_below, 'h'] = np.nan
     elif replace_with == 'star':
-        grid_final.loc[grid_final.p <= threshold_p, 'p'] = "*"
-        grid_final.loc[grid_final.h <= threshold_h, 'h'] = "*"
+        grid_final.loc[p_below, 'p'] = "*"
+        grid_final.loc[h_below, 'h'] = "*"
+    elif replace_with == 'flag':
+        grid_final['p'] = grid_final.p.astype('Int64').mask(p_below)
+        grid_final['h'] = grid_final.h.astype('Int64').mask(h_below)
+        grid_final['p_suppressed'] = p_below
+        grid_final['h_suppressed'] = h_below
     return grid_final
 
 
+def calculate_pop_density(grid_final):
+    """Returns population per square metre of each cell in grid_final
+
+    Parameters:
+    -----------
+    grid_final : gpd.GeoDataFrame
+        Output grid as returned by check_for_below_threshold()
+
+    Returns:
+    --------
+    pop_density : pd.Series
+        Population density (NaN where p is suppressed with 'flag')
+    """
+    p = grid_final.p
+    if isinstance(p.dtype, pd.Int64Dtype):
+        # Nullable floats can't be written to file so use NaN instead
+        p = p.astype('float64')
+    return p / grid_final.geometry.area
+
+
 def make_point_df_removing_grids(pt_df):
     """Returns pt_df with rows removed where uprn is null (i.e. only save
     points and remove empty grids
@@ -0,0 +1,213 @@
+"""Module to encode BNG cell ID strings (e.g. J80068221211) as int64 codes so
+that the hierarchy columns can be grouped, joined and compared as integers
+rather than Python strings.
+
+IDs are a capital letter followed by 11 digits and are encoded as:
+    (ord(letter) - ord('A')) * 10 ** 11 + int(digits)
+The largest code is below 2 ** 53, so codes are also exact when held in
+float64 columns alongside NaN (e.g. *_LEVEL_MOVE_ORIGIN and dissolve_id).
+
+The last three digits of a code are the 125m, 250m and 500m quadrants (1-4)
+of the cell (0 where the ID refers to a coarser level), so parents, children
+and quadrants can be found with integer arithmetic.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+ID_PATTERN = re.compile(r'^[A-Z]\d{11}$')
+
+ID_DIGITS = 11
+
+ID_COLUMNS = [
+    'ID125m',
+    'ID250m',
+    'ID500m',
+    'ID1000m',
+    'START_POINT',
+    'ID500m_LEVEL_MOVE_ORIGIN',
+    'ID250m_LEVEL_MOVE_ORIGIN',
+    'ID125m_LEVEL_MOVE_ORIGIN',
+    'dissolve_id',
+]
+
+LEVEL_DIVISORS = {  # Power of 10 of each level's quadrant digit in a code
+    'ID125m': 100,
+    'ID250m': 10,
+    'ID500m': 1,
+}
+
+
+def encode_ids(ids):
+    """Returns int64 codes for ID strings. Strings are only parsed once per
+    unique ID
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        ID strings (may contain nulls)
+
+    Raises:
+    -------
+    ValueError
+        If any ID is not a capital letter followed by 11 digits
+
+    Returns:
+    --------
+    codes : np.array
+        int64 array of codes, or float64 array with NaN where ids are null
+    """
+    codes, uniques = pd.factorize(np.asarray(ids, dtype=object))
+    unique_codes = np.empty(len(uniques), dtype='int64')
+    for i, id in enumerate(uniques):
+        if not isinstance(id, str) or not ID_PATTERN.match(id):
+            raise ValueError(f'{id} is not a valid grid cell ID')
+        unique_codes[i] = (ord(id[0]) - 65) * 10 ** ID_DIGITS + int(id[1:])
+    if np.any(codes < 0):
+        return np.where(codes < 0, np.nan,
+                        unique_codes.take(codes, mode='clip'))
+    return unique_codes[codes]
+
+
+def decode_ids(codes):
+    """Returns ID strings for codes. Strings are only built once per unique
+    code
+
+    Parameters:
+    -----------
+    codes : pd.Series/np.array
+        int64 codes (or float64 codes with NaN)
+
+    Returns:
+    --------
+    ids : np.array
+        Object array of ID strings with NaN where codes are null
+    """
+    positions, uniques = pd.factorize(np.asarray(codes))
+    unique_ids = np.array(
+        [chr(65 + int(code) // 10 ** ID_DIGITS) +
+         str(int(code) % 10 ** ID_DIGITS).zfill(ID_DIGITS) for code in
+         uniques] + [np.nan], dtype=object)
+    return unique_ids[positions]  # -1 (null) picks the trailing NaN
+
+
+def encode_id_columns(df, columns=None):
+    """Returns copy of df with ID columns encoded as int64 codes. Columns
+    that are entirely null (i.e. *_LEVEL_MOVE_ORIGIN before points have
+    moved) are left as they are
+
+    Parameters:
+    -----------
+    df : (pd.DataFrame)
+        Dataframe holding ID string columns
+
+    columns : (list/None)
+        Columns to encode. If None, any of ID_COLUMNS in df (DEFAULT=None)
+
+    Returns:
+    --------
+    df : (pd.DataFrame)
+        Dataframe with ID columns encoded
+    """
+    df = df.copy()
+    if columns is None:
+        columns = [x for x in ID_COLUMNS if x in df.columns]
+    for col in columns:
+        if df[col].notna().any():
+            df[col] = encode_ids(df[col].values)
+    return df
+
+
+def decode_id_columns(df, columns=None):
+    """Returns copy of df with int64 ID code columns decoded to strings.
+    Columns that are entirely null are left as they are
+
+    Parameters:
+    -----------
+    df : (pd.DataFrame)
+        Dataframe holding ID code columns
+
+    columns : (list/None)
+        Columns to decode. If None, any of ID_COLUMNS in df (DEFAULT=None)
+
+    Returns:
+    --------
+    df : (pd.DataFrame)
+        Dataframe with ID columns decoded
+    """
+    df = df.copy()
+    if columns is None:
+        columns = [x for x in ID_COLUMNS if x in df.columns]
+    for col in columns:
+        if df[col].notna().any() and df[col].dtype.kind in 'iuf':
+            df[col] = decode_ids(df[col].values)
+    return df
+
+
+def get_parent_codes(codes, level):
+    """Returns codes of the parents (at level) of codes - equivalent of
+    bng.get_parent_ids() for codes
+
+    Parameters:
+    -----------
+    codes : np.array
+        int64 codes
+
+    level : str
+        Parent level from ['ID125m', 'ID250m', 'ID500m', 'ID1000m']
+
+    Returns:
+    --------
+    parent_codes : np.array
+        int64 codes of parents
+    """
+    codes = np.asarray(codes, dtype='int64')
+    km_codes = codes - codes % 1000
+    if level == 'ID1000m':
+        return km_codes
+    keep = {'ID125m': 1000, 'ID250m': 100, 'ID500m': 10}[level]
+    return km_codes + codes % keep
+
+
+def get_quadrant(codes, level):
+    """Returns quadrant (1-4) of cells at level within their parent cell
+    (0 if codes refer to a coarser level than level)
+
+    Parameters:
+    -----------
+    codes : np.array
+        int64 codes
+
+    level : str
+        Level of quadrant from ['ID125m', 'ID250m', 'ID500m']
+
+    Returns:
+    --------
+    quadrants : np.array
+        int64 array of quadrants
+    """
+    codes = np.asarray(codes, dtype='int64')
+    return (codes // LEVEL_DIVISORS[level]) % 10
+
+
+def get_child_codes(codes, child_level):
+    """Returns codes of the 4 children (at child_level) of each code
+
+    Parameters:
+    -----------
+    codes : np.array
+        int64 codes of cells one level above child_level
+
+    child_level : str
+        Level of children from ['ID125m', 'ID250m', 'ID500m']
+
+    Returns:
+    --------
+    child_codes : np.array
+        int64 array of shape (len(codes), 4) with children ordered by
+        quadrant (south west, south east, north west, north east)
+    """
+    codes = np.asarray(codes, dtype='int64')
+    quadrants = np.arange(1, 5, dtype='int64') * LEVEL_DIVISORS[child_level]
+    return codes[:, None] + quadrants[None, :]
@@ -13,7 +13,8 @@ def check_cells_children_are_valid(df,
                                    parent_level,
                                    child_level,
                                    classification_dict,
-                                   cls_2_prp=0, ):
+                                   cls_2_prp=0,
+                                   metrics=None):
     """Checks and tries to bring cells over disclosure limit and returns
     grids, points and df (aggregated to current level - 4 rows), as well as
     boolean indicating whether cell's children are over disclosure limit.
@@ -59,6 +60,10 @@ def check_cells_children_are_valid(df,
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        shuffle_helpers.sample_excess_rows_cls_4()) (DEFAULT = None)
+
     Returns:
     --------
     df_grid_checked : (pd.DataFrame)
@@ -84,7 +89,8 @@ def check_cells_children_are_valid(df,
         parent_level,
         child_level,
         classification_dict,
-        cls_2_prp=cls_2_prp)
+        cls_2_prp=cls_2_prp,
+        metrics=metrics)
     df_checked = gridgran.aggregrid(df_grid_pt_checked, classification_dict,
                                     level=current_level,
                                     template=False,
@@ -127,9 +133,13 @@ def get_children_ids(df, current_level):
 
 
 def subset_by_id(df_grid, df_pt_grid, current_level, child_level, subset_id,
-                 classification_dict, cls_2_prp=0):
+                 classification_dict, cls_2_prp=0, grid_offsets=None,
+                 pt_offsets=None):
     """Returns subset of grid and points where current level id ==
-    subset_id
+    subset_id. If grid_offsets and pt_offsets are given, df_grid and
+    df_pt_grid should be partitioned by current_level (see
+    partition.partition_by_id()) and subsets are sliced rather than found by
+    scanning every row
 
     Parameters:
     -----------
@@ -166,6 +176,14 @@ def subset_by_id(df_grid, df_pt_grid, current_level, child_level, subset_id,
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
 
+    grid_offsets : (dict/None)
+        Offsets of IDs in df_grid returned from partition.partition_by_id()
+        (DEFAULT=None)
+
+    pt_offsets : (dict/None)
+        Offsets of IDs in df_pt_grid returned from
+        partition.partition_by_id() (DEFAULT=None)
+
     Returns:
     --------
     df_grid_subset : (pd.DataFrame)
@@ -179,8 +197,17 @@ def subset_by_id(df_grid, df_pt_grid, current_level, child_level, subset_id,
         current_level is ID125m, df_grid_pt_subset is aggregated to that
         level as it will not be used further
     """
-    df_grid_subset = df_grid[df_grid[current_level] == subset_id]
-    df_grid_pt_subset = df_pt_grid[df_pt_grid[current_level] == subset_id]
+    if grid_offsets is not None:
+        df_grid_subset = gridgran.get_partition(df_grid, grid_offsets,
+                                                subset_id)
+    else:
+        df_grid_subset = df_grid[df_grid[current_level] == subset_id]
+    if pt_offsets is not None:
+        df_grid_pt_subset = gridgran.get_partition(df_pt_grid, pt_offsets,
+                                                   subset_id)
+    else:
+        df_grid_pt_subset = df_pt_grid[
+            df_pt_grid[current_level] == subset_id]
     df_subset = gridgran.aggregrid(df_grid_pt_subset, classification_dict,
                                    level=child_level,
                                    template=False,
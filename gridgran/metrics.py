@@ -0,0 +1,147 @@
+"""Module with classes to record how long each stage of a run takes and
+count what happens to cells and points (see GridGranulatorGPKG's metrics
+parameter). NULL_METRICS is used when metrics aren't wanted - its methods do
+nothing, so the cost of instrumentation when disabled is an empty method
+call per stage or cell.
+"""
+from contextlib import contextmanager, nullcontext
+import json
+import time
+
+import numpy as np
+
+DISSOLVE_LEVELS = ['ID125m', 'ID250m', 'ID500m', 'ID1000m']
+MOVE_LEVELS = ['ID500m', 'ID250m', 'ID125m']
+
+
+def get_id_levels(ids):
+    """Returns level (i.e. 'ID250m') of cell IDs of any level (or int64
+    codes of IDs - see id_codec) from the number of trailing 0 digits
+
+    Parameters:
+    -----------
+    ids : pd.Series/np.array
+        Cell IDs
+
+    Returns:
+    --------
+    levels : np.array
+        Object array of levels
+    """
+    ids = np.asarray(ids)
+    if ids.dtype.kind in 'iuf':
+        digits = ids.astype('int64') % 1000
+    else:
+        digits = np.array([int(i[-3:]) for i in ids], dtype='int64')
+    # 0 -> 1km, 00x -> 500m, 0xx -> 250m, xxx -> 125m
+    n_digits = np.select([digits >= 100, digits >= 10, digits > 0],
+                         [0, 1, 2], default=3)
+    return np.array(DISSOLVE_LEVELS, dtype=object)[n_digits]
+
+
+class RunMetrics:
+    """Class to hold stage timers (seconds, summed over each time a stage
+    runs) and counters for a run"""
+
+    enabled = True
+
+    def __init__(self, callback=None):
+        """
+        Class instantiation
+
+        Parameters:
+        -----------
+        callback : callable/None
+            If given, called as callback(kind, name, value) each time a
+            timer stops (kind='timer', value=seconds) or a counter is
+            increased (kind='counter', value=increase) (DEFAULT=None)
+        """
+        self.timers = {}
+        self.counters = {}
+        self.callback = callback
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager adding time taken within it to stage's timer"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage, seconds):
+        """Adds seconds to stage's timer"""
+        self.timers[stage] = self.timers.get(stage, 0) + seconds
+        if self.callback is not None:
+            self.callback('timer', stage, seconds)
+
+    def count(self, counter, n=1):
+        """Adds n to counter"""
+        self.counters[counter] = self.counters.get(counter, 0) + int(n)
+        if self.callback is not None:
+            self.callback('counter', counter, int(n))
+
+    def count_cell(self, grid_diss, point_final):
+        """Counts a processed 1km cell, its points, points moved (overall and
+        by the level at which they were moved) and its output cells by the
+        level they were dissolved to
+
+        Parameters:
+        -----------
+        grid_diss : gpd.GeoDataFrame
+            Dissolved grid indexed by dissolve_id
+
+        point_final : pd.DataFrame
+            Points following movement
+        """
+        self.count('cells_processed')
+        self.count('points', len(point_final))
+        self.count('points_moved',
+                   (point_final.ID125m != point_final.START_POINT).sum())
+        for level in MOVE_LEVELS:
+            self.count(f'points_moved_at_{level}',
+                       point_final[f'{level}_LEVEL_MOVE_ORIGIN'].notna().sum())
+        levels = get_id_levels(grid_diss.index.values)
+        for level in DISSOLVE_LEVELS:
+            self.count(f'cells_dissolved_to_{level}', (levels == level).sum())
+
+    def merge(self, metrics_dict):
+        """Adds timers and counters of metrics_dict (as returned by
+        to_dict(), i.e. from a worker process) to these"""
+        for stage, seconds in metrics_dict['timers'].items():
+            self.add_time(stage, seconds)
+        for counter, n in metrics_dict['counters'].items():
+            self.count(counter, n)
+
+    def to_dict(self):
+        """Returns dictionary of timers and counters"""
+        return {'timers': dict(self.timers), 'counters': dict(self.counters)}
+
+    def to_json(self, path):
+        """Writes timers and counters to json file at path"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class NullMetrics:
+    """Class with the same methods as RunMetrics that record nothing"""
+
+    enabled = False
+
+    def time(self, stage):
+        return nullcontext()
+
+    def add_time(self, stage, seconds):
+        pass
+
+    def count(self, counter, n=1):
+        pass
+
+    def count_cell(self, grid_diss, point_final):
+        pass
+
+    def merge(self, metrics_dict):
+        pass
+
+
+NULL_METRICS = NullMetrics()
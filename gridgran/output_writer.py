@@ -0,0 +1,206 @@
+"""Module with functions and class to turn processed 1km cells into output
+tables and write them - either all at once at the end of processing or in
+batches while processing continues (StreamingOutputWriter). Tables are
+written with one of gridgran.OUTPUT_BACKENDS.
+"""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+import gridgran
+
+
+def make_output_tables(global_grid_list,
+                       global_point_list,
+                       points,
+                       km_origins,
+                       classification_dict,
+                       fill_values_below_threshold_with='minimum',
+                       integer_ids=False,
+                       metrics=None):
+    """Returns output grid and point tables for processed 1km cells
+
+    Parameters:
+    -----------
+    global_grid_list : list
+        Dissolved grids (gpd.GeoDataFrame) of processed 1km cells
+
+    global_point_list : list
+        Points (pd.DataFrame) of processed 1km cells
+
+    points : gpd.GeoDataFrame
+        Input points (used to calculate distance moved)
+
+    km_origins : pd.DataFrame
+        1km prefixes and their lower left coordinates as returned by
+        gridgran.get_km_origins()
+
+    classification_dict : dict
+        Classification thresholds
+
+    fill_values_below_threshold_with : str
+        See GridGranulatorGPKG (DEFAULT='minimum')
+
+    integer_ids : bool
+        If True, IDs are decoded from int64 codes (DEFAULT=False)
+
+    metrics : gridgran.RunMetrics/None
+        If given, time taken calculating distance moved is added to
+        'distance' timer (DEFAULT=None)
+
+    Returns:
+    --------
+    grid_final : gpd.GeoDataFrame
+        Output grid with GridID and pop_density columns
+
+    point_final : pd.DataFrame
+        Points with distance moved
+
+    point_final_removed : pd.DataFrame
+        point_final with empty grids removed
+    """
+    grid_final = gpd.GeoDataFrame(pd.concat(global_grid_list),
+                                  crs=27700).reset_index()
+    point_final = pd.concat(global_point_list)
+    # p and h are output as float64 even if held as compact int32 (see
+    # gridgran.make_dtypes_compact())
+    for df in [grid_final, point_final]:
+        df[['p', 'h']] = df[['p', 'h']].astype('float64')
+    if integer_ids:
+        grid_final = gridgran.decode_id_columns(grid_final, ['dissolve_id'])
+        point_final = gridgran.decode_id_columns(point_final)
+    if metrics is None:
+        metrics = gridgran.NULL_METRICS
+    with metrics.time('distance'):
+        point_final = gridgran.calculate_dist_point_moved(
+            point_final, points, None, km_origins=km_origins)
+    point_final_removed = gridgran.make_point_df_removing_grids(point_final)
+    # Need to choose the correct method to replace values
+    grid_final = gridgran.check_for_below_threshold(
+        grid_final,
+        classification_dict['p_3'],
+        classification_dict['h_3'],
+        replace_with=fill_values_below_threshold_with)
+    grid_final.rename(columns={"dissolve_id": "GridID"}, inplace=True)
+    grid_final['pop_density'] = gridgran.calculate_pop_density(grid_final)
+    return grid_final, point_final, point_final_removed
+
+
+class StreamingOutputWriter:
+    """Class collects processed 1km cells and appends them to the output
+    layer and csvs every batch_size cells, so memory used by outputs is
+    bounded by the batch size rather than the area processed"""
+
+    def __init__(self,
+                 out_file,
+                 out_layer,
+                 out_csv,
+                 points,
+                 km_origins,
+                 classification_dict,
+                 fill_values_below_threshold_with='minimum',
+                 integer_ids=False,
+                 batch_size=100,
+                 metrics=None,
+                 output_format='gpkg',
+                 point_partitions=None):
+        """
+        Class instantiation
+
+        Parameters:
+        -----------
+        out_file : Path
+            Output geopackage (or folder, see gridgran.OUTPUT_BACKENDS)
+
+        out_layer : str
+            Output layer within geopackage (overwritten by first batch)
+
+        out_csv : Path
+            Output points csv (points_without_empty_grids.csv is written to
+            the same folder)
+
+        points, km_origins, classification_dict,
+        fill_values_below_threshold_with, integer_ids :
+            See make_output_tables()
+
+        batch_size : int
+            Number of processed 1km cells held before they are written
+            (DEFAULT=100)
+
+        metrics : gridgran.RunMetrics/None
+            If given, time taken making output tables and writing them is
+            added to 'output_tables' and 'write' timers (DEFAULT=None)
+
+        output_format : str
+            Key of gridgran.OUTPUT_BACKENDS (DEFAULT='gpkg')
+
+        point_partitions : str/None
+            Option from gridgran.POINT_PARTITIONS - if set, point tables are
+            written as datasets partitioned by tile, with a part file per
+            batch in each tile's folder (DEFAULT=None)
+        """
+        self.backend = gridgran.OUTPUT_BACKENDS[output_format](
+            out_file, out_layer, out_csv, point_partitions, km_origins)
+        self.points = points
+        self.km_origins = km_origins
+        self.classification_dict = classification_dict
+        self.fill_values_below_threshold_with = \
+            fill_values_below_threshold_with
+        self.integer_ids = integer_ids
+        self.batch_size = batch_size
+        self.metrics = gridgran.NULL_METRICS if metrics is None else metrics
+        self.grid_list = []
+        self.point_list = []
+        self.batches_written = 0
+        self.grid_ids = []
+
+    def add(self, grid_diss, point_final):
+        """Adds processed 1km cell, writing batch if batch_size reached"""
+        self.grid_list.append(grid_diss)
+        self.point_list.append(point_final)
+        if len(self.grid_list) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes cells held to outputs - first batch overwrites outputs,
+        later batches are appended"""
+        if not self.grid_list:
+            return
+        with self.metrics.time('output_tables'):
+            grid_final, point_final, point_final_removed = \
+                make_output_tables(
+                    self.grid_list,
+                    self.point_list,
+                    self.points,
+                    self.km_origins,
+                    self.classification_dict,
+                    self.fill_values_below_threshold_with,
+                    self.integer_ids,
+                    self.metrics)
+        if self.fill_values_below_threshold_with == 'null':
+            # Keep field types the same whether or not batch has nulls
+            grid_final = grid_final.astype({'p': 'float64', 'h': 'float64'})
+        elif self.fill_values_below_threshold_with == 'star':
+            grid_final = grid_final.astype({'p': object, 'h': object,
+                                            'pop_density': object})
+        with self.metrics.time('write'):
+            self.backend.write(grid_final, point_final, point_final_removed)
+        self.grid_ids.append(grid_final.GridID.values)
+        self.batches_written += 1
+        self.grid_list = []
+        self.point_list = []
+
+    def close(self):
+        """Writes remaining cells, closes outputs and returns GridIDs of all
+        cells written
+
+        Returns:
+        --------
+        grid_ids : np.array
+            GridIDs of all output cells
+        """
+        self.flush()
+        self.backend.close()
+        if not self.grid_ids:
+            return np.array([], dtype=object)
+        return np.concatenate(self.grid_ids)
@@ -0,0 +1,88 @@
+"""Module with functions to partition dataframes by cell ID so that the rows
+of any one cell are a contiguous slice of the dataframe. This avoids
+scanning whole tables with boolean masks each time a cell is subset.
+"""
+import numpy as np
+
+
+def partition_by_id(df, by):
+    """Returns df sorted by the IDs in by along with a dictionary of the
+    position of each ID's rows. The sort is stable so the rows in each slice
+    are in the same order as they would be if subset with a boolean mask
+    (i.e. df[df[by] == id])
+
+    Parameters:
+    -----------
+    df : (pd.DataFrame)
+        Dataframe to partition
+
+    by : (str/np.array)
+        Column in df, or array of the same length as df, holding the IDs to
+        partition by
+
+    Returns:
+    --------
+    df_sorted : (pd.DataFrame)
+        df sorted by IDs
+
+    offsets : (dict)
+        Dictionary of ID -> (start, stop) row positions in df_sorted
+    """
+    ids = df[by].values if isinstance(by, str) else np.asarray(by)
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    df_sorted = df.iloc[order]
+    if not len(ids):
+        return df_sorted, {}
+    starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+    stops = np.append(starts[1:], len(ids))
+    offsets = dict(zip(ids[starts], zip(starts, stops)))
+    return df_sorted, offsets
+
+
+def get_partition(df_sorted, offsets, subset_id):
+    """Returns rows of df_sorted for subset_id
+
+    Parameters:
+    -----------
+    df_sorted : (pd.DataFrame)
+        Dataframe as returned from partition_by_id()
+
+    offsets : (dict)
+        Dictionary of ID -> (start, stop) as returned from partition_by_id()
+
+    subset_id : (str)
+        ID to get rows for
+
+    Returns:
+    --------
+    df_subset : (pd.DataFrame)
+        Rows of df_sorted for subset_id (empty if subset_id is not present)
+    """
+    start, stop = offsets.get(subset_id, (0, 0))
+    return df_sorted.iloc[start:stop]
+
+
+def get_populated_ids(df, by, value_col='p'):
+    """Returns IDs in by whose rows in df sum to more than 0 in value_col,
+    found with a single groupby rather than subsetting df for each ID
+
+    Parameters:
+    -----------
+    df : (pd.DataFrame)
+        Dataframe with by and value_col columns (i.e. grids joined to
+        points)
+
+    by : (str)
+        Column in df holding the IDs (i.e. 'ID1000m')
+
+    value_col : (str)
+        Column to sum (DEFAULT='p')
+
+    Returns:
+    --------
+    populated_ids : (np.array)
+        IDs with value_col sum > 0
+    """
+    totals = df.groupby(by, sort=False)[value_col].sum()
+    return totals.index.values[totals.values > 0]
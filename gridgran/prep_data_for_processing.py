@@ -14,10 +14,10 @@ few neighbouring Local authorities
 bounds, and NOT to the bounds of the LA that is input
 
 """
-import geopandas as gpd
+import gridgran
 
 
-def get_la_geoms(la_path, la_ids, la_col, layer=None):
+def get_la_geoms(la_path, la_ids, la_col, layer=None, reader=None):
     """
     Returns geometries of local authorities corresponding to la_ids held in
     shapefile/geopackage at la_path. Layer should be used in the case of
@@ -37,28 +37,30 @@ def get_la_geoms(la_path, la_ids, la_col, layer=None):
     layer : None/str
         Layer in geopackage if any - Default None
 
+    reader : None/str
+        Key of gridgran.READERS used to read la_path - Default None (see
+        gridgran.read_layer())
+
     Returns:
     --------
     la_gdf : gpd.GeoDataframe
         Geodataframe of LA(s) to extract.
     """
-    if not layer:
-        gdf = gpd.read_file(la_path)
-    else:
-        gdf = gpd.read_file(la_path, layer=layer)
+    gdf = gridgran.read_layer(la_path, layer=layer or None, columns=[la_col],
+                              reader=reader)
     gdf = gdf[gdf[la_col].isin(la_ids)]
     gdf = gdf[[la_col, 'geometry']]
     return gdf
 
 
-def get_points(gdf, pt_path, layer=None):
+def get_points(gdf, pt_path, layer=None, reader=None):
     """Get points within LA - This will use intersect so be careful not to
-    duplicate points on neigbouring LAs that touch borders"""
+    duplicate points on neigbouring LAs that touch borders. Only points in
+    the LA's bbox are read (using the reader's spatial index/row group
+    filtering where it has one - see gridgran.READERS)"""
     bbox = list(gdf.total_bounds)
-    if not layer:
-        pts_bbox = gpd.read_file(pt_path, bbox=bbox)
-    else:
-        pts_bbox = gpd.read_file(pt_path, layer=layer, bbox=bbox)
+    pts_bbox = gridgran.read_layer(pt_path, layer=layer or None, bbox=bbox,
+                                   reader=reader)
     gdf['diss'] = 1
     gdf_diss = gdf.dissolve(by='diss')
     pts = pts_bbox.sjoin(gdf_diss, how='left', predicate='intersects').dropna()
@@ -66,7 +68,8 @@ def get_points(gdf, pt_path, layer=None):
     return pts
 
 
-def get_grids(pts, path_1km, path_125m, layer_1km=None, layer_125m=None):
+def get_grids(pts, path_1km, path_125m, layer_1km=None, layer_125m=None,
+              reader=None):
     """Extracts grids from path_1km (layer_1km) and path_125 (layer_125) to
     extent of bounds of pts
 
@@ -86,6 +89,10 @@ def get_grids(pts, path_1km, path_125m, layer_1km=None, layer_125m=None):
     layer_125 : None/str
         Layer for 125m if in gpkg (else shapefile or only layer in gpkg)
 
+    reader : None/str
+        Key of gridgran.READERS used to read grids - only Grid* columns are
+        read (Default None - see gridgran.read_layer())
+
     Returns:
     --------
     grid_1km : gpd.GeoDataFrame
@@ -94,8 +101,12 @@ def get_grids(pts, path_1km, path_125m, layer_1km=None, layer_125m=None):
     grid_125m : gpd.GeoDataFrame
         125m grid
     """
-    grid_1km = gpd.read_file(path_1km, layer=layer_1km, mask=pts)
-    grid_125m = gpd.read_file(path_125m, layer=layer_125m, mask=grid_1km)
+    grid_1km = gridgran.read_layer(
+        path_1km, layer=layer_1km, mask=pts, reader=reader,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES['1000m'])
+    grid_125m = gridgran.read_layer(
+        path_125m, layer=layer_125m, mask=grid_1km, reader=reader,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES['125m'])
     grid_125m['ID1km'] = grid_125m['GridID125m'].str[:-3] + '000'
     grid_125m = grid_125m[grid_125m.ID1km.isin(
         grid_1km.GridID1km.unique())]
@@ -115,7 +126,8 @@ def make_points_geopackage(la_path,
                            pt_layer=None,
                            pt_pop_col='people',
                            layer_1km=None,
-                           layer_125m=None):
+                           layer_125m=None,
+                           reader=None):
     """Function to call all utility helpers to prepare data and save to
     geopackage ready for processing
 
@@ -156,9 +168,14 @@ def make_points_geopackage(la_path,
 
     layer_125 : None/str
         Layer for 125m if in gpkg (else shapefile or only layer in gpkg)
+
+    reader : None/str
+        Key of gridgran.READERS used to read inputs (see
+        gridgran.read_layer())
     """
-    gdf = get_la_geoms(la_path, la_ids, la_col, layer=la_layer)
-    pts = get_points(gdf, pt_path, layer=pt_layer)
+    gdf = get_la_geoms(la_path, la_ids, la_col, layer=la_layer,
+                       reader=reader)
+    pts = get_points(gdf, pt_path, layer=pt_layer, reader=reader)
     if not uprn_col:
         if 'uprn' not in pts.columns:
             pts['uprn'] = pts.index.copy()
@@ -180,7 +197,8 @@ def make_points_geopackage(la_path,
         path_1km,
         path_125m,
         layer_1km=layer_1km,
-        layer_125m=layer_125m
+        layer_125m=layer_125m,
+        reader=reader
     )
     grid_1km.to_file(out_path, layer='1000m', index=False, driver='GPKG')
     grid_125m.to_file(out_path, layer='125m', index=False, driver='GPKG')
@@ -0,0 +1,584 @@
+"""Module with array backed alternative to GridDisclosureChecker.
+
+A 1km cell only ever holds 64 125m cells (leaves), so rather than building
+new dataframes at every node of the 1km -> 500m -> 250m -> 125m walk, the
+state of a cell is held as NumPy arrays:
+    - per leaf: p, h, classification and the level the leaf is dissolved to
+    - per point row: the leaf it is in (point-to-leaf vector), p, h, the
+      leaf it moved from at each level and its position in df_grid_pt
+
+Leaves are numbered in the order of their ID125m strings (i.e. by the 125m,
+250m then 500m quadrant digits) so that any list of leaves taken in leaf
+order matches the order of the equivalent rows in df_grid.
+
+The same classify/shuffle/dissolve rules as the dataframe implementation
+(top_down_checks, shuffle_helpers) are applied, drawing from the random
+number generators in the same order, so for a fixed seed both
+implementations give the same cells and points.
+"""
+import numpy as np
+import pandas as pd
+
+import gridgran
+
+ID_LEVELS = ['ID125m', 'ID250m', 'ID500m', 'ID1000m']
+
+N_LEAVES = 64
+
+LEAVES = np.arange(N_LEAVES)
+
+LEAF_QUADRANTS = {  # Quadrant (0-3) of each leaf's cell at each level
+    'ID125m': LEAVES // 16,
+    'ID250m': (LEAVES // 4) % 4,
+    'ID500m': LEAVES % 4,
+}
+
+POINT_ARRAYS = ['src', 'label', 'leaf', 'p', 'h',
+                'ID500m_LEVEL_MOVE_ORIGIN',
+                'ID250m_LEVEL_MOVE_ORIGIN',
+                'ID125m_LEVEL_MOVE_ORIGIN']
+
+
+def get_id_digits(ids):
+    """Returns last 3 digits (125m, 250m and 500m quadrant digits) of IDs
+
+    Parameters:
+    -----------
+    ids : (np.array)
+        ID strings or int64 codes (see id_codec)
+
+    Returns:
+    --------
+    digits : (np.array)
+        Integer array of last 3 digits of IDs
+    """
+    ids = np.asarray(ids)
+    if ids.dtype.kind in 'iuf':
+        return ids.astype('int64') % 1000
+    return np.array([int(i[-3:]) for i in ids], dtype='int64')
+
+
+def get_leaf_numbers(ids):
+    """Returns leaf number (0-63) of 125m IDs within their 1km cell
+
+    Parameters:
+    -----------
+    ids : (np.array)
+        125m ID strings or int64 codes (see id_codec)
+
+    Returns:
+    --------
+    leaves : (np.array)
+        Integer array of leaf numbers
+    """
+    digits = get_id_digits(ids)
+    return ((digits // 100 - 1) * 16 + ((digits // 10) % 10 - 1) * 4 +
+            (digits % 10 - 1))
+
+
+def take_point_arrays(points, idx):
+    """Returns point arrays for rows idx"""
+    return {k: v[idx] for k, v in points.items()}
+
+
+def concat_point_arrays(points_list):
+    """Returns point arrays concatenated in order"""
+    return {k: np.concatenate([x[k] for x in points_list]) for k in
+            POINT_ARRAYS}
+
+
+def classify_quadrant_arrays(points, level, classification_dict, cls_2_prp=0):
+    """Returns classification of the 4 cells at level within the parent
+    cell holding points - equivalent of utils.aggregrid() followed by
+    utils.classify()
+
+    Parameters:
+    -----------
+    points : (dict)
+        Point arrays of a single parent cell
+
+    level : (str)
+        Level of cells to classify
+
+    classification_dict : (dict)
+        Classification thresholds
+
+    cls_2_prp : (float)
+        See utils.classify() (DEFAULT=0)
+
+    Returns:
+    --------
+    classification : (np.array)
+        Classification of each quadrant (-1 where quadrant has no rows)
+    """
+    quadrants = LEAF_QUADRANTS[level][points['leaf']]
+    present = np.bincount(quadrants, minlength=4) > 0
+    p = np.bincount(quadrants, weights=points['p'], minlength=4)
+    h = np.bincount(quadrants, weights=points['h'], minlength=4)
+    cls = np.minimum(
+        gridgran.classify_values(p, classification_dict['p_1'],
+                                 classification_dict['p_2'],
+                                 classification_dict['p_3']),
+        gridgran.classify_values(h, classification_dict['h_1'],
+                                 classification_dict['h_2'],
+                                 classification_dict['h_3']))
+    cls[~present] = -1
+    is_2 = cls == 2
+    if present.all() and is_2.any():
+        prp_p = p[is_2].sum() / p.sum()
+        prp_h = h[is_2].sum() / h.sum()
+        if prp_p > prp_h:
+            prp = prp_p
+        else:
+            prp = prp_h
+        if prp < cls_2_prp:
+            cls[is_2] = 1
+    return cls
+
+
+def move_point_arrays(points, idx, level, targets):
+    """Returns points idx moved to random leaves in targets (drawn as in
+    shuffle_helpers.change_to_random_ids()) with the leaf they moved from
+    recorded at level"""
+    moved = take_point_arrays(points, idx)
+    moved[f'{level}_LEVEL_MOVE_ORIGIN'] = moved['leaf'].copy()
+    choice = gridgran.get_random_targets(len(idx), len(targets))
+    moved['leaf'] = np.asarray(targets, dtype='int64')[choice]
+    moved['label'] = np.arange(len(idx))
+    return moved
+
+
+def move_cls_1_to_4_arrays(points, classes, level, leaves):
+    """Array equivalent of shuffle_helpers.move_cls_1_to_4()
+
+    Parameters:
+    -----------
+    points : (dict)
+        Point arrays of a single parent cell
+
+    classes : (np.array)
+        Classification of the 4 cells at level
+
+    level : (str)
+        Current level
+
+    leaves : (np.array)
+        Leaves of the parent cell (in leaf order)
+
+    Returns:
+    --------
+    points : (dict)
+        Points with class 1 points moved to class 4 cells
+    """
+    point_cls = classes[LEAF_QUADRANTS[level][points['leaf']]]
+    targets = list(leaves[classes[LEAF_QUADRANTS[level][leaves]] == 4])
+    to_move = np.flatnonzero(point_cls == 1)
+    moved = move_point_arrays(points, to_move, level, targets)
+    left_behind = take_point_arrays(points, to_move)
+    left_behind['p'] = np.zeros_like(left_behind['p'])
+    left_behind['h'] = np.zeros_like(left_behind['h'])
+    left_behind['label'] = np.arange(len(to_move), 2 * len(to_move))
+    not_moved = take_point_arrays(points, np.flatnonzero(point_cls != 1))
+    return concat_point_arrays([not_moved, moved, left_behind])
+
+
+def get_p_h_needed_arrays(p, threshold_p, threshold_h):
+    """Array equivalent of shuffle_helpers.get_p_h_needed()"""
+    p_needed = threshold_p - p.sum()
+    h_needed = threshold_h - len(p)
+    if p_needed <= 0:
+        p_needed = 1
+    if h_needed <= 0:
+        h_needed = 1
+    return p_needed, h_needed
+
+
+def separate_excess_rows_in_cls_4_arrays(p,
+                                         leaf,
+                                         threshold_h=25,
+                                         threshold_p=50,
+                                         num_iterations=100,
+                                         sample_increase_frequency=10,
+                                         number_to_increase_sample=1,
+                                         metrics=None):
+    """Array equivalent of shuffle_helpers.separate_excess_rows_in_df_cls_4()
+
+    Parameters:
+    -----------
+    p : (np.array)
+        Population of points in class 4 cell
+
+    leaf : (np.array)
+        Leaves of points in class 4 cell
+
+    For other parameters see shuffle_helpers.separate_excess_rows_in_df_cls_4()
+
+    Returns:
+    --------
+    separated : (np.array/None)
+        Positions of points kept in the cell (None if points could not be
+        separated)
+
+    excess : (np.array/None)
+        Positions of excess points (None if points could not be separated)
+    """
+    best_match_idx, threshold_h = gridgran.sample_excess_rows_cls_4(
+        p,
+        p.mean(),
+        threshold_h=threshold_h,
+        threshold_p=threshold_p,
+        num_iterations=num_iterations,
+        sample_increase_frequency=sample_increase_frequency,
+        number_to_increase_sample=number_to_increase_sample,
+        metrics=metrics)
+    if best_match_idx is None:
+        return None, None
+    is_separated = np.isin(leaf, leaf[best_match_idx])
+    if (p[is_separated].sum() < threshold_p) or \
+            ((p[is_separated] > 0).sum() < threshold_h):
+        return None, None
+    return np.flatnonzero(is_separated), np.flatnonzero(~is_separated)
+
+
+def get_excess_points_for_cls_3_arrays(p,
+                                       p_needed,
+                                       h_needed,
+                                       num_iterations=100,
+                                       sample_increase_frequency=10,
+                                       number_to_increase_sample=1,
+                                       metrics=None):
+    """Array equivalent of shuffle_helpers.get_excess_points_for_cls_3_df()
+
+    Parameters:
+    -----------
+    p : (np.array)
+        Population of excess points
+
+    For other parameters see shuffle_helpers.get_excess_points_for_cls_3_df()
+
+    Raises:
+    -------
+    DataFrameNotOverDisclosureLimitException
+        When there are not enough excess points
+
+    Returns:
+    --------
+    best_match_idx : (np.array/None)
+        Positions of excess points to move
+    """
+    return gridgran.sample_excess_points_cls_3(
+        p,
+        p_needed,
+        h_needed,
+        num_iterations=num_iterations,
+        sample_increase_frequency=sample_increase_frequency,
+        number_to_increase_sample=number_to_increase_sample,
+        metrics=metrics)
+
+
+def make_cls_3_to_cls_4_arrays(points,
+                               classes,
+                               level,
+                               threshold_p=50,
+                               threshold_h=25,
+                               num_iterations=100,
+                               sample_increase_frequency=10,
+                               number_to_increase_sample=1,
+                               metrics=None):
+    """Array equivalent of shuffle_helpers.check_cls_3_can_become_cls_4()
+    followed by shuffle_helpers.make_cls_3_to_cls_4()
+
+    Parameters:
+    -----------
+    points : (dict)
+        Point arrays of a single parent cell
+
+    classes : (np.array)
+        Classification of the 4 cells at level
+
+    level : (str)
+        Current level
+
+    For other parameters see shuffle_helpers.make_cls_3_to_cls_4()
+
+    Raises:
+    -------
+    DataFrameNotOverDisclosureLimitException
+        When class 3 cells cannot be brought over the disclosure limit
+
+    Returns:
+    --------
+    points : (dict)
+        Points with excess points moved into class 3 cells
+    """
+    quadrants = LEAF_QUADRANTS[level][points['leaf']]
+    point_cls = classes[quadrants]
+    p = points['p']
+    idx_3 = np.flatnonzero(point_cls == 3)
+    idx_4 = np.flatnonzero(point_cls == 4)
+    excess_list = []
+    remainder_list = []
+    for quadrant in pd.unique(quadrants[idx_4]):
+        idx = idx_4[quadrants[idx_4] == quadrant]
+        separated, excess = separate_excess_rows_in_cls_4_arrays(
+            p[idx], points['leaf'][idx],
+            threshold_h=threshold_h,
+            threshold_p=threshold_p,
+            metrics=metrics)
+        if separated is None:
+            remainder_list.append(idx)
+        else:
+            excess_list.append(idx[excess])
+            remainder_list.append(idx[separated])
+    excess_list.append(np.flatnonzero(point_cls == 1))
+    remainder_list.append(np.flatnonzero(point_cls == 0))
+    excess = take_point_arrays(points, np.concatenate(excess_list))
+    remainder = take_point_arrays(points, np.concatenate(remainder_list))
+    quadrants_3 = pd.unique(quadrants[idx_3])
+    p_needed_total = 0
+    h_needed_total = 0
+    for quadrant in quadrants_3:
+        idx = idx_3[(quadrants[idx_3] == quadrant) & (p[idx_3] > 0)]
+        p_needed, h_needed = get_p_h_needed_arrays(p[idx], threshold_p,
+                                                   threshold_h)
+        p_needed_total += p_needed
+        h_needed_total += h_needed
+    if (p_needed_total > excess['p'].sum()) or \
+            (h_needed_total > len(excess['p'])):
+        raise gridgran.DataFrameNotOverDisclosureLimitException
+    points_list = []
+    for i, quadrant in enumerate(quadrants_3):
+        idx = idx_3[quadrants[idx_3] == quadrant]
+        p_needed, h_needed = get_p_h_needed_arrays(p[idx], threshold_p,
+                                                   threshold_h)
+        if i == len(quadrants_3) - 1:  # Last cell takes all excess points
+            if (len(excess['p']) >= h_needed) & (excess['p'].sum() >=
+                                                 p_needed):
+                best_match_idx = np.flatnonzero(excess['p'] > 0)
+            else:
+                best_match_idx = None
+        else:
+            best_match_idx = get_excess_points_for_cls_3_arrays(
+                excess['p'],
+                p_needed,
+                h_needed,
+                num_iterations=num_iterations,
+                sample_increase_frequency=sample_increase_frequency,
+                number_to_increase_sample=number_to_increase_sample,
+                metrics=metrics)
+        if best_match_idx is None:
+            raise gridgran.DataFrameNotOverDisclosureLimitException
+        targets = list(np.unique(points['leaf'][idx]))
+        moved = move_point_arrays(excess, best_match_idx, level, targets)
+        # Rows are zeroed by index label as in the dataframe implementation
+        is_moved = np.isin(excess['label'], excess['label'][best_match_idx])
+        excess['p'] = np.where(is_moved, 0, excess['p']).astype(
+            excess['p'].dtype)
+        excess['h'] = np.where(is_moved, 0, excess['h']).astype(
+            excess['h'].dtype)
+        points_list += [take_point_arrays(points, idx), moved]
+    return concat_point_arrays(points_list + [excess, remainder])
+
+
+def check_cells_arrays(points, classes, level, leaves, metrics=None):
+    """Array equivalent of top_down_checks.check_cells() for a single
+    parent cell
+
+    Parameters:
+    -----------
+    points : (dict)
+        Point arrays of a single parent cell
+
+    classes : (np.array)
+        Classification of the 4 cells at level
+
+    level : (str)
+        Current level
+
+    leaves : (np.array)
+        Leaves of the parent cell (in leaf order)
+
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        shuffle_helpers.sample_excess_rows_cls_4()) (DEFAULT = None)
+
+    Returns:
+    --------
+    points : (dict)
+        Points after any shuffling
+
+    child_cells_valid : (bool)
+        False if cells should be dissolved to parent level
+    """
+    unique_vals = list(np.unique(classes[classes >= 0]))
+    if (2 in unique_vals) or unique_vals in [[1], [3], [0, 1], [0, 3]]:
+        return points, False
+    if unique_vals in [[1, 4], [0, 1, 4]]:
+        return move_cls_1_to_4_arrays(points, classes, level, leaves), True
+    if unique_vals in [[1, 3], [0, 1, 3], [0, 1, 3, 4], [1, 3, 4]]:
+        try:
+            return make_cls_3_to_cls_4_arrays(points, classes, level,
+                                              metrics=metrics), True
+        except gridgran.DataFrameNotOverDisclosureLimitException:
+            return points, False
+    return points, True
+
+
+class QuadtreeDisclosureChecker(gridgran.GridDisclosureChecker):
+    """Array backed equivalent of GridDisclosureChecker. Takes the same
+    parameters and returns the same grid and point dataframes, but checks
+    and shuffles a 1km cell's 64 leaves using NumPy arrays (see module
+    docstring)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.leaf_p = np.zeros(N_LEAVES)
+        self.leaf_h = np.zeros(N_LEAVES)
+        self.leaf_classification = np.full(N_LEAVES, -1)
+        self.leaf_dissolve_level = np.full(N_LEAVES, None, dtype=object)
+
+    def get_class_dict(self, level):
+        """Returns classification dict with class 2 removed if set in
+        classification settings for level"""
+        class_dict = self.classification_dict.copy()
+        if self.classification_settings[f"cls_2_threshold_{level[2:]}"]:
+            class_dict['p_2'] = None
+            class_dict['h_2'] = None
+        return class_dict
+
+    def dissolve(self, leaves, points, level):
+        """Records leaves as dissolved to level along with their points"""
+        self.leaf_dissolve_level[leaves] = level
+        self.global_grid_list.append(leaves)
+        self.global_grid_pt_list.append(points)
+
+    def execute(self):
+        """
+        Iterates through each level until children cells cannot be
+        classified over disclosure limit
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        global_grid : (pd.DataFrame)
+            Dataframe of processed/classified grid cells with dissolve_id
+            field completed for all rows
+
+        global_grid_pt : (pd.DataFrame)
+            Dataframe of points in cells with record of where cells have
+            moved from
+        """
+        grid_leaves = get_leaf_numbers(self.df_grid.ID125m.values)
+        leaf_rows = np.full(N_LEAVES, -1)
+        leaf_rows[grid_leaves] = np.arange(len(grid_leaves))
+        leaves = np.sort(grid_leaves)
+        pt_leaves = grid_leaves[pd.Index(self.df_grid.ID125m).get_indexer(
+            self.df_grid_pt.ID125m)]
+        no_move = np.full(len(pt_leaves), -1)
+        points = {
+            'src': np.arange(len(pt_leaves)),
+            'label': self.df_grid_pt.index.values,
+            'leaf': pt_leaves,
+            'p': self.df_grid_pt.p.values.copy(),
+            'h': self.df_grid_pt.h.values.copy(),
+            'ID500m_LEVEL_MOVE_ORIGIN': no_move,
+            'ID250m_LEVEL_MOVE_ORIGIN': no_move,
+            'ID125m_LEVEL_MOVE_ORIGIN': no_move,
+        }
+        # ID500m LEVEL
+        classes = np.full(4, -1)
+        classes[get_id_digits(self.df.ID500m.values) % 10 - 1] = \
+            self.df.classification.values
+        points, child_cells_valid_500 = check_cells_arrays(
+            points, classes, 'ID500m', leaves, metrics=self.metrics)
+        if not child_cells_valid_500:
+            self.dissolve(leaves, points, 'ID1000m')
+        else:
+            class_dict = self.get_class_dict('ID250m')
+            quadrants_500 = LEAF_QUADRANTS['ID500m'][points['leaf']]
+            for quadrant_500 in np.unique(quadrants_500):
+                points_500 = take_point_arrays(
+                    points, np.flatnonzero(quadrants_500 == quadrant_500))
+                leaves_500 = leaves[LEAF_QUADRANTS['ID500m'][leaves] ==
+                                    quadrant_500]
+                classes = classify_quadrant_arrays(points_500, 'ID250m',
+                                                   class_dict,
+                                                   cls_2_prp=self.cls_2_prp)
+                points_500, child_cells_valid_250 = check_cells_arrays(
+                    points_500, classes, 'ID250m', leaves_500,
+                    metrics=self.metrics)
+                if not child_cells_valid_250:
+                    self.dissolve(leaves_500, points_500, 'ID500m')
+                    continue
+                # As in GridDisclosureChecker, the 125m class dict is also
+                # used for any remaining 500m cells
+                class_dict = self.get_class_dict('ID125m')
+                quadrants_250 = LEAF_QUADRANTS['ID250m'][points_500['leaf']]
+                for quadrant_250 in np.unique(quadrants_250):
+                    points_250 = take_point_arrays(
+                        points_500,
+                        np.flatnonzero(quadrants_250 == quadrant_250))
+                    leaves_250 = leaves_500[
+                        LEAF_QUADRANTS['ID250m'][leaves_500] == quadrant_250]
+                    classes = classify_quadrant_arrays(
+                        points_250, 'ID125m', class_dict,
+                        cls_2_prp=self.cls_2_prp)
+                    points_250, child_cells_valid_125 = check_cells_arrays(
+                        points_250, classes, 'ID125m', leaves_250,
+                        metrics=self.metrics)
+                    if child_cells_valid_125:
+                        self.dissolve(leaves_250, points_250, 'ID125m')
+                    else:
+                        self.dissolve(leaves_250, points_250, 'ID250m')
+        return self.make_grid_and_points(leaf_rows)
+
+    def make_grid_and_points(self, leaf_rows):
+        """Returns grid and point dataframes from leaf and point arrays"""
+        points = concat_point_arrays(self.global_grid_pt_list)
+        grid_leaves = np.concatenate(self.global_grid_list)
+        self.leaf_p = np.bincount(points['leaf'], weights=points['p'],
+                                  minlength=N_LEAVES)
+        self.leaf_h = np.bincount(points['leaf'], weights=points['h'],
+                                  minlength=N_LEAVES)
+        ids = {level: np.empty(N_LEAVES, dtype=self.df_grid[level].dtype)
+               for level in ID_LEVELS}
+        for level in ID_LEVELS:
+            ids[level][leaf_rows >= 0] = self.df_grid[level].values[
+                leaf_rows[leaf_rows >= 0]]
+        grid_final = self.df_grid.iloc[leaf_rows[grid_leaves]].copy()
+        grid_final['p'] = self.leaf_p[grid_leaves].astype(
+            self.df_grid.p.dtype)
+        grid_final['h'] = self.leaf_h[grid_leaves].astype(
+            self.df_grid.h.dtype)
+        grid_final = gridgran.classify(grid_final, self.classification_dict)
+        self.leaf_classification[grid_leaves] = \
+            grid_final.classification.values
+        dissolve_id = np.array([ids[level][leaf] for level, leaf in
+                                zip(self.leaf_dissolve_level[grid_leaves],
+                                    grid_leaves)],
+                               dtype=self.df_grid.ID125m.dtype)
+        if dissolve_id.dtype.kind in 'iu':
+            dissolve_id = dissolve_id.astype('float64')
+        grid_final['dissolve_id'] = dissolve_id
+        point_final = self.df_grid_pt.iloc[points['src']].copy()
+        point_final.index = points['label']
+        point_final['p'] = points['p']
+        point_final['h'] = points['h']
+        for level in ID_LEVELS[:-1]:
+            point_final[level] = ids[level][points['leaf']]
+            origin = points[f'{level}_LEVEL_MOVE_ORIGIN']
+            if np.any(origin >= 0):
+                col = f'{level}_LEVEL_MOVE_ORIGIN'
+                point_final[col] = np.where(
+                    origin >= 0, ids['ID125m'][origin],
+                    point_final[col].values)
+        return grid_final, point_final
+
+
+DISCLOSURE_CHECKERS = {
+    'dataframe': gridgran.GridDisclosureChecker,
+    'quadtree': QuadtreeDisclosureChecker,
+}
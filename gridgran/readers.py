@@ -0,0 +1,299 @@
+"""Module with readers for the point, 1km and 125m layers. Each reader in
+READERS takes the same arguments so they can be swapped using the reader
+parameter of GridGranulatorGPKG, make_df() and the prep_data_for_processing
+functions:
+
+'fiona' - gpd.read_file() using fiona, as in earlier versions. Columns are
+selected after the whole layer is read.
+
+'pyogrio' - pyogrio.read_dataframe(), which only reads the columns asked for
+and, where pyarrow is installed, reads through Arrow. This is many times
+faster than fiona on national layers.
+
+'parquet' - gpd.read_parquet() for GeoParquet files (needs pyarrow). Only
+the columns asked for are read and row groups are skipped using pyarrow
+filters, including for bbox where the file has a bbox covering column.
+
+Layers in GeoParquet are held as one file per layer in a folder, named
+after the layer (i.e. points.parquet, 1000m.parquet and 125m.parquet).
+
+Columns used are picked from each layer's schema by prefix (see
+READ_COLUMN_PREFIXES), as utils.make_df() and utils.prep_df() select them,
+so layers with columns such as people_total can still be read.
+"""
+import json
+from pathlib import Path
+
+import geopandas as gpd
+from shapely.geometry import box
+
+# Prefixes of columns used from each layer (geometry is always read)
+READ_COLUMN_PREFIXES = {
+    'points': ('uprn', 'people'),
+    '1000m': ('Grid',),
+    '125m': ('Grid',),
+}
+
+PARQUET_SUFFIXES = ('.parquet', '.geoparquet')
+
+
+def has_pyarrow():
+    """Returns True if pyarrow can be imported"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def has_pyogrio():
+    """Returns True if pyogrio can be imported"""
+    try:
+        import pyogrio  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_mask_geometry(mask):
+    """Returns mask (gpd.GeoDataFrame/gpd.GeoSeries/shapely geometry) as a
+    single geometry"""
+    if isinstance(mask, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        return mask.unary_union
+    return mask
+
+
+def select_columns(gdf, columns):
+    """Returns gdf with only columns (in gdf's order) and its geometry"""
+    if columns is None:
+        return gdf
+    return gdf[[x for x in gdf.columns if x in columns] +
+               [gdf.geometry.name]]
+
+
+def read_layer_fiona(path, layer=None, columns=None, bbox=None, mask=None):
+    """Returns layer read with gpd.read_file() using fiona
+
+    Parameters:
+    -----------
+    path : Path/str
+        Path to geopackage, shapefile or other vector file
+
+    layer : str/None
+        Layer within path (DEFAULT=None - first or only layer)
+
+    columns : list/None
+        Columns to keep along with geometry (DEFAULT=None - all columns)
+
+    bbox : tuple/None
+        (minx, miny, maxx, maxy) - only features intersecting it are read
+        (DEFAULT=None)
+
+    mask : gpd.GeoDataFrame/shapely geometry/None
+        Only features intersecting mask are read (DEFAULT=None)
+
+    Returns:
+    --------
+    gdf : gpd.GeoDataFrame
+        Layer
+    """
+    gdf = gpd.read_file(path, layer=layer, bbox=bbox, mask=mask,
+                        engine='fiona')
+    return select_columns(gdf, columns)
+
+
+def read_layer_pyogrio(path, layer=None, columns=None, bbox=None,
+                       mask=None):
+    """Returns layer read with pyogrio - through Arrow if pyarrow is
+    installed. See read_layer_fiona() for parameters."""
+    import pyogrio
+    if mask is not None:
+        mask = get_mask_geometry(mask)
+    if bbox is not None:
+        bbox = tuple(bbox)
+    return pyogrio.read_dataframe(path, layer=layer, columns=columns,
+                                  bbox=bbox, mask=mask,
+                                  use_arrow=has_pyarrow())
+
+
+def get_parquet_path(path, layer=None):
+    """Returns path of layer's GeoParquet file - path itself if it is a
+    file, else layer.parquet within folder path"""
+    path = Path(path)
+    if path.is_dir() and layer is not None:
+        return path.joinpath(f'{layer}.parquet')
+    return path
+
+
+def get_parquet_geo_metadata(path):
+    """Returns GeoParquet 'geo' metadata of file at path as a dictionary,
+    or None if it has none"""
+    import pyarrow.parquet as pq
+    metadata = pq.read_schema(path).metadata or {}
+    if b'geo' not in metadata:
+        return None
+    return json.loads(metadata[b'geo'])
+
+
+def get_parquet_geometry_column(path):
+    """Returns name of the primary geometry column of GeoParquet file at
+    path ('geometry' if the file has no 'geo' metadata)"""
+    geo = get_parquet_geo_metadata(path)
+    if geo is None:
+        return 'geometry'
+    return geo['primary_column']
+
+
+def get_parquet_bbox_filter(path, bbox):
+    """Returns pyarrow filter expression selecting rows whose bbox covering
+    column (GeoParquet 1.1) intersects bbox, so row groups outside bbox are
+    skipped, or None if the file has no bbox covering column"""
+    import pyarrow.compute as pc
+    geo = get_parquet_geo_metadata(path)
+    if geo is None:
+        return None
+    column = geo['columns'][geo['primary_column']]
+    covering = column.get('covering', {}).get('bbox')
+    if not covering:
+        return None
+    minx, miny, maxx, maxy = bbox
+
+    def field(key):
+        return pc.field(*covering[key])
+    return ((field('xmin') <= maxx) & (field('xmax') >= minx) &
+            (field('ymin') <= maxy) & (field('ymax') >= miny))
+
+
+def read_layer_parquet(path, layer=None, columns=None, bbox=None,
+                       mask=None, filters=None):
+    """Returns layer read from GeoParquet file with gpd.read_parquet()
+
+    Parameters:
+    -----------
+    path : Path/str
+        Path to GeoParquet file, or folder of layer.parquet files
+
+    layer, columns, bbox, mask :
+        See read_layer_fiona()
+
+    filters : list/pyarrow.compute.Expression/None
+        pyarrow filters on attribute columns - row groups that can't match
+        are skipped using their statistics (DEFAULT=None)
+
+    Returns:
+    --------
+    gdf : gpd.GeoDataFrame
+        Layer - its geometry column is named 'geometry', as from the other
+        readers, whatever it is named in the file
+    """
+    path = get_parquet_path(path, layer)
+    if mask is not None:
+        mask = get_mask_geometry(mask)
+        bbox = mask.bounds if bbox is None else bbox
+    if bbox is not None:
+        bbox_filter = get_parquet_bbox_filter(path, bbox)
+        if bbox_filter is not None:
+            if filters is None:
+                filters = bbox_filter
+            elif isinstance(filters, list):
+                import pyarrow.parquet as pq
+                filters = pq.filters_to_expression(filters) & bbox_filter
+            else:
+                filters = filters & bbox_filter
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns) + [get_parquet_geometry_column(path)]
+    gdf = gpd.read_parquet(path, columns=read_columns, filters=filters)
+    if gdf.geometry.name != 'geometry':
+        gdf = gdf.rename_geometry('geometry')
+    if bbox is not None:
+        gdf = gdf[gdf.intersects(box(*bbox))]
+    if mask is not None:
+        gdf = gdf[gdf.intersects(mask)]
+    return gdf
+
+
+READERS = {
+    'fiona': read_layer_fiona,
+    'pyogrio': read_layer_pyogrio,
+    'parquet': read_layer_parquet,
+}
+
+
+def get_layer_columns(path, layer=None, reader=None):
+    """Returns names of layer's columns, read from its schema without
+    reading any features
+
+    Parameters:
+    -----------
+    path, layer :
+        See read_layer_fiona()
+
+    reader : str/None
+        Key of READERS (DEFAULT=None - see get_reader_name())
+
+    Returns:
+    --------
+    columns : list
+        Column names
+    """
+    reader = get_reader_name(path, reader)
+    if reader == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(get_parquet_path(path, layer)).names
+    if reader == 'pyogrio':
+        import pyogrio
+        return list(pyogrio.read_info(path, layer=layer)['fields'])
+    import fiona
+    with fiona.open(path, layer=layer) as src:
+        return list(src.schema['properties'])
+
+
+def get_columns_by_prefix(path, prefixes, layer=None, reader=None):
+    """Returns layer's columns starting with any of prefixes (i.e.
+    READ_COLUMN_PREFIXES['points']), in the layer's order. See
+    get_layer_columns() for other parameters."""
+    return [x for x in get_layer_columns(path, layer, reader)
+            if x.startswith(tuple(prefixes))]
+
+
+def get_reader_name(path, reader=None):
+    """Returns key of READERS to use for path - reader if given, 'parquet'
+    for GeoParquet files and folders holding them, else 'fiona'"""
+    if reader is not None:
+        return reader
+    path = Path(path)
+    if path.suffix.lower() in PARQUET_SUFFIXES:
+        return 'parquet'
+    if path.is_dir() and any(path.glob('*.parquet')):
+        return 'parquet'
+    return 'fiona'
+
+
+def read_layer(path, layer=None, columns=None, bbox=None, mask=None,
+               reader=None, column_prefixes=None):
+    """Returns layer read with reader (see READERS)
+
+    Parameters:
+    -----------
+    path, layer, columns, bbox, mask :
+        See read_layer_fiona()
+
+    reader : str/None
+        Key of READERS (DEFAULT=None - see get_reader_name())
+
+    column_prefixes : tuple/None
+        If given, columns are those in the layer's schema starting with any
+        of these (see READ_COLUMN_PREFIXES and get_columns_by_prefix())
+        (DEFAULT=None)
+
+    Returns:
+    --------
+    gdf : gpd.GeoDataFrame
+        Layer
+    """
+    reader = get_reader_name(path, reader)
+    if column_prefixes is not None:
+        columns = get_columns_by_prefix(path, column_prefixes, layer, reader)
+    return READERS[reader](path, layer=layer, columns=columns, bbox=bbox,
+                           mask=mask)
@@ -1,4 +1,5 @@
 """Utilities to help moving points between cells"""
+import numpy as np
 import pandas as pd
 import random
 
@@ -27,6 +28,68 @@ def change_to_random_id(row, ids_to_change_to):
     return row
 
 
+def get_random_targets(n_points, n_targets, rng=None):
+    """Returns position of a randomly chosen target for each of n_points
+    points (drawn with replacement)
+
+    Parameters:
+    -----------
+    n_points : (int)
+        Number of points to move
+
+    n_targets : (int)
+        Number of targets to choose from
+
+    rng : (np.random.Generator/int/None)
+        See get_generator() (DEFAULT = None)
+
+    Returns:
+    ---------
+    choice : (np.array)
+        Position of target for each point
+    """
+    if n_points == 0:
+        return np.zeros(0, dtype='int64')
+    return get_generator(rng).integers(n_targets, size=n_points)
+
+
+def change_to_random_ids(points, ids_to_change_to, rng=None):
+    """
+    Vectorised change_to_random_id() - assigns each row of points to a
+    randomly chosen row of ids_to_change_to, writing each ID column at once
+    rather than calling random.choice() for each row. Targets are drawn from
+    a NumPy Generator, so for a fixed seed they differ from those chosen by
+    change_to_random_id()
+
+    Parameters:
+    -----------
+    points : (pd.DataFrame)
+        Rows to change IDs
+
+    ids_to_change_to : (pd.DataFrame/list)
+        Dataframe (as returned by utils.get_id_hierarchy_for_list_of_IDS())
+        or list of dictionaries with all the levels' IDs of each cell points
+        can be moved to
+
+    rng : (np.random.Generator/int/None)
+        See get_generator() (DEFAULT = None)
+
+    Returns:
+    ---------
+    points : (pd.DataFrame)
+        Copy of points with ID125m, ID250m and ID500m changed
+    """
+    points = points.copy()
+    if points.empty:
+        return points
+    if not isinstance(ids_to_change_to, pd.DataFrame):
+        ids_to_change_to = pd.DataFrame(ids_to_change_to)
+    choice = get_random_targets(len(points), len(ids_to_change_to), rng)
+    for col in ['ID125m', 'ID250m', 'ID500m']:
+        points[col] = ids_to_change_to[col].values[choice]
+    return points
+
+
 def get_excess_df(df,
                   df_grid_pt,
                   df_grid,
@@ -35,7 +98,8 @@ def get_excess_df(df,
                   threshold_p=50,
                   num_iterations=100,
                   sample_increase_frequency=10,
-                  number_to_increase_sample=1, ):
+                  number_to_increase_sample=1,
+                  metrics=None):
     """Returns dataframe of 'excess points' gather from class 1 cells in DF,
      as well as overflow points in class 4. Also returns dataframe of class 3
       points, as well as all remaining rows (0 cells and 4 cells not over
@@ -79,6 +143,10 @@ def get_excess_df(df,
         sample_increase_frequency (DEFAULT = 5) - FOR USE IN
         separate_excess_rows_in_df_cls_4()
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        sample_excess_rows_cls_4()) (DEFAULT = None)
+
 
     Returns:
     --------
@@ -106,6 +174,7 @@ def get_excess_df(df,
             num_iterations=100,
             sample_increase_frequency=10,
             number_to_increase_sample=1,
+            metrics=metrics,
         )
     excess_df_list.append(df_1_pt)
     df_everything_remaining = df_grid_pt[df_grid_pt[current_level].isin(
@@ -128,6 +197,7 @@ def get_list_of_execess_cls_4_and_remainder_of_cls4(
         num_iterations=100,
         sample_increase_frequency=10,
         number_to_increase_sample=1,
+        metrics=None,
         ):
     """Returns a list of excess cls 4's in each cell of df, as well as list
     of remainder class 4's that are not excess
@@ -167,6 +237,10 @@ def get_list_of_execess_cls_4_and_remainder_of_cls4(
         sample_increase_frequency (DEFAULT = 5) - FOR USE IN
         separate_excess_rows_in_df_cls_4()
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        sample_excess_rows_cls_4()) (DEFAULT = None)
+
     Returns:
     ---------
     excess_df_list : (list)
@@ -194,6 +268,7 @@ def get_list_of_execess_cls_4_and_remainder_of_cls4(
                         num_iterations=num_iterations,
                         sample_increase_frequency=sample_increase_frequency,
                         number_to_increase_sample=number_to_increase_sample,
+                        metrics=metrics,
                         )
                 # if not df_pt_excess.empty:
                 excess_df_list.append(df_pt_excess)
@@ -204,12 +279,236 @@ def get_list_of_execess_cls_4_and_remainder_of_cls4(
     return excess_df_list, remainder_df_list
 
 
+def get_generator(rng=None):
+    """Returns NumPy Generator. If rng is None, the generator is seeded from
+    the global np.random state so np.random.seed() still makes results
+    reproducible
+
+    Parameters:
+    -----------
+    rng : (np.random.Generator/int/None)
+        Generator or seed (DEFAULT = None)
+
+    Returns:
+    ---------
+    rng : (np.random.Generator)
+    """
+    if rng is None:
+        rng = np.random.randint(2 ** 31 - 1)
+    return np.random.default_rng(rng)
+
+
+def get_sample_schedule(sample_size,
+                        num_iterations=100,
+                        sample_increase_frequency=10,
+                        number_to_increase_sample=1):
+    """Returns number of rows sampled in each iteration of a sampling loop
+    where sample_size is increased by number_to_increase_sample every
+    sample_increase_frequency iterations
+
+    Parameters:
+    -----------
+    sample_size : (int)
+        Sample size in first iteration
+
+    num_iterations : (int)
+        Number of iterations (DEFAULT = 100)
+
+    sample_increase_frequency : (int)
+        See separate_excess_rows_in_df_cls_4() (DEFAULT = 10)
+
+    number_to_increase_sample : (int)
+        See separate_excess_rows_in_df_cls_4() (DEFAULT = 1)
+
+    Returns:
+    ---------
+    sizes : (np.array)
+        Sample size of each iteration
+    """
+    return sample_size + (np.arange(num_iterations) //
+                          sample_increase_frequency *
+                          number_to_increase_sample)
+
+
+def get_sample_sizes(threshold_h,
+                     n_rows,
+                     num_iterations=100,
+                     sample_increase_frequency=10,
+                     number_to_increase_sample=1):
+    """Returns number of rows sampled in each iteration of
+    separate_excess_rows_in_df_cls_4() - i.e. threshold_h increased by
+    number_to_increase_sample every sample_increase_frequency iterations,
+    stopping at num_iterations or once fewer than twice the sample size
+    rows remain
+
+    Parameters:
+    -----------
+    threshold_h : (int)
+        Sample size in first iteration
+
+    n_rows : (int)
+        Number of rows to sample from
+
+    For other parameters see separate_excess_rows_in_df_cls_4()
+
+    Returns:
+    ---------
+    sizes : (np.array)
+        Sample size of each iteration
+    """
+    sizes = get_sample_schedule(threshold_h, num_iterations,
+                                sample_increase_frequency,
+                                number_to_increase_sample)
+    too_big = np.flatnonzero(n_rows - sizes < sizes)
+    if len(too_big):
+        sizes = sizes[:too_big[0]]
+    return sizes
+
+
+def draw_sample_matrix(n_rows, sizes, rng):
+    """Returns matrix of row positions where the first sizes[i] positions
+    in row i are a random sample (without replacement) of range(n_rows)
+
+    Parameters:
+    -----------
+    n_rows : (int)
+        Number of rows to sample from
+
+    sizes : (np.array)
+        Sample size of each candidate
+
+    rng : (np.random.Generator)
+        Generator used to draw samples
+
+    Returns:
+    ---------
+    idx : (np.array)
+        Array of shape (len(sizes), sizes.max())
+    """
+    n_cols = max(sizes.max(), 0)
+    if n_cols == 0:
+        return np.zeros((len(sizes), 0), dtype='int64')
+    keys = rng.random((len(sizes), n_rows))
+    # Positions of the n_cols smallest keys in each row in order of key, the
+    # start of a random permutation of each row
+    idx = np.argpartition(keys, n_cols - 1, axis=1)[:, :n_cols]
+    order = np.argsort(np.take_along_axis(keys, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def select_best_sample(p, p_mean, idx, sizes, threshold_p):
+    """Scores all candidate samples at once and returns the sample
+    separate_excess_rows_in_df_cls_4() would have chosen if it had drawn
+    the candidates one at a time: iterations stop at the first sample with
+    population of at least threshold_p whose mean is no more than 5% above
+    p_mean, and the best sample is the first with the lowest population
+    at or above threshold_p
+
+    Parameters:
+    -----------
+    p : (np.array)
+        Population of rows sampled
+
+    p_mean : (float)
+        Mean population of all rows (including empty rows)
+
+    idx : (np.array)
+        Candidate samples as returned by draw_sample_matrix()
+
+    sizes : (np.array)
+        Sample size of each candidate
+
+    threshold_p : (int)
+        Threshold population
+
+    Returns:
+    ---------
+    best : (int/None)
+        Row of idx of best sample (None if no sample met threshold_p)
+
+    n_run : (int)
+        Number of iterations that would have been run
+    """
+    in_sample = np.arange(idx.shape[1]) < sizes[:, None]
+    pop = np.where(in_sample, p[idx], 0).sum(axis=1)
+    excess = pop - threshold_p
+    accepted = excess >= 0
+    optimal = accepted & ((pop / sizes - p_mean) / p_mean <= 0.05)
+    n_run = np.argmax(optimal) + 1 if optimal.any() else len(sizes)
+    candidates = accepted[:n_run] & (excess[:n_run] < 1000)
+    if not candidates.any():
+        return None, n_run
+    best = np.argmin(np.where(candidates, excess[:n_run], np.inf))
+    return best, n_run
+
+
+def sample_excess_rows_cls_4(p,
+                             p_mean,
+                             threshold_h=25,
+                             threshold_p=50,
+                             num_iterations=100,
+                             sample_increase_frequency=10,
+                             number_to_increase_sample=1,
+                             rng=None,
+                             metrics=None):
+    """Returns positions in p of the best sample of populated rows for
+    separate_excess_rows_in_df_cls_4(). All candidate samples are drawn as
+    one matrix and scored together rather than one DataFrame sample per
+    iteration
+
+    Parameters:
+    -----------
+    p : (np.array)
+        Population of rows
+
+    p_mean : (float)
+        Mean population of rows
+
+    rng : (np.random.Generator/int/None)
+        See get_generator() (DEFAULT = None)
+
+    metrics : (gridgran.RunMetrics/None)
+        If given, the number of trials run is added to its
+        'shuffles_attempted' counter (DEFAULT = None)
+
+    For other parameters see separate_excess_rows_in_df_cls_4()
+
+    Returns:
+    ---------
+    sample_pos : (np.array/None)
+        Positions in p of best sample (None if no sample met threshold_p)
+
+    threshold_h : (int)
+        threshold_h following increases made while sampling
+    """
+    positive = np.flatnonzero(p > 0)
+    if p[positive].sum() - threshold_p < threshold_p:
+        return None, threshold_h
+    sizes = get_sample_sizes(threshold_h, len(positive), num_iterations,
+                             sample_increase_frequency,
+                             number_to_increase_sample)
+    if not len(sizes):
+        return None, threshold_h
+    idx = draw_sample_matrix(len(positive), sizes, get_generator(rng))
+    best, n_run = select_best_sample(p[positive], p_mean, idx, sizes,
+                                     threshold_p)
+    if metrics is not None:
+        metrics.count('shuffles_attempted', n_run)
+    threshold_h += (n_run // sample_increase_frequency *
+                    number_to_increase_sample)
+    if best is None:
+        return None, threshold_h
+    return positive[idx[best, :sizes[best]]], threshold_h
+
+
 def separate_excess_rows_in_df_cls_4(df_pt,
                                      threshold_h=25,
                                      threshold_p=50,
                                      num_iterations=100,
                                      sample_increase_frequency=10,
                                      number_to_increase_sample=1,
+                                     rng=None,
+                                     metrics=None,
                                      ):
     """
     Function randomly samples df_pt by threshold_h rows iteratively until
@@ -220,7 +519,8 @@ def separate_excess_rows_in_df_cls_4(df_pt,
     Algorithm will only be run num_iterations until threshold is met. If
     after sample_increase_frequency the threshold isn't met, threshold_h
     will be increased by number_to_increase_sample to try to get the correct
-     value.
+     value. All iterations' samples are drawn and scored at once (see
+     sample_excess_rows_cls_4()).
 
     Parameters:
     -----------
@@ -248,34 +548,26 @@ def separate_excess_rows_in_df_cls_4(df_pt,
     number_to_increase_sample : (int)
         Number by which to increase the sample rows number every
         sample_increase_frequency (DEFAULT = 5)
+
+    rng : (np.random.Generator/int/None)
+        Generator or seed used to draw samples. If None, a generator is
+        seeded from the global np.random state (DEFAULT = None)
+
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        sample_excess_rows_cls_4()) (DEFAULT = None)
      """
-    counter = 0  # Count number of iterations
-    optimal_reached = False  # Switch to break while loop
-    best_match = 1000
-    best_match_df = None
-    while not optimal_reached:
-        if (len(df_pt[df_pt.p > 0]) - threshold_h >= threshold_h) & \
-                (df_pt[df_pt.p > 0].p.sum() - threshold_p >= threshold_p):
-            sample_df = df_pt[df_pt.p > 0].sample(
-                n=threshold_h)  # subset a sample
-            pop = sample_df.p.sum()
-            if pop - threshold_p >= 0:  # Pop should be more than the theshold
-                if pop - threshold_p < best_match:
-                    best_match = pop - threshold_p
-                    best_match_df = sample_df.copy()
-                # if sample_df.p.mean() <= df_pt.p.mean():
-                if (sample_df.p.mean() - df_pt.p.mean()) / df_pt.p.mean() \
-                        <= 0.05:
-                    # Is the sample mean within 5% of the whole population
-                    # mean?
-                    optimal_reached = True
-            counter += 1
-            if counter % sample_increase_frequency == 0:
-                threshold_h += number_to_increase_sample
-            if counter >= num_iterations:
-                optimal_reached = True
-        else:
-            optimal_reached = True
+    sample_pos, threshold_h = sample_excess_rows_cls_4(
+        df_pt.p.values,
+        df_pt.p.mean(),
+        threshold_h=threshold_h,
+        threshold_p=threshold_p,
+        num_iterations=num_iterations,
+        sample_increase_frequency=sample_increase_frequency,
+        number_to_increase_sample=number_to_increase_sample,
+        rng=rng,
+        metrics=metrics)
+    best_match_df = None if sample_pos is None else df_pt.iloc[sample_pos]
     df_pt_separated, df_pt_excess = get_separated_points_and_excess_points(
         best_match_df, df_pt, threshold_p, threshold_h)
     return df_pt_separated, df_pt_excess
@@ -385,7 +677,7 @@ def move_cls_1_to_4(df, df_grid, df_grid_pt, current_level, parent_level,
     """
     ids_1 = gridgran.get_ids(df, current_level, 1)
     ids_4 = gridgran.get_ids(df, current_level, 4)
-    ids_to_change_to = gridgran.get_list_of_rowIDS_for_list_of_IDS(
+    ids_to_change_to = gridgran.get_id_hierarchy_for_list_of_IDS(
         df_grid, ids_4, current_level)
     points_to_move = df_grid_pt[df_grid_pt[current_level].isin(ids_1)]
     df_grid_pt = df_grid_pt[~df_grid_pt[current_level].isin(ids_1)]
@@ -396,9 +688,7 @@ def move_cls_1_to_4(df, df_grid, df_grid_pt, current_level, parent_level,
     # if len(points_to_move):
     points_to_move = points_to_move.reset_index(drop=True)
     points_to_move.loc[:, col] = points_to_move.ID125m.copy()
-    points_to_move = points_to_move.apply(change_to_random_id,
-                                          ids_to_change_to=ids_to_change_to,
-                                          axis=1).copy()
+    points_to_move = change_to_random_ids(points_to_move, ids_to_change_to)
     ROWS_TO_REPLACE = pd.concat([points_to_move,
                                  rows_to_insert_back]).reset_index(drop=True)
     df_grid_pt = pd.concat([df_grid_pt, ROWS_TO_REPLACE])
@@ -418,7 +708,8 @@ def make_cls_3_to_cls_4(df_3_pt,
                         num_iterations=100,
                         sample_increase_frequency=10,
                         number_to_increase_sample=1,
-                        cls_2_prp=0
+                        cls_2_prp=0,
+                        metrics=None
                         ):
     """Function makes attempt at bringing class 3 df over threshold using
     excess points. All dataFrames are then concatenated and returned. If any
@@ -480,6 +771,10 @@ def make_cls_3_to_cls_4(df_3_pt,
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        sample_excess_rows_cls_4()) (DEFAULT = None)
+
 
     Raises:
     ------
@@ -505,23 +800,22 @@ def make_cls_3_to_cls_4(df_3_pt,
                 h_needed,
                 num_iterations=100,
                 sample_increase_frequency=10,
-                number_to_increase_sample=1)
+                number_to_increase_sample=1,
+                metrics=metrics)
         try:
             assert isinstance(best_match_df, pd.DataFrame)
             df_grid_tmp = gridgran.aggregrid(df_3, classification_dict,
                                              level='ID125m',
                                              cls_2_prp=cls_2_prp)
-            ids_to_change_to = gridgran.get_list_of_rowIDS_for_list_of_IDS(
+            ids_to_change_to = gridgran.get_id_hierarchy_for_list_of_IDS(
                 df_grid_tmp, [id_3], current_level)
             df_excess_pt.loc[best_match_df.index, 'p'] = 0
             df_excess_pt.loc[best_match_df.index, 'h'] = 0
             col = f'{current_level}_LEVEL_MOVE_ORIGIN'
             best_match_df = best_match_df.reset_index(drop=True)
             best_match_df.loc[:, col] = best_match_df.ID125m.copy()
-            best_match_df = best_match_df.apply(
-                change_to_random_id,
-                ids_to_change_to=ids_to_change_to,
-                axis=1).copy()
+            best_match_df = change_to_random_ids(best_match_df,
+                                                 ids_to_change_to)
             df_3_to_4_list.append(pd.concat([df_3, best_match_df]))
         except AssertionError:
             raise gridgran.DataFrameNotOverDisclosureLimitException
@@ -535,16 +829,87 @@ def make_cls_3_to_cls_4(df_3_pt,
     return df_grid, df_grid_pt
 
 
+def sample_excess_points_cls_3(p,
+                               p_needed,
+                               h_needed,
+                               num_iterations=100,
+                               sample_increase_frequency=10,
+                               number_to_increase_sample=1,
+                               rng=None,
+                               metrics=None):
+    """Returns positions in p of the sample of populated rows chosen by
+    get_excess_points_for_cls_3_df(). The whole trial schedule (h_needed
+    rows, increased by number_to_increase_sample every
+    sample_increase_frequency trials) is drawn as one matrix and all sample
+    sums are calculated at once. Trials stop at the first sample with at
+    least p_needed that is within 10% of p_needed, and the first sample with
+    at least p_needed and an excess over p_needed below 1000 is kept.
+
+    Parameters:
+    -----------
+    p : (np.array)
+        Population of excess rows
+
+    rng : (np.random.Generator/int/None)
+        See get_generator() (DEFAULT = None)
+
+    metrics : (gridgran.RunMetrics/None)
+        If given, the number of trials run is added to its
+        'shuffles_attempted' counter (DEFAULT = None)
+
+    For other parameters see get_excess_points_for_cls_3_df()
+
+    Raises:
+    ------
+    DataFrameNotOverDisclosureLimitException
+        When there are fewer populated rows than a trial's sample size
+
+    Returns:
+    --------
+    sample_pos : (np.array/None)
+        Positions in p of sample (None if no sample had p_needed)
+    """
+    positive = np.flatnonzero(p > 0)
+    sizes = get_sample_schedule(h_needed, num_iterations,
+                                sample_increase_frequency,
+                                number_to_increase_sample)
+    too_big = np.flatnonzero(sizes > len(positive))
+    n_possible = too_big[0] if len(too_big) else len(sizes)
+    if n_possible == 0:
+        raise gridgran.DataFrameNotOverDisclosureLimitException
+    sizes = sizes[:n_possible]
+    idx = draw_sample_matrix(len(positive), sizes, get_generator(rng))
+    in_sample = np.arange(idx.shape[1]) < sizes[:, None]
+    pop = np.where(in_sample, p[positive][idx], 0).sum(axis=1)
+    accepted = pop >= p_needed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        optimal = accepted & ((pop - p_needed) / p_needed <= 0.1)
+    n_run = np.argmax(optimal) + 1 if optimal.any() else n_possible
+    if metrics is not None:
+        metrics.count('shuffles_attempted', n_run)
+    if not optimal.any() and len(too_big):
+        # Sample size outgrows populated rows before trials finish
+        raise gridgran.DataFrameNotOverDisclosureLimitException
+    candidates = accepted[:n_run] & (pop[:n_run] - p_needed < 1000)
+    if not candidates.any():
+        return None
+    best = np.argmax(candidates)
+    return positive[idx[best, :sizes[best]]]
+
+
 def get_excess_points_for_cls_3_df(df_excess_pt,
                                    p_needed,
                                    h_needed,
                                    num_iterations=100,
                                    sample_increase_frequency=10,
-                                   number_to_increase_sample=1
+                                   number_to_increase_sample=1,
+                                   rng=None,
+                                   metrics=None
                                    ):
     """
     Returns best match df to match p and h needed as extracted from
-    df_excess_pt
+    df_excess_pt. All trials' samples are drawn and summed at once (see
+    sample_excess_points_cls_3()).
 
     Parameters:
     -----------
@@ -570,6 +935,14 @@ def get_excess_points_for_cls_3_df(df_excess_pt,
         Number by which to increase the sample rows number every
         sample_increase_frequency (DEFAULT = 1)
 
+    rng : (np.random.Generator/int/None)
+        Generator or seed used to draw samples. If None, a generator is
+        seeded from the global np.random state (DEFAULT = None)
+
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        sample_excess_rows_cls_4()) (DEFAULT = None)
+
 
     Raises:
     ------
@@ -585,29 +958,18 @@ def get_excess_points_for_cls_3_df(df_excess_pt,
          DataFrameNotOverDisclosureLimitException
 
     """
-    counter = 0  # Count number of iterations
-    optimal_reached = False  # Switch to break while loop
-    best_match = 1000
-    best_match_df = None
-    while not optimal_reached:
-        if len(df_excess_pt[df_excess_pt.p > 0]) >= h_needed:
-            df_sample = df_excess_pt[df_excess_pt.p > 0].sample(n=h_needed)
-        else:
-            raise gridgran.DataFrameNotOverDisclosureLimitException
-        pop = df_sample.p.sum()
-        if pop >= p_needed:
-            if pop - p_needed < best_match:
-                best_match = pop - pop - p_needed
-                best_match_df = df_sample.copy()
-            if (pop - p_needed) / p_needed <= 0.1:  # Within 5%
-                optimal_reached = True
-                break
-        counter += 1
-        if counter % sample_increase_frequency == 0:
-            h_needed += number_to_increase_sample
-        if counter >= num_iterations:
-            optimal_reached = True
-    return best_match_df
+    sample_pos = sample_excess_points_cls_3(
+        df_excess_pt.p.values,
+        p_needed,
+        h_needed,
+        num_iterations=num_iterations,
+        sample_increase_frequency=sample_increase_frequency,
+        number_to_increase_sample=number_to_increase_sample,
+        rng=rng,
+        metrics=metrics)
+    if sample_pos is None:
+        return None
+    return df_excess_pt.iloc[sample_pos].copy()
 
 
 def get_p_h_needed(df_grid_pt, threshold_p,
@@ -645,7 +1007,8 @@ def check_cls_3_can_become_cls_4(df,
                                  threshold_h=25,
                                  num_iterations=100,
                                  sample_increase_frequency=10,
-                                 number_to_increase_sample=1
+                                 number_to_increase_sample=1,
+                                 metrics=None
                                  ):
     """Checks to see if there are enough excess points in df_grid_pt to
     bring class 3 cells over disclosure limit. If returns True, df_3_pt,
@@ -684,6 +1047,10 @@ def check_cls_3_can_become_cls_4(df,
         Number by which to increase the sample rows number every
         sample_increase_frequency (DEFAULT = 5)
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        sample_excess_rows_cls_4()) (DEFAULT = None)
+
     Returns:
     ---------
     ok_to_move : (bool)
@@ -710,7 +1077,8 @@ def check_cls_3_can_become_cls_4(df,
         threshold_p=threshold_p,
         num_iterations=num_iterations,
         sample_increase_frequency=sample_increase_frequency,
-        number_to_increase_sample=number_to_increase_sample
+        number_to_increase_sample=number_to_increase_sample,
+        metrics=metrics
         )
     ok_to_move = False
     IDS = df_3_pt[current_level].unique()
@@ -0,0 +1,115 @@
+"""Module with functions to hold df_grid_pt sparsely - without the rows that
+the left join of the grid to points adds for empty 125m cells - and to put
+those rows back for one 1km cell at a time just before it is checked.
+
+Most 125m cells are empty in rural areas, so the sparse table is much
+smaller to sort, partition and subset. Where each empty row was, and its
+index label, are kept on its cell's row in df_grid (EMPTY_ROW_POSITION and
+EMPTY_ROW_INDEX) so the 1km cell handed to the disclosure checker has the
+same rows in the same order as without sparse mode, and results are the
+same.
+"""
+import numpy as np
+import pandas as pd
+
+EMPTY_ROW_POSITION = 'EMPTY_ROW_POSITION'
+EMPTY_ROW_INDEX = 'EMPTY_ROW_INDEX'
+
+
+def make_sparse(df_grid, df_grid_pt):
+    """Returns df_grid_pt with rows of empty 125m cells removed and df_grid
+    with the position (within its 1km cell) and index label of each removed
+    row
+
+    Parameters:
+    -----------
+    df_grid : (pd.DataFrame)
+        Grid dataframe aggregated to 125m level
+
+    df_grid_pt : (pd.DataFrame)
+        Grids joined to points
+
+    Returns:
+    --------
+    df_grid : (pd.DataFrame)
+        df_grid with EMPTY_ROW_POSITION (-1 where cell has points) and
+        EMPTY_ROW_INDEX columns
+
+    df_grid_pt : (pd.DataFrame)
+        df_grid_pt with only rows joined to points
+    """
+    empty = df_grid_pt.uprn.isna().values
+    position = df_grid_pt.groupby('ID1000m', sort=False).cumcount().values
+    df_empty = pd.DataFrame({EMPTY_ROW_POSITION: position[empty],
+                             EMPTY_ROW_INDEX: df_grid_pt.index[empty]},
+                            index=df_grid_pt.ID125m.values[empty])
+    df_grid = df_grid.copy()
+    df_grid[EMPTY_ROW_POSITION] = df_grid.ID125m.map(
+        df_empty[EMPTY_ROW_POSITION]).fillna(-1).astype('int64').values
+    df_grid[EMPTY_ROW_INDEX] = df_grid.ID125m.map(
+        df_empty[EMPTY_ROW_INDEX]).values
+    return df_grid, df_grid_pt[~empty]
+
+
+def is_sparse(df_grid):
+    """Returns True if df_grid was returned by make_sparse()"""
+    return EMPTY_ROW_POSITION in df_grid.columns
+
+
+def add_empty_rows(df_grid_in_cell, df_grid_pt_in_cell):
+    """Returns the 1km cell's df_grid without the columns added by
+    make_sparse() and its df_grid_pt with rows of empty 125m cells put back
+    where they were before make_sparse()
+
+    Parameters:
+    -----------
+    df_grid_in_cell : (pd.DataFrame)
+        Sparse grid dataframe (see make_sparse()) for the 1km cell
+
+    df_grid_pt_in_cell : (pd.DataFrame)
+        Sparse grids joined to points for the 1km cell
+
+    Returns:
+    --------
+    df_grid_in_cell : (pd.DataFrame)
+        Grid dataframe for the 1km cell
+
+    df_grid_pt_in_cell : (pd.DataFrame)
+        Grids joined to points for the 1km cell including empty 125m cells
+    """
+    positions = df_grid_in_cell[EMPTY_ROW_POSITION].values
+    empty = positions >= 0
+    df_empty_grid = df_grid_in_cell[empty]
+    df_grid_in_cell = df_grid_in_cell.drop(
+        columns=[EMPTY_ROW_POSITION, EMPTY_ROW_INDEX])
+    if not empty.any():
+        return df_grid_in_cell, df_grid_pt_in_cell
+    # Rows at empty row positions come from df_empty_grid, the rest are
+    # df_grid_pt_in_cell's rows in order
+    positions = positions[empty]
+    n_rows = len(df_grid_pt_in_cell) + len(positions)
+    is_empty_row = np.zeros(n_rows, dtype=bool)
+    is_empty_row[positions] = True
+    empty_order = np.argsort(positions)
+    empty_values = {
+        'p': 0,
+        'h': 0,
+        'START_POINT': df_empty_grid.ID125m.values[empty_order],
+    }
+    columns = {}
+    for col, dtype in df_grid_pt_in_cell.dtypes.items():
+        values = np.empty(n_rows, dtype=dtype)
+        values[~is_empty_row] = df_grid_pt_in_cell[col].values
+        if col in empty_values:
+            values[is_empty_row] = empty_values[col]
+        elif col in df_empty_grid.columns:
+            values[is_empty_row] = df_empty_grid[col].values[empty_order]
+        else:
+            values[is_empty_row] = np.nan
+        columns[col] = values
+    index = np.empty(n_rows, dtype=df_grid_pt_in_cell.index.dtype)
+    index[~is_empty_row] = df_grid_pt_in_cell.index.values
+    index[is_empty_row] = df_empty_grid[EMPTY_ROW_INDEX].values[empty_order]
+    df_grid_pt_in_cell = pd.DataFrame(
+        columns, index=pd.Index(index, name=df_grid_pt_in_cell.index.name))
+    return df_grid_in_cell, df_grid_pt_in_cell
@@ -11,8 +11,41 @@ go any finer
 import numpy as np
 import gridgran
 
+COMPACT_DTYPES = {
+    'p': 'int32',
+    'h': 'int32',
+    'p_cls': 'int8',
+    'h_cls': 'int8',
+    'classification': 'int8',
+}
 
-def prep_points_and_grid_dataframes(gpkg, classification_dict, cls_2_prp=0):
+
+def make_dtypes_compact(df):
+    """Returns df with p and h as int32 and classes as int8 rather than
+    float64/int64. Values of p and h are always whole numbers once points
+    have been joined to the grid (nulls are filled with 0), and results are
+    the same with either dtype.
+
+    Parameters:
+    -----------
+    df : (pd.DataFrame)
+        Grid (df_grid) or grid joined to points (df_grid_pt) dataframe
+
+    Returns:
+    --------
+    df : (pd.DataFrame)
+        df with compact dtypes
+    """
+    df = df.copy()
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns and df[col].notna().all():
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def prep_points_and_grid_dataframes(gpkg, classification_dict, cls_2_prp=0,
+                                    join_method='sjoin', integer_ids=False,
+                                    compact_dtypes=False, sparse=False):
     """Returns gdf_grid spatially joined to points in gpkg and another df \
     with grids/points aggregated to 125m.
     These datasets can be used to carry out checks in grids in different
@@ -44,6 +77,25 @@ def prep_points_and_grid_dataframes(gpkg, classification_dict, cls_2_prp=0):
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
 
+    join_method : (str)
+        Method used to join points to 125m cells - either 'sjoin' or
+        'arithmetic' (see utils.join_pts_to_grid()). DEFAULT='sjoin'
+
+    integer_ids : (bool)
+        If True, ID columns are int64 codes rather than strings (see
+        id_codec). Decode with id_codec.decode_id_columns(). DEFAULT=False
+
+    compact_dtypes : (bool)
+        If True, IDs are int64 codes (as integer_ids) and p, h and classes
+        are small integers (see make_dtypes_compact()) - cutting memory use
+        of both dataframes several fold. DEFAULT=False
+
+    sparse : (bool)
+        If True, rows of empty 125m cells are removed from df_grid_pt and
+        recorded in df_grid so they can be put back one 1km cell at a time
+        by gridgran.granulate_cell() (see sparse.py). Results are the
+        same. DEFAULT=False
+
     Returns
     -------
     df_grid : pd.DataFrame
@@ -55,7 +107,11 @@ def prep_points_and_grid_dataframes(gpkg, classification_dict, cls_2_prp=0):
     """
     gdf = gridgran.make_df(gpkg, '125m', 'grid')
     gdf_pt = gridgran.make_df(gpkg, 'points', 'point')
-    df_grid_pt = gridgran.join_pts_to_grid(gdf, gdf_pt)
+    df_grid_pt = gridgran.join_pts_to_grid(gdf, gdf_pt, method=join_method)
+    if integer_ids or compact_dtypes:
+        df_grid_pt['ID125m'] = gridgran.encode_ids(df_grid_pt.ID125m.values)
+    if compact_dtypes:
+        df_grid_pt = make_dtypes_compact(df_grid_pt)
     df_grid_pt = gridgran.insert_index(df_grid_pt)
     # Keep a record of where points have moved
     df_grid_pt['ID500m_LEVEL_MOVE_ORIGIN'] = np.nan
@@ -66,12 +122,21 @@ def prep_points_and_grid_dataframes(gpkg, classification_dict, cls_2_prp=0):
     df_grid = gridgran.aggregrid(df_grid_pt, classification_dict,
                                  level='ID125m', template=True,
                                  cls_2_prp=cls_2_prp)
+    if compact_dtypes:
+        df_grid = make_dtypes_compact(df_grid)
+    if sparse:
+        df_grid, df_grid_pt = gridgran.make_sparse(df_grid, df_grid_pt)
     return df_grid, df_grid_pt
 
 
 def prep_points_and_grid_from_dataframes(df_grids, df_points,
                                          classification_dict,
-                                         cls_2_prp=0):
+                                         cls_2_prp=0,
+                                         join_method='sjoin',
+                                         integer_ids=False,
+                                         metrics=None,
+                                         compact_dtypes=False,
+                                         sparse=False):
     """
     Returns gdf_grid spatially joined to df_points and another aggregated to \
     125m
@@ -102,6 +167,31 @@ def prep_points_and_grid_from_dataframes(df_grids, df_points,
         pop/households in all neighbours within parent cell. Proportion
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
+
+    join_method : (str)
+        Method used to join points to 125m cells - either 'sjoin' or
+        'arithmetic' (see utils.join_pts_to_grid()). 'arithmetic' assigns
+        each point to exactly one cell so duplicates do not need removing.
+        DEFAULT='sjoin'
+
+    integer_ids : (bool)
+        If True, ID columns are int64 codes rather than strings (see
+        id_codec). Decode with id_codec.decode_id_columns(). DEFAULT=False
+
+    metrics : (gridgran.RunMetrics/None)
+        If given, time taken joining points to grid is added to 'join'
+        timer. DEFAULT=None
+
+    compact_dtypes : (bool)
+        If True, IDs are int64 codes (as integer_ids) and p, h and classes
+        are small integers (see make_dtypes_compact()) - cutting memory use
+        of both dataframes several fold. DEFAULT=False
+
+    sparse : (bool)
+        If True, rows of empty 125m cells are removed from df_grid_pt and
+        recorded in df_grid so they can be put back one 1km cell at a time
+        by gridgran.granulate_cell() (see sparse.py). Results are the
+        same. DEFAULT=False
     Returns:
     ---------
     df_grid : (pd.DataFrame)
@@ -112,9 +202,18 @@ def prep_points_and_grid_from_dataframes(df_grids, df_points,
     """
     gdf = gridgran.prep_df(df_grids, 'grid')
     gdf_pt = gridgran.prep_df(df_points, 'point')
-    df_grid_pt = gridgran.join_pts_to_grid(gdf, gdf_pt)
-    df_grid_pt = gridgran.remove_duplicates(df_grid_pt)  # Remove duplicates
-    # in cases where points touch borders
+    if metrics is None:
+        metrics = gridgran.NULL_METRICS
+    with metrics.time('join'):
+        df_grid_pt = gridgran.join_pts_to_grid(gdf, gdf_pt,
+                                               method=join_method)
+        if join_method == 'sjoin':
+            df_grid_pt = gridgran.remove_duplicates(df_grid_pt)  # Remove
+            # duplicates in cases where points touch borders
+    if integer_ids or compact_dtypes:
+        df_grid_pt['ID125m'] = gridgran.encode_ids(df_grid_pt.ID125m.values)
+    if compact_dtypes:
+        df_grid_pt = make_dtypes_compact(df_grid_pt)
     df_grid_pt = gridgran.insert_index(df_grid_pt)
     # Keep a record of where points have moved
     df_grid_pt['ID500m_LEVEL_MOVE_ORIGIN'] = np.nan
@@ -126,6 +225,10 @@ def prep_points_and_grid_from_dataframes(df_grids, df_points,
                                  level='ID125m',
                                  template=True,
                                  cls_2_prp=cls_2_prp)
+    if compact_dtypes:
+        df_grid = make_dtypes_compact(df_grid)
+    if sparse:
+        df_grid, df_grid_pt = gridgran.make_sparse(df_grid, df_grid_pt)
     return df_grid, df_grid_pt
 
 
@@ -139,7 +242,8 @@ def check_cells(df,
                 num_iterations=100,
                 sample_increase_frequency=10,
                 number_to_increase_sample=1,
-                cls_2_prp=0):
+                cls_2_prp=0,
+                metrics=None):
     """
     Checks 4 children in each cell of the df current grid level (i.e every
     500m cell in each 1km cell) to ascertain whether grid should be
@@ -217,6 +321,10 @@ def check_cells(df,
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        shuffle_helpers.sample_excess_rows_cls_4()) (DEFAULT = None)
+
     Returns:
     --------
     df_grid : (pd.DataFrame)
@@ -250,7 +358,8 @@ def check_cells(df,
                     num_iterations=num_iterations,
                     sample_increase_frequency=sample_increase_frequency,
                     number_to_increase_sample=number_to_increase_sample,
-                    cls_2_prp=cls_2_prp)
+                    cls_2_prp=cls_2_prp,
+                    metrics=metrics)
     return df_grid, df_grid_pt
 
 
@@ -293,7 +402,8 @@ def shuffle_values(df,
                    num_iterations=100,
                    sample_increase_frequency=10,
                    number_to_increase_sample=1,
-                   cls_2_prp=0
+                   cls_2_prp=0,
+                   metrics=None
                    ):
     """Function attempts to move rows of df_grid_pt around into different
     ID125m values to try to get classes that allow cells to keep their
@@ -363,6 +473,10 @@ def shuffle_values(df,
         should be given (between 0 and 1) and NOT percentage (i.e. 0.1 = 10%)
         DEFAULT=0
 
+    metrics : (gridgran.RunMetrics/None)
+        If given, shuffle trials are counted to it (see
+        shuffle_helpers.sample_excess_rows_cls_4()) (DEFAULT = None)
+
     Returns:
     --------
     df_grid : (pd.DataFrame)
@@ -396,7 +510,8 @@ def shuffle_values(df,
                     threshold_h=threshold_h,
                     num_iterations=num_iterations,
                     sample_increase_frequency=sample_increase_frequency,
-                    number_to_increase_sample=number_to_increase_sample
+                    number_to_increase_sample=number_to_increase_sample,
+                    metrics=metrics
                 )
 
             if not ok_to_move:  # Aggregate up to parent level
@@ -416,7 +531,8 @@ def shuffle_values(df,
                         num_iterations=num_iterations,
                         sample_increase_frequency=sample_increase_frequency,
                         number_to_increase_sample=number_to_increase_sample,
-                        cls_2_prp=cls_2_prp
+                        cls_2_prp=cls_2_prp,
+                        metrics=metrics
                     )
                 except gridgran.DataFrameNotOverDisclosureLimitException:
                     df_grid = set_dissolve_id_to_parent(df_grid.copy(),
@@ -6,22 +6,26 @@ classify cells according to number of households and population
 
 import geopandas as gpd
 import numpy as np
+import pandas as pd
 from types import SimpleNamespace
 
 import gridgran
 
 
-def make_df(geopackage, layer, geom_type):
+def make_df(geopackage, layer, geom_type, reader=None):
     """Opens and returns geopackage layer and names columns accordingly
 
     Parameters:
     -----------
     geopackage : (Path)
-        Path to gpkg
+        Path to gpkg (or folder of GeoParquet files named after layers)
     layer : (str)
         Layer within gpkg
     geom_type : (str)
         Point or grid
+    reader : (str/None)
+        Key of gridgran.READERS used to read layer (DEFAULT=None - see
+        gridgran.read_layer())
 
     Returns:
     --------
@@ -29,7 +33,9 @@ def make_df(geopackage, layer, geom_type):
         Opened geodataframe with columns named appropriately according to
         geometry type
     """
-    df = gpd.read_file(geopackage, layer=layer)
+    df = gridgran.read_layer(
+        geopackage, layer=layer, reader=reader,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES.get(layer))
     if geom_type == 'grid':
         df = df[[x for x in df.columns if x.startswith(('Grid', 'geometry'))]]
         gridcol = [x for x in df.columns if x.startswith('Grid')][0]
@@ -106,7 +112,9 @@ def make_index(row, repl_val, index_no):
 
 
 def insert_index(gdf_125):
-    """Apply make_index() on each row to add higher level indexes
+    """Add higher level indexes to 125m cells. Output matches applying
+    make_index() on each row but IDs are built from whole columns (see
+    bng.make_id_hierarchy())
 
     Parameters:
     -----------
@@ -119,13 +127,13 @@ def insert_index(gdf_125):
         Input geodataframe with 3 additional higher levels of ID's applied
     """
     gdf = gdf_125.copy()
-    gdf['ID250m'] = gdf_125.apply(make_index, args=['0', -3], axis=1)
-    gdf['ID500m'] = gdf_125.apply(make_index, args=['00', -2], axis=1)
-    gdf['ID1000m'] = gdf_125.apply(make_index, args=['000', -1], axis=1)
+    hierarchy = gridgran.make_id_hierarchy(gdf_125.ID125m)
+    for level in hierarchy.columns:
+        gdf[level] = hierarchy[level]
     return gdf
 
 
-def join_pts_to_grid(gdf_grid, gdf_pts):
+def join_pts_to_grid(gdf_grid, gdf_pts, method='sjoin'):
     """Returns gdf_grid joined to points with NA's converted to 0 in p and h \
     cols and index_right removed
 
@@ -133,23 +141,69 @@ def join_pts_to_grid(gdf_grid, gdf_pts):
     -----------
     gdf_grid : gpd.GeoDataFrame
         Grid dataframe
+
     gdf_pts : gpd.GeoDataFrame
         Pt dataframe
 
+    method : str
+        Options ['sjoin', 'arithmetic'] -
+        'sjoin' (default) spatially joins points to 125m polygons on
+        intersection (points on borders will be joined to every cell they
+        touch - see helpers.remove_duplicates()). 'arithmetic' calculates
+        each point's 125m cell directly from its easting/northing so each
+        point is assigned to exactly one cell.
+
     Returns
     ---------
     df_grid : pd.DataFrame
         Grid dataframe joined to points with geometries removed
     """
-    gdf_grid = gpd.sjoin(gdf_grid, gdf_pts, how='left',
-                         predicate='intersects')
+    if method == 'arithmetic':
+        gdf_grid = join_pts_to_grid_arithmetic(gdf_grid, gdf_pts)
+    else:
+        gdf_grid = gpd.sjoin(gdf_grid, gdf_pts, how='left',
+                             predicate='intersects')
+        gdf_grid = gdf_grid[
+            [x for x in gdf_grid.columns if not x == 'index_right']]
+        del gdf_grid['geometry']
     gdf_grid[['p', 'h']] = gdf_grid[['p', 'h']].fillna(value=0)
-    gdf_grid = gdf_grid[
-        [x for x in gdf_grid.columns if not x == 'index_right']]
-    del gdf_grid['geometry']
     return gdf_grid
 
 
+def join_pts_to_grid_arithmetic(gdf_grid, gdf_pts):
+    """Returns gdf_grid left joined to gdf_pts where each point's 125m cell
+    is calculated from its coordinates rather than by spatial join. Output
+    matches gpd.sjoin() (grid index kept, geometries removed) with points on
+    cell borders assigned to a single cell (the cell to the north/east, or
+    the edge cell for points on the east/north edge of the grid - see
+    bng.get_ids_from_coords())
+
+    Parameters:
+    -----------
+    gdf_grid : gpd.GeoDataFrame
+        125m grid dataframe with ID125m column
+
+    gdf_pts : gpd.GeoDataFrame
+        Pt dataframe
+
+    Returns
+    ---------
+    df_grid : pd.DataFrame
+        Grid dataframe joined to points with geometries removed
+    """
+    km_origins = gridgran.get_km_origins(gdf_grid, id_col='ID125m')
+    df_pts = pd.DataFrame(gdf_pts.drop(columns='geometry'))
+    df_pts['ID125m'] = gridgran.get_ids_from_coords(gdf_pts.geometry.x.values,
+                                                    gdf_pts.geometry.y.values,
+                                                    km_origins)
+    grid_cols = [x for x in gdf_grid.columns if x != 'geometry']
+    df_grid = pd.DataFrame(gdf_grid[grid_cols]).assign(
+        _row=np.arange(len(gdf_grid)))
+    df_grid = df_grid.merge(df_pts, on='ID125m', how='left', sort=False)
+    df_grid.index = gdf_grid.index.take(df_grid.pop('_row').values)
+    return df_grid
+
+
 def classify_cells(row):
     """Returns classification of cells based on the class of population and \
     households
@@ -288,9 +342,57 @@ def classify_households(row, classification_dict):
     return cls
 
 
+def classify_values(values, threshold_1, threshold_2, threshold_3):
+    """Returns classification of an array of population or household
+    values. Vectorised equivalent of classify_pop() and
+    classify_households() with the same boundaries:
+    0: Unpopulated == 0
+    1: Lower Region 0 < VALUE <= threshold_1
+    2: Centre Region threshold_1 < VALUE <= threshold_2
+    3. Upper Region threshold_2 < VALUE <= threshold_3
+    4: Over disclosure limit threshold_3 < VALUE
+
+    If threshold_2 is None (or 0) class 2 is not used and values between
+    threshold_1 and threshold_3 are class 3
+
+    Parameters:
+    -----------
+    values : (np.array)
+        Population or household values to classify
+
+    threshold_1 : (int)
+        Upper limit of class 1 (p_1 or h_1)
+
+    threshold_2 : (int/None)
+        Upper limit of class 2 (p_2 or h_2)
+
+    threshold_3 : (int)
+        Upper limit of class 3 (p_3 or h_3)
+
+    Returns:
+    --------
+    cls : (np.array)
+        Integer array of classes
+    """
+    values = np.asarray(values, dtype='float64')
+    conditions = [values == 0,
+                  (values > 0) & (values <= threshold_1)]
+    choices = [0, 1]
+    if threshold_2:
+        conditions += [(values >= threshold_1) & (values <= threshold_2),
+                       (values >= threshold_2) & (values <= threshold_3)]
+        choices += [2, 3]
+    else:
+        conditions.append((values >= threshold_1) & (values <= threshold_3))
+        choices.append(3)
+    cls = np.select(conditions, choices, default=4).astype('int64')
+    return cls
+
+
 def classify(df, classification_dict, cls_2_prp=0):
     """Returns dataframe with p_cls, h_cls and overall classification \
-    assigned based on h and p values
+    assigned based on h and p values (see classify_values()). Overall
+    classification is the lowest of the p and h classes
 
     Parameters:
     -----------
@@ -314,11 +416,18 @@ def classify(df, classification_dict, cls_2_prp=0):
                                                        'your'
                                                        'classification '
                                                        'dictionary')
-    df['p_cls'] = df.apply(classify_pop,
-                           classification_dict=classification_dict, axis=1)
-    df['h_cls'] = df.apply(classify_households,
-                           classification_dict=classification_dict, axis=1)
-    df['classification'] = df.apply(classify_cells, axis=1)
+    df['p_cls'] = classify_values(df.p.values,
+                                  classification_dict['p_1'],
+                                  classification_dict['p_2'],
+                                  classification_dict['p_3'])
+    df['h_cls'] = classify_values(df.h.values,
+                                  classification_dict['h_1'],
+                                  classification_dict['h_2'],
+                                  classification_dict['h_3'])
+    # Row-wise classify_cells() upcast classes to the dtype of p and h
+    df['classification'] = np.minimum(df.p_cls.values,
+                                      df.h_cls.values).astype(
+        np.result_type(df.p.dtype, df.h.dtype, df.p_cls.dtype))
     if (len(df) == 4) and (2 in df.classification.unique()):
         df = df.copy()
         cls_2_df = df[df.classification == 2]
@@ -367,9 +476,15 @@ def aggregrid(df_to_aggregate, classification_dict, level='ID125m',
         Dataframe aggregated to defined level and classified based on pop
         and households.
     """
+    # Point level ID columns are not summed (they would be summed as
+    # integers if IDs are encoded - see id_codec)
     df_to_aggregate = df_to_aggregate[[x for x in df_to_aggregate.columns if
                                       x not in ['uprn', 'ID125m_MOVE',
-                                                'ID250m_MOVE', 'ID500m_MOVE']]]
+                                                'ID250m_MOVE', 'ID500m_MOVE',
+                                                'START_POINT',
+                                                'ID500m_LEVEL_MOVE_ORIGIN',
+                                                'ID250m_LEVEL_MOVE_ORIGIN',
+                                                'ID125m_LEVEL_MOVE_ORIGIN']]]
     IDS = ['ID125m', 'ID250m', 'ID500m', 'ID1000m']
     if level == 'ID125m':
         LEVELS = IDS
@@ -411,6 +526,35 @@ def get_ids(df, level, class_number):
     return ids
 
 
+def get_id_hierarchy_for_list_of_IDS(df, id_list, level):
+    """Returns dataframe with one row per 125m cell in id_list (at level)
+    holding the hierarchy of IDs of the cell - i.e. the columnar equivalent
+    of get_list_of_rowIDS_for_list_of_IDS() made with one drop_duplicates()
+
+    Parameters:
+    ------------
+    df : (pd.DataFrame)
+        Dataframe (point in this context) from which to extact IDs
+
+    id_list : (list)
+        List of IDs at level  that will be used to identify rows from which
+        to extract IDs
+
+    level : (str)
+        ID column to get list of ids from. Must be in [ID125m, ID250m,
+        ID500m, ID100m]
+
+    Returns:
+    --------
+    df_ids : (pd.DataFrame)
+        Dataframe with ID125m, ID250m, ID500m and ID1000m columns, in order
+        of first appearance of each ID125m in df
+    """
+    df_ids = df.loc[df[level].isin(id_list),
+                    ['ID125m', 'ID250m', 'ID500m', 'ID1000m']]
+    return df_ids.drop_duplicates('ID125m').reset_index(drop=True)
+
+
 def get_list_of_rowIDS_for_list_of_IDS(df, id_list, level):
     """Returns list of dictionaries with each holding the hierarchy of IDS
     in the list of id_list (i.e. for each row corresponding to the list's
@@ -437,14 +581,6 @@ def get_list_of_rowIDS_for_list_of_IDS(df, id_list, level):
         List of dictionaries with each holding the all the levels' IDS
         corresponding to the row identified in id_list and level
     """
-    IDS_125 = list(df["ID125m"][df[level].isin(id_list)].unique())
-    id_dicts = []
-    for i in IDS_125:
-        row = df.loc[df.ID125m == i]
-        x = {}
-        x['ID125m'] = i
-        x['ID250m'] = row.ID250m.values[0]
-        x['ID500m'] = row.ID500m.values[0]
-        x['ID1000m'] = row.ID1000m.values[0]
-        id_dicts.append(x)
+    id_dicts = get_id_hierarchy_for_list_of_IDS(df, id_list,
+                                                level).to_dict('records')
     return id_dicts
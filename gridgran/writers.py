@@ -0,0 +1,332 @@
+"""Module with backends that write the output grid, point tables and water
+mask. Each backend in OUTPUT_BACKENDS takes the same arguments so they can be
+swapped using the output_format parameter of GridGranulatorGPKG,
+StreamingOutputWriter and main_parallel.py:
+
+'gpkg' - grid and water_mask layers in the out_path geopackage and point
+tables as csv, as in earlier versions. Layers are written with pyogrio,
+through Arrow where pyarrow is installed, rather than fiona (which is still
+used where pyogrio isn't installed).
+
+'parquet' - grid and water mask as GeoParquet and point tables as Parquet
+(needs pyarrow). These are much smaller than csv and are read back without
+parsing text.
+
+'flatgeobuf' - grid and water mask as FlatGeobuf and point tables as
+Parquet (needs pyarrow).
+
+For 'parquet' and 'flatgeobuf', out_path is a folder holding one file per
+layer, named after the layer (e.g. grid.parquet and water_mask.parquet, which
+gridgran.read_layer() reads), and point tables are written in out_csv's
+folder with a .parquet suffix.
+
+Outputs are written in batches - the first call to write() overwrites
+outputs and later calls append to them - and close() must be called when
+all batches and layers are written.
+
+With point_partitions set (see POINT_PARTITIONS), each point table is
+written as a dataset instead of one file - a folder named after the table
+(e.g. points/ for points.csv) holding a tile=<tile> folder per tile, each
+with a part file (csv or Parquet) per batch, e.g.
+points/tile=SU41/part-00000.parquet. pd.read_parquet() or pyarrow.dataset
+read these (with partitioning='hive' for csv), only reading the tiles
+filtered on.
+"""
+import json
+from pathlib import Path
+
+import pandas as pd
+
+import gridgran
+
+POINTS_WITHOUT_EMPTY_GRIDS_CSV = 'points_without_empty_grids.csv'
+WATER_MASK_LAYER = 'water_mask'
+
+# Options for point_partitions - '1km' tiles are the 1km prefixes of
+# ID1000m, '10km' tiles are BNG 10km squares (e.g. 'SU41')
+POINT_PARTITIONS = ('1km', '10km')
+PARTITION_COLUMN = 'tile'
+
+# Point table columns held as strings whatever their dtype in a batch (move
+# origin columns are all NaN in batches where no points moved to a level)
+POINT_STRING_COLUMNS = ('ID', 'START_POINT')
+
+
+def has_arrow_write():
+    """Returns True if pyogrio can write layers through Arrow (needs pyogrio,
+    pyarrow and GDAL >= 3.8)"""
+    if not (gridgran.has_pyogrio() and gridgran.has_pyarrow()):
+        return False
+    import pyogrio
+    return pyogrio.__gdal_version__ >= (3, 8, 0)
+
+
+def format_object_columns(df):
+    """Returns df with numbers in object columns (e.g. p and h where
+    fill_values_below_threshold_with='star') converted to strings, formatted
+    as fiona writes them to string fields, so the column can be converted to
+    Arrow"""
+    object_columns = [col for col, dtype in df.dtypes.items()
+                      if dtype == object and col != df.geometry.name]
+    if not object_columns:
+        return df
+    df = df.copy()
+    for col in object_columns:
+        df[col] = [x if isinstance(x, str) or pd.isna(x) else '%.16g' % x
+                   for x in df[col]]
+    return df
+
+
+def write_layer_pyogrio(gdf, path, layer=None, driver='GPKG', append=False):
+    """Writes gdf to layer of path with pyogrio - through Arrow if
+    possible (see has_arrow_write()). If pyogrio isn't installed,
+    gdf.to_file() is used instead"""
+    if not gridgran.has_pyogrio():
+        gdf.to_file(path, layer=layer, driver=driver,
+                    mode='a' if append else 'w', index=False)
+        return
+    import pyogrio
+    use_arrow = has_arrow_write()
+    if use_arrow:
+        gdf = format_object_columns(gdf)
+    pyogrio.write_dataframe(gdf, path, layer=layer, driver=driver,
+                            append=append, use_arrow=use_arrow)
+
+
+def get_point_tiles(df, point_partitions, km_origins=None):
+    """Returns tile of each row of point table df
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Point table with ID1000m column
+
+    point_partitions : str
+        Option from POINT_PARTITIONS
+
+    km_origins : pd.DataFrame/None
+        1km prefixes and their lower left coordinates as returned by
+        gridgran.get_km_origins() - needed for '10km' (DEFAULT=None)
+
+    Returns:
+    --------
+    tiles : np.array
+        Object array of tiles
+    """
+    prefixes = df.ID1000m.str[:-3].values
+    if point_partitions == '1km':
+        return prefixes
+    origins = km_origins.reindex(prefixes)
+    return gridgran.get_tile_refs(origins.x.values, origins.y.values, 10000)
+
+
+def remove_point_parts(dataset, suffix):
+    """Removes part files (and then empty tile folders) written to dataset
+    folder"""
+    for path in dataset.glob(f'{PARTITION_COLUMN}=*/part-*{suffix}'):
+        path.unlink()
+    for folder in dataset.glob(f'{PARTITION_COLUMN}=*'):
+        if not any(folder.iterdir()):
+            folder.rmdir()
+
+
+def get_point_table(df):
+    """Returns point table df as pyarrow table with ID columns as strings
+    and other columns as float64, so each batch has the same schema"""
+    import pyarrow as pa
+    columns = {}
+    for col in df.columns:
+        if col.startswith(POINT_STRING_COLUMNS):
+            columns[col] = pa.array(df[col].astype(object),
+                                    type=pa.string(), from_pandas=True)
+        else:
+            columns[col] = pa.array(df[col].astype('float64'),
+                                    from_pandas=True)
+    return pa.table(columns)
+
+
+def get_geoparquet_table(gdf):
+    """Returns gdf as pyarrow table with geometry as WKB and GeoParquet
+    metadata. Geometry types and bbox are left out of the metadata as later
+    batches written to the same file may differ."""
+    import pyarrow as pa
+    df = format_object_columns(gdf).to_wkb()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    geo = {
+        'version': '1.0.0',
+        'primary_column': gdf.geometry.name,
+        'columns': {gdf.geometry.name: {
+            'encoding': 'WKB',
+            'geometry_types': [],
+            'crs': gdf.crs.to_json_dict() if gdf.crs else None}},
+    }
+    return table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b'geo': json.dumps(geo).encode()})
+
+
+class GPKGOutputBackend:
+    """Class writes output grid and water mask to layers of a geopackage
+    and point tables to csv"""
+
+    points_suffix = '.csv'
+
+    def __init__(self, out_path, out_layer, out_csv, point_partitions=None,
+                 km_origins=None):
+        """
+        Class instantiation
+
+        Parameters:
+        -----------
+        out_path : Path/str
+            Output geopackage
+
+        out_layer : str
+            Output grid layer
+
+        out_csv : Path/str
+            Output points csv (points_without_empty_grids.csv is written to
+            the same folder)
+
+        point_partitions : str/None
+            Option from POINT_PARTITIONS - if set, point tables are written
+            as datasets partitioned by tile (DEFAULT=None)
+
+        km_origins : pd.DataFrame/None
+            See get_point_tiles() (DEFAULT=None)
+        """
+        self.out_path = Path(out_path)
+        self.out_layer = out_layer
+        self.out_csv = self.get_points_path(out_csv)
+        self.out_csv_removed = self.get_points_path(
+            self.out_csv.parent.joinpath(POINTS_WITHOUT_EMPTY_GRIDS_CSV))
+        self.point_partitions = point_partitions
+        self.km_origins = km_origins
+        self.batches_written = 0
+        self.parts_written = {}
+
+    def get_points_path(self, path):
+        """Returns path with the suffix of point tables written"""
+        return Path(path).with_suffix(self.points_suffix)
+
+    def write(self, grid_final, point_final, point_final_removed):
+        """Writes batch of output tables (see gridgran.make_output_tables())
+        - first batch overwrites outputs, later batches are appended"""
+        append = self.batches_written > 0
+        self.write_points(point_final_removed, self.out_csv_removed, append)
+        self.write_points(point_final, self.out_csv, append)
+        self.write_layer(grid_final, self.out_layer, append)
+        self.batches_written += 1
+
+    def write_points(self, df, path, append=False, part=None):
+        """Writes point table df to path - or, if point_partitions is set,
+        to a part file in the folder of each of its tiles in dataset folder
+        path without its suffix. Parts are named part-<part>, where part
+        defaults to the number of parts written to the dataset, so callers
+        writing to a dataset independently should name their parts."""
+        if not self.point_partitions:
+            self.write_point_table(df, path, append)
+            return
+        dataset = path.with_suffix('')
+        if not append:
+            remove_point_parts(dataset, self.points_suffix)
+            self.parts_written[path] = 0
+        if part is None:
+            part = f'{self.parts_written.get(path, 0):05d}'
+        self.parts_written[path] = self.parts_written.get(path, 0) + 1
+        tiles = get_point_tiles(df, self.point_partitions, self.km_origins)
+        for tile, df_tile in df.groupby(tiles, sort=False):
+            folder = dataset.joinpath(f'{PARTITION_COLUMN}={tile}')
+            folder.mkdir(parents=True, exist_ok=True)
+            self.write_point_part(df_tile, folder.joinpath(
+                f'part-{part}{self.points_suffix}'))
+
+    def write_point_table(self, df, path, append=False):
+        """Writes point table df to csv path"""
+        df.to_csv(path, mode='a' if append else 'w', header=not append,
+                  index=False)
+
+    def write_point_part(self, df, path):
+        """Writes point table df to new csv path"""
+        df.to_csv(path, index=False)
+
+    def write_layer(self, gdf, layer, append=False):
+        """Writes gdf to layer of out_path (other layers are kept)"""
+        write_layer_pyogrio(gdf, self.out_path, layer, 'GPKG', append)
+
+    def close(self):
+        """Finishes writing outputs"""
+
+
+class ParquetOutputBackend(GPKGOutputBackend):
+    """Class writes output grid and water mask to GeoParquet files and
+    point tables to Parquet files. Each file is held open while batches are
+    written to it, so close() must be called."""
+
+    layer_suffix = '.parquet'
+    points_suffix = '.parquet'
+
+    def __init__(self, out_path, out_layer, out_csv, point_partitions=None,
+                 km_origins=None):
+        """See GPKGOutputBackend - out_path is a folder"""
+        super().__init__(out_path, out_layer, out_csv, point_partitions,
+                         km_origins)
+        self.out_path.mkdir(parents=True, exist_ok=True)
+        self.writers = {}
+
+    def get_layer_path(self, layer):
+        """Returns path of layer's file in out_path"""
+        return self.out_path.joinpath(f'{layer}{self.layer_suffix}')
+
+    def write_point_table(self, df, path, append=False):
+        """Writes point table df to Parquet file path"""
+        self.write_table(get_point_table(df), path, append)
+
+    def write_point_part(self, df, path):
+        """Writes point table df to new Parquet file path"""
+        import pyarrow.parquet as pq
+        pq.write_table(get_point_table(df), path)
+
+    def write_layer(self, gdf, layer, append=False):
+        """Writes gdf to GeoParquet file of layer in out_path"""
+        self.write_table(get_geoparquet_table(gdf),
+                         self.get_layer_path(layer), append)
+
+    def write_table(self, table, path, append=False):
+        """Writes pyarrow table to Parquet file path, opening a new file
+        unless append"""
+        import pyarrow.parquet as pq
+        if not append or path not in self.writers:
+            self.close_writer(path)
+            self.writers[path] = pq.ParquetWriter(path, table.schema)
+        writer = self.writers[path]
+        writer.write_table(table.cast(writer.schema))
+
+    def close_writer(self, path):
+        """Closes Parquet file path if it is open"""
+        writer = self.writers.pop(path, None)
+        if writer is not None:
+            writer.close()
+
+    def close(self):
+        """Closes Parquet files"""
+        for path in list(self.writers):
+            self.close_writer(path)
+
+
+class FlatGeobufOutputBackend(ParquetOutputBackend):
+    """Class writes output grid and water mask to FlatGeobuf files and
+    point tables to Parquet files"""
+
+    layer_suffix = '.fgb'
+
+    def write_layer(self, gdf, layer, append=False):
+        """Writes gdf to FlatGeobuf file of layer in out_path"""
+        write_layer_pyogrio(gdf, self.get_layer_path(layer), layer,
+                            'FlatGeobuf', append)
+
+
+OUTPUT_BACKENDS = {
+    'gpkg': GPKGOutputBackend,
+    'parquet': ParquetOutputBackend,
+    'flatgeobuf': FlatGeobufOutputBackend,
+}
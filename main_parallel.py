@@ -22,12 +22,28 @@ GRID_125M = Path(r'R:\HeatherPorter\CensusGrids\Nested '
 POINTS = BASE.joinpath('DUMMY_POINTS_GLOBAL.gpkg')
 BFC_ALL = BASE.joinpath('BFC/CTRY_DEC_2021_GB_BFC.shp')  # To make water
 # mask
+# Reader for the 1km grid, and for the points and 125m grid in each cell's
+# bbox (see gridgran.READERS) - where pyogrio is installed, 'pyogrio' uses
+# the layers' spatial index and reads only the columns used, which is many
+# times faster
+READER = 'fiona'
 
 # OUTPATH = BASE.joinpath('brighton_parallel/TEST_brighton.gpkg')
 # OUTPATH_TMP = OUTPATH.parent.joinpath('tmp/TEST_brighton.gpkg')
 
 OUTPATH = BASE.joinpath('ew_parallel/EW.gpkg')
 OUTPATH_TMP = OUTPATH.parent.joinpath('tmp/EW.gpkg')
+# Backend for the final outputs (see gridgran.OUTPUT_BACKENDS) - 'parquet'
+# and 'flatgeobuf' write the grids and watermask layers to files in folder
+# OUTPATH without its suffix, and point tables as Parquet rather than csv
+OUTPUT_FORMAT = 'gpkg'
+# If set ('1km' or '10km'), point tables are written as datasets partitioned
+# by tile (see gridgran.POINT_PARTITIONS), with a part file per 1km cell
+# written as it is loaded rather than concatenating all cells' points
+POINT_PARTITIONS = None
+# Processed cells are saved here so a stopped run can be resumed - delete
+# the folder to start again from scratch
+CHECKPOINT_DIR = OUTPATH.parent.joinpath('checkpoint')
 
 
 classification_dict = {
@@ -54,10 +70,9 @@ def main_process_serial(layer=None):
     m = multiprocessing.Manager()
     l_pt = m.Lock()
     l_125 = m.Lock()
-    if layer:
-        gdf_1km = gpd.read_file(GRID_1km, layer=layer)
-    else:
-        gdf_1km = gpd.read_file(GRID_1km)
+    gdf_1km = gridgran.read_layer(
+        GRID_1km, layer=layer or None, reader=READER,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES['1000m'])
     for grid_cell in gdf_1km.itertuples():
         process(grid_cell, l_pt, l_125)
     print(touching_points_list)
@@ -68,14 +83,20 @@ def main_process_parallel(layer=None):
     l_pt = m.Lock()
     l_125 = m.Lock()
     l_water = m.Lock()  # lock to read water mask file
-    if layer:
-        gdf_1km = gpd.read_file(GRID_1km, layer=layer)
-    else:
-        gdf_1km = gpd.read_file(GRID_1km)
+    gdf_1km = gridgran.read_layer(
+        GRID_1km, layer=layer or None, reader=READER,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES['1000m'])
     gdf_water_all = gpd.read_file(BFC_ALL)
-    CELLS_1km = [x for index, x in gdf_1km.iterrows()]
+    store = gridgran.CellCheckpointStore(
+        CHECKPOINT_DIR,
+        {'grid_1km': GRID_1km, 'layer': layer, 'grid_125m': GRID_125M,
+         'points': POINTS, 'bfc': BFC_ALL,
+         'classification_settings': CLASSIFICATION_SETTINGS})
+    CELLS_1km = [x for index, x in gdf_1km.iterrows() if not
+                 store.is_done(x.GridID1km)]
+    print(f'{len(store.done)} cells loaded from checkpoint')
     number_of_rows = len(CELLS_1km)
-    rows_10_perc = round(number_of_rows/10)
+    rows_10_perc = max(1, round(number_of_rows/10))
     number_of_rows_left = len(CELLS_1km)
     counter = 0
     GRIDS = []
@@ -90,12 +111,7 @@ def main_process_parallel(layer=None):
         for future in as_completed(future_to_grids):
             processed_grid = future_to_grids[future]
             try:
-                grid, water, df, df_non_empty = future.result()
-                if isinstance(grid, gpd.GeoDataFrame):
-                    GRIDS.append(grid)
-                    WATERS.append(water)
-                    DFS.append(df)
-                    DFS_NON_EMPTY.append(df_non_empty)
+                store.save(processed_grid.GridID1km, future.result())
                 if number_of_rows_left % rows_10_perc == 0:
                     print('ROWS LEFT', number_of_rows_left)
                 number_of_rows_left -= 1
@@ -104,29 +120,53 @@ def main_process_parallel(layer=None):
                     print(f'Processed {counter} cells')
             except Exception as e:
                 print(processed_grid, e)
+    backend = gridgran.OUTPUT_BACKENDS[OUTPUT_FORMAT](
+        OUTPATH if OUTPUT_FORMAT == 'gpkg' else OUTPATH.with_suffix(''),
+        'grids',
+        OUTPATH.parent.joinpath('grids.csv'),
+        point_partitions=POINT_PARTITIONS,
+        km_origins=gridgran.get_km_origins(gdf_1km, id_col='GridID1km'))
+    points_non_empty_path = backend.get_points_path(
+        OUTPATH.parent.joinpath('points_in_non_empty_grids.csv'))
+    for cell_id in gdf_1km.GridID1km:
+        if not store.is_done(cell_id):
+            continue
+        grid, water, df, df_non_empty = store.load(cell_id)
+        if isinstance(grid, gpd.GeoDataFrame):
+            GRIDS.append(grid)
+            WATERS.append(water)
+            if POINT_PARTITIONS:
+                append = len(GRIDS) > 1
+                backend.write_points(df, backend.out_csv, append, cell_id)
+                backend.write_points(df_non_empty, points_non_empty_path,
+                                     append, cell_id)
+            else:
+                DFS.append(df)
+                DFS_NON_EMPTY.append(df_non_empty)
     grid_final = gpd.GeoDataFrame(pd.concat(GRIDS)).set_crs(27700)
-    grid_final.to_file(
-        OUTPATH,
-        layer='grids',
-        driver='GPKG',
-        index=False)
-    df_final = pd.concat(DFS)
-    df_final.to_csv(OUTPATH.parent.joinpath('grids.csv'), index=False)
-    df_non_empty_final = pd.concat(DFS_NON_EMPTY)
-    df_non_empty_final.to_csv(OUTPATH.parent.joinpath(
-        'points_in_non_empty_grids.csv'), index=False)
+    backend.write_layer(grid_final, 'grids')
+    if not POINT_PARTITIONS:
+        df_final = pd.concat(DFS)
+        backend.write_points(df_final, backend.out_csv)
+        df_non_empty_final = pd.concat(DFS_NON_EMPTY)
+        backend.write_points(df_non_empty_final, points_non_empty_path)
     df_water = gpd.GeoDataFrame(pd.concat(WATERS)).set_crs(27700)
     df_water['diss'] = 1
     df_water = df_water.dissolve(by='diss')
-    df_water.to_file(OUTPATH, layer='watermask', index=False)
+    backend.write_layer(df_water, 'watermask')
+    backend.close()
 
 
 def process(grid_cell, l_pt, l_125, l_water, gdf_water_all):
     outlayer = grid_cell.GridID1km
     bbox = grid_cell.geometry.bounds
-    points = gpd.read_file(POINTS, bbox=bbox)
+    points = gridgran.read_layer(
+        POINTS, bbox=bbox, reader=READER,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES['points'])
     if not points.empty:
-        gdf_125 = gpd.read_file(GRID_125M, bbox=bbox)
+        gdf_125 = gridgran.read_layer(
+            GRID_125M, bbox=bbox, reader=READER,
+            column_prefixes=gridgran.READ_COLUMN_PREFIXES['125m'])
         gdf_125 = gdf_125[
             gdf_125.GridID125m.str[:-3] + '000' == grid_cell.GridID1km]
         touching_points = points[points.geometry.touches(grid_cell.geometry)]
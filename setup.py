@@ -10,5 +10,5 @@ setup(
     authoer='David Kerr',
     author_email='david.kerr@ons.gov.uk',
     url='https://github.com/ONSgeo/gridgranulator',
-    packages=find_packages(exclude=['tests*']),
+    packages=find_packages(exclude=['tests*', 'benchmarks*']),
 )
@@ -0,0 +1,55 @@
+"""Unit tests for benchmarks package"""
+import numpy as np
+import pytest
+
+import gridgran
+from benchmarks import run_benchmarks, synthetic
+
+
+@pytest.mark.parametrize('density', ['rural', 'suburban', 'urban', 'mixed'])
+def test_make_synthetic_data(density):
+    grid_1km, grid_125m, points = synthetic.make_synthetic_data(4, density)
+    assert len(grid_1km) == 4
+    assert len(grid_125m) == 4 * 64
+    assert grid_125m.GridID125m.is_unique
+    # IDs match the cells their geometries cover
+    km_origins = gridgran.get_km_origins(grid_125m)
+    centroids = grid_125m.geometry.centroid
+    assert (gridgran.get_ids_from_coords(centroids.x, centroids.y,
+                                         km_origins) ==
+            grid_125m.GridID125m.values).all()
+    assert gridgran.get_km_origins(grid_1km, id_col='GridID1km').equals(
+        km_origins)
+    assert points.geometry.within(grid_1km.unary_union).all()
+    assert (points.people > 0).all()
+
+
+def test_make_synthetic_data_is_seeded():
+    _, _, points_a = synthetic.make_synthetic_data(4, 'mixed', seed=1)
+    _, _, points_b = synthetic.make_synthetic_data(4, 'mixed', seed=1)
+    assert points_a.equals(points_b)
+
+
+def test_run_case():
+    record = run_benchmarks.run_case('check', 1, 'suburban')
+    assert record['n_populated_cells_1km'] == 1
+    assert record['seconds'] > 0
+    assert record['cells_per_sec'] == 1 / record['seconds']
+
+
+def test_compare_to_baseline():
+    base = {'case': 'check', 'scale': 'la', 'density': 'mixed',
+            'cells_per_sec': 10.0, 'peak_rss_mb': 100.0}
+    assert run_benchmarks.compare_to_baseline([base], [base]) == []
+    slower = dict(base, cells_per_sec=5.0, peak_rss_mb=np.nan)
+    assert len(run_benchmarks.compare_to_baseline([slower], [base])) == 1
+    bigger = dict(base, peak_rss_mb=200.0)
+    assert len(run_benchmarks.compare_to_baseline([bigger], [base])) == 1
+
+
+def test_make_synthetic_land():
+    grid_1km, grid_125m, _ = synthetic.make_synthetic_data(4, 'rural')
+    land = synthetic.make_synthetic_land(grid_1km, n_vertices=500)
+    assert land.is_valid.all()
+    water = gridgran.remove_water_cells(grid_125m, land, return_water=True)
+    assert 0 < water.area.sum() < grid_125m.area.sum()
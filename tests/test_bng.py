@@ -0,0 +1,148 @@
+"""Unit tests for bng.py"""
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+
+@pytest.fixture
+def grid_125m():
+    yield gpd.read_file(gpkg, layer='125m')
+
+
+@pytest.fixture
+def km_origins(grid_125m):
+    yield gridgran.get_km_origins(grid_125m)
+
+
+def test_get_km_origins(km_origins):
+    assert len(km_origins) == 1
+    assert km_origins.index[0] == 'J80070856'
+    assert km_origins.loc['J80070856', 'x'] == 448000
+    assert km_origins.loc['J80070856', 'y'] == 112000
+
+
+def test_get_km_origins_from_1km_grid():
+    grid_1km = gpd.read_file(gpkg, layer='1000m')
+    km_origins = gridgran.get_km_origins(grid_1km, id_col='GridID1km')
+    assert km_origins.loc['J80070856', 'x'] == 448000
+
+
+def test_get_ids_from_coords_match_cell_centroids(grid_125m, km_origins):
+    centroids = grid_125m.geometry.centroid
+    ids = gridgran.get_ids_from_coords(centroids.x, centroids.y, km_origins)
+    assert np.all(ids == grid_125m.GridID125m.values)
+
+
+@pytest.mark.parametrize('x, y, expected', [
+    (448000, 112000, 'J80070856111'),  # Lower left corner
+    (448125, 112000, 'J80070856211'),  # Border - cell to east
+    (448000, 112125, 'J80070856311'),  # Border - cell to north
+    (448500, 112500, 'J80070856114'),  # Centre of 1km
+    (448999.99, 112999.99, 'J80070856444'),  # Upper right corner
+    (449000, 112000, 'J80070856222'),  # East edge of grid - edge cell
+    (448000, 113000, 'J80070856333'),  # North edge of grid - edge cell
+    (449000, 113000, 'J80070856444'),  # North east corner of grid
+    (449000.01, 112000, None),  # Outside 1km
+    (448000, 111999.99, None),  # Outside 1km
+])
+def test_get_ids_from_coords_half_open(km_origins, x, y, expected):
+    ids = gridgran.get_ids_from_coords(np.array([x]), np.array([y]),
+                                       km_origins)
+    assert ids[0] == expected
+
+
+@pytest.mark.parametrize('level, expected', [
+    ('ID125m', 'J80070856311'),
+    ('ID250m', 'J80070856011'),
+    ('ID500m', 'J80070856001'),
+    ('ID1000m', 'J80070856000'),
+])
+def test_get_parent_ids(level, expected):
+    parent_ids = gridgran.get_parent_ids(np.array(['J80070856311']), level)
+    assert parent_ids[0] == expected
+
+
+def test_get_parent_ids_of_different_lengths():
+    ids = np.array(['J80070856311', 'K1234124', 'J80070856000'])
+    assert gridgran.get_parent_ids(ids, 'ID500m').tolist() == \
+        ['J80070856001', 'K1234004', 'J80070856000']
+
+
+def test_make_id_hierarchy_empty():
+    hierarchy = gridgran.make_id_hierarchy(pd.Series([], dtype=object))
+    assert hierarchy.empty
+    assert list(hierarchy.columns) == ['ID250m', 'ID500m', 'ID1000m']
+
+
+def test_make_id_hierarchy_matches_make_index(grid_125m):
+    gdf = grid_125m.rename(columns={'GridID125m': 'ID125m'})
+    gdf = gdf.sample(frac=3, replace=True, random_state=1)
+    hierarchy = gridgran.make_id_hierarchy(gdf.ID125m)
+    for level, repl_val, index_no in [('ID250m', '0', -3),
+                                      ('ID500m', '00', -2),
+                                      ('ID1000m', '000', -1)]:
+        expected = gdf.apply(gridgran.make_index, args=[repl_val, index_no],
+                             axis=1)
+        assert hierarchy[level].equals(expected)
+
+
+def test_get_cell_centroids(grid_125m, km_origins):
+    x, y = gridgran.get_cell_centroids(grid_125m.GridID125m, km_origins)
+    centroids = grid_125m.geometry.centroid
+    assert np.allclose(x, centroids.x, atol=0.01)
+    assert np.allclose(y, centroids.y, atol=0.01)
+    assert np.all(x % 125 == 62.5)
+
+
+def test_get_cell_centroids_unknown_km_cell(km_origins):
+    x, y = gridgran.get_cell_centroids(['J80070856111', 'A00000000111'],
+                                       km_origins)
+    assert x[0] == 448062.5
+    assert np.isnan(x[1]) and np.isnan(y[1])
+
+
+@pytest.mark.parametrize('cell_id, expected', [
+    ('J80070856000', (448000, 112000, 449000, 113000)),
+    ('J80070856004', (448500, 112500, 449000, 113000)),
+    ('J80070856032', (448500, 112250, 448750, 112500)),
+    ('J80070856214', (448625, 112500, 448750, 112625)),
+])
+def test_get_cell_bounds(km_origins, cell_id, expected):
+    bounds = gridgran.get_cell_bounds([cell_id], km_origins)
+    assert tuple(b[0] for b in bounds) == expected
+    codes = gridgran.encode_ids([cell_id])
+    assert tuple(b[0] for b in gridgran.get_cell_bounds(
+        codes, km_origins)) == expected
+
+
+def test_get_cell_geometries(grid_125m, km_origins):
+    geometries = gpd.GeoSeries(
+        gridgran.get_cell_geometries(grid_125m.GridID125m, km_origins),
+        crs=grid_125m.crs)
+    assert np.all(geometries.area == 125 ** 2)
+    assert np.allclose(geometries.bounds, grid_125m.geometry.bounds,
+                       atol=0.01)
+    km_cell = gridgran.get_cell_geometries(['J80070856000'], km_origins)[0]
+    assert km_cell.equals(geometries.unary_union)
+
+
+@pytest.mark.parametrize('x, y, size, expected', [
+    (448500, 112500, 10000, 'SU41'),
+    (449999.9, 119999.9, 10000, 'SU41'),
+    (530000, 180000, 10000, 'TQ38'),
+    (0, 0, 10000, 'SV00'),
+    (325000, 674000, 10000, 'NT27'),
+    (448500, 112500, 1000, 'SU4812'),
+    (448500, 112500, 100000, 'SU'),
+])
+def test_get_tile_refs(x, y, size, expected):
+    assert gridgran.get_tile_refs(np.array([x]), np.array([y]),
+                                  size).tolist() == [expected]
@@ -0,0 +1,36 @@
+"""Unit tests for checkpoint.py"""
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import gridgran
+
+SETTINGS = {'gpkg_path': 'in.gpkg', 'checker': 'dataframe'}
+
+
+def test_checkpoint_store_save_and_load(tmp_path):
+    store = gridgran.CellCheckpointStore(tmp_path, SETTINGS)
+    df = pd.DataFrame({'p': [1, 2]})
+    store.save('J80070856000', (df, None))
+    assert store.is_done('J80070856000')
+    assert not store.is_done('J80070857000')
+    reopened = gridgran.CellCheckpointStore(tmp_path, SETTINGS)
+    assert reopened.done == {'J80070856000'}
+    df_loaded, none = reopened.load('J80070856000')
+    assert_frame_equal(df_loaded, df)
+    assert none is None
+
+
+def test_checkpoint_store_ignores_incomplete_manifest_line(tmp_path):
+    store = gridgran.CellCheckpointStore(tmp_path, SETTINGS)
+    store.save(1, None)
+    with open(store.manifest, 'a') as f:
+        f.write('2')
+    assert gridgran.CellCheckpointStore(tmp_path, SETTINGS).done == {'1'}
+
+
+def test_checkpoint_store_with_different_settings(tmp_path):
+    gridgran.CellCheckpointStore(tmp_path, SETTINGS)
+    with pytest.raises(gridgran.CheckpointMismatchException):
+        gridgran.CellCheckpointStore(tmp_path,
+                                     dict(SETTINGS, checker='quadtree'))
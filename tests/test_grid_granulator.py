@@ -0,0 +1,304 @@
+"""Unit tests for grid_granulator.py"""
+import json
+from pathlib import Path
+import random
+from types import SimpleNamespace
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+CLASSIFICATION_DICT = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 49,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 24,
+}
+
+CLASSIFICATION_SETTINGS = {
+    "classification_dict": CLASSIFICATION_DICT,
+    "cls_2_threshold_1000m": False,
+    "cls_2_threshold_500m": False,
+    "cls_2_threshold_250m": False,
+    "cls_2_threshold_125m": False
+}
+
+
+@pytest.fixture
+def dfs():
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg,
+        CLASSIFICATION_DICT)
+    km_origins = gridgran.get_km_origins(gpd.read_file(gpkg, layer='125m'))
+    yield df_grid, df_grid_pt, km_origins
+
+
+def test_granulate_cell_with_seed_ignores_global_state(dfs):
+    df_grid, df_grid_pt, km_origins = dfs
+    results = []
+    for global_seed in [0, 1]:
+        random.seed(global_seed)
+        np.random.seed(global_seed)
+        results.append(gridgran.granulate_cell(df_grid.copy(),
+                                               df_grid_pt.copy(),
+                                               km_origins,
+                                               CLASSIFICATION_SETTINGS,
+                                               seed=5))
+    (grid_a, point_a), (grid_b, point_b) = results
+    assert grid_a.p.sum() == df_grid_pt.p.sum()
+    assert_frame_equal(grid_a, grid_b)
+    assert_frame_equal(point_a, point_b)
+
+
+def test_granulate_cell_without_population(dfs):
+    df_grid, df_grid_pt, km_origins = dfs
+    assert gridgran.granulate_cell(
+        df_grid, df_grid_pt.assign(p=0), km_origins,
+        CLASSIFICATION_SETTINGS) == (None, None)
+
+
+def run_granulator(tmp_path, name, in_path=gpkg,
+                   classification_settings=CLASSIFICATION_SETTINGS,
+                   **kwargs):
+    """Runs GridGranulatorGPKG on in_path, with random and np.random seeded
+    with 0, writing to folder name in tmp_path (which may already hold an
+    earlier run's outputs), and returns the output grid (sorted by GridID)
+    and point table. kwargs are passed to GridGranulatorGPKG"""
+    out = tmp_path.joinpath(name)
+    out.mkdir(exist_ok=True)
+    output_format = kwargs.get('output_format', 'gpkg')
+    out_path = out.joinpath('out.gpkg' if output_format == 'gpkg' else 'out')
+    random.seed(0)
+    np.random.seed(0)
+    gridgran.GridGranulatorGPKG(in_path, out_path, 'grid',
+                                out.joinpath('pts.csv'),
+                                classification_settings, **kwargs)
+    if output_format == 'gpkg':
+        grid = gpd.read_file(out_path, layer='grid')
+        pts_path = out.joinpath('pts.csv')
+        read_points = pd.read_csv
+    else:
+        grid = gridgran.read_layer(out_path.joinpath(
+            f'grid{gridgran.OUTPUT_BACKENDS[output_format].layer_suffix}'))
+        pts_path = out.joinpath('pts.parquet')
+        read_points = pd.read_parquet
+    if kwargs.get('point_partitions'):
+        assert not pts_path.exists()
+        pts = pd.concat([read_points(x) for x in sorted(
+            out.joinpath('pts').glob(f'tile=*/part-*{pts_path.suffix}'))],
+            ignore_index=True)
+    else:
+        pts = read_points(pts_path)
+    return grid.sort_values('GridID').reset_index(drop=True), pts
+
+
+# Options that change how a run is done but not its output
+@pytest.mark.parametrize('default_kwargs, kwargs', [
+    ({'checker': 'dataframe'},
+     {'checker': 'dataframe', 'compact_dtypes': True}),
+    ({'checker': 'quadtree'},
+     {'checker': 'quadtree', 'compact_dtypes': True}),
+    ({'checker': 'dataframe'}, {'checker': 'dataframe', 'sparse': True}),
+    ({'checker': 'quadtree'}, {'checker': 'quadtree', 'sparse': True}),
+    ({'write_batch_size': 1},
+     {'write_batch_size': 1, 'output_format': 'parquet'}),
+    ({'write_batch_size': 1},
+     {'write_batch_size': 1, 'output_format': 'flatgeobuf'}),
+    ({}, {'point_partitions': '10km'}),
+])
+def test_output_matches_default(tmp_path, default_kwargs, kwargs):
+    output_format = kwargs.get('output_format', 'gpkg')
+    if output_format != 'gpkg':
+        pytest.importorskip('pyarrow')
+    grid_1, pts_1 = run_granulator(tmp_path, 'default', **default_kwargs)
+    grid_2, pts_2 = run_granulator(tmp_path, 'option', **kwargs)
+    # Parquet/FlatGeobuf outputs hold p/h as float64
+    check_dtype = output_format == 'gpkg'
+    assert_frame_equal(grid_1, grid_2[grid_1.columns],
+                       check_dtype=check_dtype)
+    assert_frame_equal(pts_1, pts_2, check_dtype=check_dtype)
+
+
+def test_n_jobs_output_is_independent_of_number_of_processes(tmp_path):
+    # Cells are only sent to a process pool if there is more than one
+    in_gpkg = make_multi_cell_gpkg(tmp_path.joinpath('in.gpkg'), 3)
+    grid_1, pts_1 = run_granulator(tmp_path, '1', in_path=in_gpkg, n_jobs=1)
+    assert pts_1.ID1000m.nunique() == 3
+    assert (pts_1.ID125m != pts_1.START_POINT).any()
+    for n_jobs in [2, 3]:
+        grid_2, pts_2 = run_granulator(tmp_path, str(n_jobs),
+                                       in_path=in_gpkg, n_jobs=n_jobs)
+        assert_frame_equal(grid_1, grid_2)
+        assert_frame_equal(pts_1, pts_2)
+
+
+def test_parquet_input_matches_gpkg(tmp_path):
+    pytest.importorskip('pyarrow')
+    parquet_dir = tmp_path.joinpath('in')
+    parquet_dir.mkdir()
+    for layer in ['points', '1000m', '125m']:
+        # Geometry columns needn't be named 'geometry'
+        gpd.read_file(gpkg, layer=layer).rename_geometry('geom').to_parquet(
+            parquet_dir.joinpath(f'{layer}.parquet'))
+    grid_1, pts_1 = run_granulator(tmp_path, 'gpkg')
+    grid_2, pts_2 = run_granulator(tmp_path, 'parquet', in_path=parquet_dir)
+    assert_frame_equal(grid_1, grid_2)
+    assert_frame_equal(pts_1, pts_2)
+
+
+def echo_cell(df_grid_in_cell, df_grid_pt_in_cell, *args, seed=None,
+              metrics=None):
+    """Stands in for gridgran.granulate_cell() in worker processes"""
+    metrics.count('cells_echoed')
+    return df_grid_in_cell, seed
+
+
+def test_parallel_cells_are_taken_lazily_and_in_order(monkeypatch):
+    monkeypatch.setattr(gridgran, 'granulate_cell', echo_cell)
+    taken = []
+
+    def cells():
+        for i in range(30):
+            taken.append(i)
+            yield i, None
+    gran = SimpleNamespace(n_jobs=2, classification_settings=None,
+                           class_2_threshold_prp=None, checker=None,
+                           metrics=gridgran.RunMetrics())
+    results = gridgran.GridGranulatorGPKG.granulate_cells_in_parallel(
+        gran, cells(), None, np.arange(30) * 10)
+    assert next(results) == (0, 0)
+    assert len(taken) == 2 * gridgran.CELLS_IN_FLIGHT_PER_JOB
+    assert list(results) == [(i, i * 10) for i in range(1, 30)]
+    # Counters recorded in the worker processes are added to gran.metrics
+    assert gran.metrics.counters == {'cells_echoed': 30}
+
+
+def test_unpopulated_cells_are_skipped(tmp_path):
+    grid_1km = gpd.read_file(gpkg, layer='1000m')
+    empty_cell = grid_1km.assign(GridID1km='J80070857000',
+                                 geometry=grid_1km.translate(0, 1000))
+    gpkg_with_empty_cell = tmp_path.joinpath('in.gpkg')
+    pd.concat([grid_1km, empty_cell]).to_file(gpkg_with_empty_cell,
+                                              layer='1000m', driver='GPKG')
+    for layer in ['125m', 'points']:
+        gpd.read_file(gpkg, layer=layer).to_file(gpkg_with_empty_cell,
+                                                 layer=layer, driver='GPKG')
+    outputs = []
+    for in_gpkg, n_cells_skipped in [(gpkg, 0), (gpkg_with_empty_cell, 1)]:
+        metrics = gridgran.RunMetrics()
+        outputs.append(run_granulator(tmp_path, str(n_cells_skipped),
+                                      in_path=in_gpkg, metrics=metrics)[1])
+        assert metrics.counters['cells_skipped'] == n_cells_skipped
+    assert_frame_equal(*outputs)
+
+
+def test_checkpoint_resume_does_not_reprocess_cells(tmp_path, monkeypatch):
+    checkpoint_dir = tmp_path.joinpath('ckpt')
+    grid_1, pts_1 = run_granulator(tmp_path, 'first', n_jobs=1,
+                                   checkpoint_dir=checkpoint_dir)
+
+    def granulate_cell(*args, **kwargs):
+        raise AssertionError('Cell processed again')
+    monkeypatch.setattr(gridgran, 'granulate_cell', granulate_cell)
+    grid_2, pts_2 = run_granulator(tmp_path, 'resumed', n_jobs=1,
+                                   checkpoint_dir=checkpoint_dir)
+    assert_frame_equal(grid_1, grid_2)
+    assert_frame_equal(pts_1, pts_2)
+
+
+def make_multi_cell_gpkg(path, n_cells):
+    """Writes copies of the test 1km cell shifted east by 1km at a time,
+    with new 1km prefixes and uprns, to geopackage path"""
+    layers = {layer: gpd.read_file(gpkg, layer=layer)
+              for layer in ['1000m', '125m', 'points']}
+    for layer, gdf in layers.items():
+        copies = []
+        for i in range(n_cells):
+            gdf_copy = gdf.copy()
+            gdf_copy.geometry = gdf.geometry.translate(xoff=i * 1000)
+            id_col = {'1000m': 'GridID1km', '125m': 'GridID125m'}.get(layer)
+            if id_col:
+                gdf_copy[id_col] = gdf[id_col].str.replace(
+                    'J80070856', f'J8007{856 + i * 1000:04d}')
+            else:
+                gdf_copy['uprn'] = gdf.uprn + i * 10 ** 12
+                gdf_copy['x'] = gdf.x + i * 1000
+            copies.append(gdf_copy)
+        pd.concat(copies, ignore_index=True).to_file(path, layer=layer,
+                                                     driver='GPKG')
+    return path
+
+
+def test_serial_checkpoint_resume_matches_uninterrupted_run(tmp_path):
+    in_gpkg = make_multi_cell_gpkg(tmp_path.joinpath('in.gpkg'), 3)
+    checkpoint_dir = tmp_path.joinpath('ckpt')
+    grid_1, pts_1 = run_granulator(tmp_path, 'uninterrupted', in_path=in_gpkg,
+                                   checkpoint_dir=tmp_path.joinpath('ckpt_1'))
+    run_granulator(tmp_path, 'resumed', in_path=in_gpkg,
+                   checkpoint_dir=checkpoint_dir)
+    # Interrupt the run after the first cell, then resume it
+    manifest = checkpoint_dir.joinpath(gridgran.CHECKPOINT_MANIFEST)
+    manifest.write_text(manifest.read_text().splitlines(keepends=True)[0])
+    grid_2, pts_2 = run_granulator(tmp_path, 'resumed', in_path=in_gpkg,
+                                   checkpoint_dir=checkpoint_dir)
+    assert pts_1.ID1000m.nunique() == 3
+    assert_frame_equal(grid_1, grid_2)
+    assert_frame_equal(pts_1, pts_2)
+
+
+def test_metrics_json(tmp_path):
+    np.random.seed(0)
+    gran = gridgran.GridGranulatorGPKG(
+        gpkg, tmp_path.joinpath('out.gpkg'), 'grid',
+        tmp_path.joinpath('pts.csv'), CLASSIFICATION_SETTINGS,
+        metrics_json=tmp_path.joinpath('metrics.json'))
+    with open(tmp_path.joinpath('metrics.json')) as f:
+        metrics = json.load(f)
+    assert metrics['counters'] == gran.metrics.counters
+    assert {'read', 'join', 'prep', 'check', 'dissolve', 'distance',
+            'write', 'total'} <= set(metrics['timers'])
+    counters = metrics['counters']
+    pts = pd.read_csv(tmp_path.joinpath('pts.csv'))
+    grid = gpd.read_file(tmp_path.joinpath('out.gpkg'), layer='grid')
+    assert counters['cells_processed'] == 1
+    assert counters['points'] == len(pts)
+    assert counters['points_moved'] == (pts.ID125m != pts.START_POINT).sum()
+    assert sum(counters[f'cells_dissolved_to_{level}'] for level in
+               gridgran.DISSOLVE_LEVELS) == len(grid)
+
+
+def test_shuffles_attempted_match_between_checkers(tmp_path):
+    # Thresholds at which the test cell's class 3 cells are shuffled
+    classification_settings = dict(
+        CLASSIFICATION_SETTINGS,
+        classification_dict={'p_1': 20, 'p_2': 80, 'p_3': 100, 'h_1': 10,
+                             'h_2': 40, 'h_3': 50})
+    shuffles_attempted = []
+    for checker in ['dataframe', 'quadtree']:
+        metrics = gridgran.RunMetrics()
+        run_granulator(tmp_path, checker,
+                       classification_settings=classification_settings,
+                       checker=checker, metrics=metrics)
+        shuffles_attempted.append(metrics.counters['shuffles_attempted'])
+    assert shuffles_attempted[0] > 0
+    assert shuffles_attempted[0] == shuffles_attempted[1]
+
+
+def test_parallel_metrics_match_serial(tmp_path):
+    in_gpkg = make_multi_cell_gpkg(tmp_path.joinpath('in.gpkg'), 3)
+    metrics = []
+    for n_jobs in [1, 2]:
+        metrics.append(gridgran.RunMetrics())
+        run_granulator(tmp_path, str(n_jobs), in_path=in_gpkg, n_jobs=n_jobs,
+                       metrics=metrics[-1])
+    assert metrics[0].counters == metrics[1].counters
+    assert {'check', 'dissolve'} <= set(metrics[1].timers)
@@ -7,6 +7,7 @@ import geopandas as gpd
 import numpy as np
 import pandas as pd
 import pytest
+import shapely
 
 import gridgran
 
@@ -72,6 +73,47 @@ def test_calculate_dist_point_moved():
     assert 'dist_moved' in gdf_pt.columns
 
 
+def test_calculate_dist_point_moved_matches_calc_dist():
+    df_pt = grid_pt.copy()
+    moved = df_pt.uprn.notna()
+    # Move some points to another cell in the same 1km cell
+    df_pt.loc[moved, 'ID125m'] = np.roll(df_pt.ID125m[moved].values, 7)
+    expected = df_pt.apply(gridgran.calc_dist, axis=1, points=point,
+                           grid_125m=grid_125m)
+    gdf_pt = gridgran.calculate_dist_point_moved(df_pt, point, grid_125m)
+    assert (expected > 0).any()
+    # Centroids are calculated from IDs so differ from the centroids of the
+    # (slightly offset) test grid polygons by millimetres
+    assert np.allclose(gdf_pt.dist_moved, expected, atol=0.01)
+
+
+def test_make_dissolved_grid_matches_dissolve():
+    rng = np.random.RandomState(0)
+    grid_final = pd.DataFrame({'ID125m': grid_125m.GridID125m.values,
+                               'p': rng.randint(0, 20, len(grid_125m)),
+                               'h': rng.randint(0, 10, len(grid_125m))})
+    # Dissolve each 500m cell to a different level
+    levels = np.array(['ID125m', 'ID250m', 'ID500m', 'ID500m'])
+    quadrant = grid_final.ID125m.str[-1].astype(int).values - 1
+    grid_final['dissolve_id'] = [
+        gridgran.get_parent_ids([i], level)[0] for i, level in
+        zip(grid_final.ID125m, levels[quadrant])]
+    grid_final.loc[grid_final.dissolve_id == 'J80070856011', 'p'] = 0
+    expected = grid_125m.set_index('GridID125m').join(
+        grid_final.set_index('ID125m'))[
+        ['p', 'h', 'dissolve_id', 'geometry']].dissolve(by='dissolve_id',
+                                                        aggfunc='sum')
+    expected = expected[expected.p > 0]
+    km_origins = gridgran.get_km_origins(grid_125m)
+    grid_diss = gridgran.make_dissolved_grid(grid_final, km_origins)
+    assert 'J80070856011' not in grid_diss.index
+    assert grid_diss.index.equals(expected.index)
+    assert np.all(grid_diss[['p', 'h']] == expected[['p', 'h']])
+    # Test grid polygons are offset from the BNG by millimetres
+    assert np.allclose(grid_diss.bounds, expected.bounds, atol=0.01)
+    assert np.allclose(grid_diss.area, expected.area)
+
+
 @pytest.mark.parametrize('p, h, above_threshold_expected', [
     (51, 25, False),
     (51, 26, True),
@@ -132,6 +174,27 @@ def test_check_for_below_threshold_MAKE_STAR(grid_final):
     assert np.all(grid_final.loc[7:10, 'h'] == "*")
 
 
+def test_check_for_below_threshold_MAKE_FLAG(grid_final):
+    grid_final.loc[0:3, 'p'] = 2
+    grid_final.loc[4:6, 'h'] = 2
+    grid_final.loc[7:10, ['p', 'h']] = 2
+    expected = grid_final.apply(gridgran.check_threshold, threshold_p=50,
+                                threshold_h=25, axis=1)
+    grid_final = gridgran.check_for_below_threshold(grid_final,
+                                                    50,
+                                                    25,
+                                                    replace_with='flag')
+    assert grid_final.above_threshold.equals(expected)
+    assert grid_final.p.dtype == 'Int64' and grid_final.h.dtype == 'Int64'
+    assert grid_final.p.isna().equals(grid_final.p_suppressed)
+    assert grid_final.h.isna().equals(grid_final.h_suppressed)
+    assert grid_final.loc[0:3, 'p_suppressed'].all()
+    assert grid_final.loc[7:10, ['p_suppressed', 'h_suppressed']].all().all()
+    pop_density = gridgran.calculate_pop_density(grid_final)
+    assert pop_density.dtype == 'float64'
+    assert pop_density.isna().equals(grid_final.p_suppressed)
+
+
 def test_make_point_df_removing_grids():
     pt_df = pd.read_csv(BASE.joinpath("AGGR_PTS_test.csv"))
     print(pt_df)
@@ -152,3 +215,43 @@ def test_remove_duplicates():
     assert not np.all(array_orig.duplicated() == False)
     assert np.all(array_dups_rm.duplicated() == False)
     assert df_grid_removed.people.sum() == points.people.sum()
+
+
+@pytest.mark.parametrize('return_water', [False, True])
+def test_remove_water_cells_strtree_matches_sjoin(return_water):
+    # Second polygon has a null attribute so is dropped by the sjoin method
+    bfc = pd.concat([bfc_gdf, bfc_gdf.iloc[:1].assign(
+        geometry=cells_gdf.geometry.iloc[:3].buffer(1).unary_union)])
+    bfc.iloc[-1, 0] = None
+    results = [gridgran.remove_water_cells(cells_gdf, bfc, return_water,
+                                           method=method)
+               for method in ['sjoin', 'strtree']]
+    assert results[0].index.equals(results[1].index)
+    if return_water:
+        assert results[0].geometry.iloc[0].normalize().equals_exact(
+            results[1].geometry.iloc[0].normalize(), 1e-6)
+
+
+@pytest.mark.parametrize('return_water', [False, True])
+def test_remove_water_cells_uses_sjoin_without_shapely_2(monkeypatch,
+                                                        return_water):
+    expected = gridgran.remove_water_cells(cells_gdf, bfc_gdf, return_water,
+                                           method='sjoin')
+    monkeypatch.delattr(shapely, 'coverage_union_all')
+    assert not gridgran.has_strtree_functions()
+    result = gridgran.remove_water_cells(cells_gdf, bfc_gdf, return_water)
+    assert result.index.equals(expected.index)
+    assert result.geometry.equals(expected.geometry)
+
+
+def test_remove_water_cells_with_unknown_method():
+    with pytest.raises(ValueError):
+        gridgran.remove_water_cells(cells_gdf, bfc_gdf, method='rtree')
+
+
+def test_dissolve_cells():
+    gdf_diss = gridgran.dissolve_cells(grid_125m, 'diss_water')
+    assert gdf_diss.index.tolist() == [1]
+    assert gdf_diss.index.name == 'diss_water'
+    assert gdf_diss.geometry.iloc[0].equals(grid_125m.unary_union)
+    assert gridgran.dissolve_cells(grid_125m.iloc[:0], 'diss_water').empty
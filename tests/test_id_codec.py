@@ -0,0 +1,119 @@
+"""Unit tests for id_codec.py"""
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+classification_dict = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 49,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 24,
+}
+
+
+@pytest.fixture
+def ids_125m():
+    yield gpd.read_file(gpkg, layer='125m').GridID125m.values
+
+
+def test_encode_ids():
+    codes = gridgran.encode_ids(['J80070856000', 'J80070856214',
+                                 'A00000000001'])
+    assert codes.dtype == 'int64'
+    assert codes.tolist() == [9 * 10 ** 11 + 80070856000,
+                              9 * 10 ** 11 + 80070856214,
+                              1]
+
+
+def test_encode_ids_with_nulls_returns_float():
+    codes = gridgran.encode_ids(['J80070856214', np.nan])
+    assert codes.dtype == 'float64'
+    assert codes[0] == 9 * 10 ** 11 + 80070856214
+    assert np.isnan(codes[1])
+
+
+@pytest.mark.parametrize('bad_id', ['J8007085621', 'j80070856214',
+                                    '180070856214', 1])
+def test_encode_ids_raises_on_invalid_id(bad_id):
+    with pytest.raises(ValueError):
+        gridgran.encode_ids(['J80070856214', bad_id])
+
+
+def test_decode_ids_round_trip(ids_125m):
+    decoded = gridgran.decode_ids(gridgran.encode_ids(ids_125m))
+    assert np.all(decoded == ids_125m)
+
+
+def test_decode_ids_with_nulls():
+    decoded = gridgran.decode_ids(np.array([9 * 10 ** 11 + 80070856214,
+                                            np.nan]))
+    assert decoded[0] == 'J80070856214'
+    assert pd.isna(decoded[1])
+
+
+def test_codes_sort_in_same_order_as_ids(ids_125m):
+    codes = gridgran.encode_ids(ids_125m)
+    assert np.all(np.argsort(codes, kind='stable') ==
+                  np.argsort(ids_125m, kind='stable'))
+
+
+@pytest.mark.parametrize('level', ['ID250m', 'ID500m', 'ID1000m'])
+def test_get_parent_codes_match_get_parent_ids(ids_125m, level):
+    codes = gridgran.get_parent_codes(gridgran.encode_ids(ids_125m), level)
+    assert np.all(gridgran.decode_ids(codes) ==
+                  gridgran.get_parent_ids(ids_125m, level))
+
+
+def test_get_quadrant():
+    codes = gridgran.encode_ids(['J80070856321', 'J80070856004'])
+    assert gridgran.get_quadrant(codes, 'ID125m').tolist() == [3, 0]
+    assert gridgran.get_quadrant(codes, 'ID250m').tolist() == [2, 0]
+    assert gridgran.get_quadrant(codes, 'ID500m').tolist() == [1, 4]
+
+
+def test_get_child_codes_round_trip(ids_125m):
+    km_codes = gridgran.encode_ids(['J80070856000'])
+    codes_500 = gridgran.get_child_codes(km_codes, 'ID500m').ravel()
+    codes_250 = gridgran.get_child_codes(codes_500, 'ID250m').ravel()
+    codes_125 = gridgran.get_child_codes(codes_250, 'ID125m').ravel()
+    assert set(gridgran.decode_ids(codes_125)) == set(ids_125m)
+    assert gridgran.decode_ids(codes_500).tolist() == [
+        'J80070856001', 'J80070856002', 'J80070856003', 'J80070856004']
+
+
+def test_prep_with_integer_ids_matches_string_ids():
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg, classification_dict)
+    df_grid_int, df_grid_pt_int = gridgran.prep_points_and_grid_dataframes(
+        gpkg, classification_dict, integer_ids=True)
+    assert df_grid_pt_int.ID125m.dtype == 'int64'
+    assert df_grid_int.ID1000m.dtype == 'int64'
+    assert_frame_equal(gridgran.decode_id_columns(df_grid_pt_int),
+                       df_grid_pt)
+    assert_frame_equal(gridgran.decode_id_columns(df_grid_int), df_grid)
+
+
+def test_prep_with_compact_dtypes_matches_string_ids():
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg, classification_dict)
+    df_grid_c, df_grid_pt_c = gridgran.prep_points_and_grid_dataframes(
+        gpkg, classification_dict, compact_dtypes=True)
+    assert df_grid_pt_c.ID125m.dtype == 'int64'
+    assert df_grid_pt_c.p.dtype == 'int32'
+    assert df_grid_c.classification.dtype == 'int8'
+    assert_frame_equal(gridgran.decode_id_columns(df_grid_pt_c), df_grid_pt,
+                       check_dtype=False)
+    assert_frame_equal(gridgran.decode_id_columns(df_grid_c), df_grid,
+                       check_dtype=False)
+    assert df_grid_pt_c.memory_usage(deep=True).sum() * 3 < \
+        df_grid_pt.memory_usage(deep=True).sum()
@@ -0,0 +1,57 @@
+"""Unit tests for metrics.py"""
+import json
+
+import numpy as np
+import pytest
+
+import gridgran
+
+
+@pytest.mark.parametrize('integer_ids', [False, True])
+def test_get_id_levels(integer_ids):
+    ids = np.array(['J80070856000', 'J80070856004', 'J80070856021',
+                    'J80070856311'], dtype=object)
+    if integer_ids:
+        ids = gridgran.encode_ids(ids)
+    assert gridgran.get_id_levels(ids).tolist() == ['ID1000m', 'ID500m',
+                                                    'ID250m', 'ID125m']
+
+
+def test_run_metrics(tmp_path):
+    events = []
+    metrics = gridgran.RunMetrics(
+        callback=lambda *event: events.append(event))
+    for _ in range(2):
+        with metrics.time('check'):
+            pass
+    metrics.count('cells_processed')
+    metrics.count('points', np.int64(5))
+    assert list(metrics.timers) == ['check']
+    assert metrics.timers['check'] >= 0
+    assert metrics.counters == {'cells_processed': 1, 'points': 5}
+    assert [event[:2] for event in events] == [
+        ('timer', 'check'), ('timer', 'check'),
+        ('counter', 'cells_processed'), ('counter', 'points')]
+    metrics.to_json(tmp_path.joinpath('metrics.json'))
+    with open(tmp_path.joinpath('metrics.json')) as f:
+        assert json.load(f) == metrics.to_dict()
+
+
+def test_run_metrics_merge():
+    events = []
+    metrics = gridgran.RunMetrics(
+        callback=lambda *event: events.append(event))
+    metrics.count('points', 2)
+    metrics.merge({'timers': {'check': 1.5},
+                   'counters': {'points': 3, 'shuffles_attempted': 4}})
+    assert metrics.timers == {'check': 1.5}
+    assert metrics.counters == {'points': 5, 'shuffles_attempted': 4}
+    assert events[1:] == [('timer', 'check', 1.5), ('counter', 'points', 3),
+                          ('counter', 'shuffles_attempted', 4)]
+
+
+def test_null_metrics_records_nothing():
+    with gridgran.NULL_METRICS.time('check'):
+        gridgran.NULL_METRICS.count('cells_processed')
+    assert not gridgran.NULL_METRICS.enabled
+    assert not hasattr(gridgran.NULL_METRICS, 'counters')
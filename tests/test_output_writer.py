@@ -0,0 +1,83 @@
+"""Unit tests for output_writer.py"""
+from pathlib import Path
+import random
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+CLASSIFICATION_DICT = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 49,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 24,
+}
+
+CLASSIFICATION_SETTINGS = {
+    "classification_dict": CLASSIFICATION_DICT,
+    "cls_2_threshold_1000m": False,
+    "cls_2_threshold_500m": False,
+    "cls_2_threshold_250m": False,
+    "cls_2_threshold_125m": False
+}
+
+
+@pytest.fixture
+def cells():
+    """Splits output of single 1km cell into two 'cells' by 500m cell"""
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg,
+        CLASSIFICATION_DICT)
+    km_origins = gridgran.get_km_origins(gpd.read_file(gpkg, layer='125m'))
+    random.seed(0)
+    np.random.seed(0)
+    grid_diss, point_final = gridgran.granulate_cell(
+        df_grid, df_grid_pt, km_origins, CLASSIFICATION_SETTINGS)
+    first_grid = grid_diss.index.str[-1].isin(['1', '2'])
+    first_pt = point_final.ID500m.str[-1].isin(['1', '2'])
+    yield ([(grid_diss[first_grid], point_final[first_pt]),
+            (grid_diss[~first_grid], point_final[~first_pt])],
+           km_origins)
+
+
+def test_streaming_output_writer_matches_make_output_tables(cells, tmp_path):
+    cell_list, km_origins = cells
+    points = gpd.read_file(gpkg, layer='points')
+    writer = gridgran.StreamingOutputWriter(
+        tmp_path.joinpath('out.gpkg'), 'grid', tmp_path.joinpath('pts.csv'),
+        points, km_origins, CLASSIFICATION_DICT, batch_size=1)
+    for grid_diss, point_final in cell_list:
+        writer.add(grid_diss.copy(), point_final.copy())
+    assert writer.batches_written == 2
+    grid_ids = writer.close()
+    grid_final, point_final, point_final_removed = \
+        gridgran.make_output_tables(
+            [grid.copy() for grid, _ in cell_list],
+            [pt.copy() for _, pt in cell_list],
+            points, km_origins, CLASSIFICATION_DICT)
+    assert grid_ids.tolist() == grid_final.GridID.tolist()
+    grid_written = gpd.read_file(tmp_path.joinpath('out.gpkg'),
+                                 layer='grid')
+    assert_frame_equal(grid_written, grid_final[grid_written.columns],
+                       check_dtype=False)
+    assert_frame_equal(pd.read_csv(tmp_path.joinpath('pts.csv')),
+                       point_final.reset_index(drop=True), check_dtype=False)
+    assert len(pd.read_csv(tmp_path.joinpath(
+        gridgran.POINTS_WITHOUT_EMPTY_GRIDS_CSV))) == len(point_final_removed)
+
+
+def test_streaming_output_writer_close_without_cells(tmp_path):
+    writer = gridgran.StreamingOutputWriter(
+        tmp_path.joinpath('out.gpkg'), 'grid', tmp_path.joinpath('pts.csv'),
+        None, None, CLASSIFICATION_DICT)
+    assert len(writer.close()) == 0
+    assert not tmp_path.joinpath('pts.csv').exists()
@@ -0,0 +1,83 @@
+"""Unit tests for partition.py"""
+from pathlib import Path
+
+from pandas.testing import assert_frame_equal
+import pytest
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+CLASSIFICATION_DICT = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 50,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 25,
+}
+
+
+@pytest.fixture
+def dfs():
+    """Makes grid joined to points by not agrregated - i.e. RAW"""
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg, CLASSIFICATION_DICT)
+    yield df_grid, df_grid_pt
+
+
+@pytest.mark.parametrize('level', ['ID125m', 'ID250m', 'ID500m', 'ID1000m'])
+def test_partition_matches_boolean_subset(dfs, level):
+    _, df_grid_pt = dfs
+    df_sorted, offsets = gridgran.partition_by_id(df_grid_pt, level)
+    assert len(df_sorted) == len(df_grid_pt)
+    assert set(offsets) == set(df_grid_pt[level])
+    for id in df_grid_pt[level].unique():
+        assert_frame_equal(gridgran.get_partition(df_sorted, offsets, id),
+                           df_grid_pt[df_grid_pt[level] == id])
+
+
+def test_partition_by_array(dfs):
+    df_grid, _ = dfs
+    df_sorted, offsets = gridgran.partition_by_id(
+        df_grid, df_grid.ID500m.values)
+    assert_frame_equal(gridgran.get_partition(df_sorted, offsets,
+                                              df_grid.ID500m.iloc[0]),
+                       df_grid[df_grid.ID500m == df_grid.ID500m.iloc[0]])
+
+
+def test_get_partition_missing_id(dfs):
+    _, df_grid_pt = dfs
+    df_sorted, offsets = gridgran.partition_by_id(df_grid_pt, 'ID1000m')
+    df_subset = gridgran.get_partition(df_sorted, offsets, 'J80000000000')
+    assert df_subset.empty
+    assert list(df_subset.columns) == list(df_grid_pt.columns)
+
+
+def test_subset_by_id_with_offsets(dfs):
+    df_grid, df_grid_pt = dfs
+    subset_id = df_grid.ID500m.iloc[0]
+    expected = gridgran.subset_by_id(df_grid, df_grid_pt, 'ID500m',
+                                     'ID250m', subset_id, CLASSIFICATION_DICT)
+    df_grid_sorted, grid_offsets = gridgran.partition_by_id(df_grid,
+                                                            'ID500m')
+    df_grid_pt_sorted, pt_offsets = gridgran.partition_by_id(df_grid_pt,
+                                                             'ID500m')
+    subsets = gridgran.subset_by_id(df_grid_sorted, df_grid_pt_sorted,
+                                    'ID500m', 'ID250m', subset_id,
+                                    CLASSIFICATION_DICT,
+                                    grid_offsets=grid_offsets,
+                                    pt_offsets=pt_offsets)
+    for df_expected, df_subset in zip(expected, subsets):
+        assert_frame_equal(df_subset, df_expected)
+
+
+def test_get_populated_ids(dfs):
+    _, df_grid_pt = dfs
+    df_grid_pt = df_grid_pt.copy()
+    empty_id = df_grid_pt.ID500m.iloc[0]
+    df_grid_pt.loc[df_grid_pt.ID500m == empty_id, 'p'] = 0
+    populated_ids = gridgran.get_populated_ids(df_grid_pt, 'ID500m')
+    assert set(populated_ids) == \
+        set(df_grid_pt.ID500m.unique()) - {empty_id}
@@ -0,0 +1,132 @@
+"""Unit tests for quadtree_disclosure_checker.py"""
+from pathlib import Path
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+CLASSIFICATION_DICT = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 50,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 25,
+}
+
+CLASSIFICATION_SETTINGS = {
+    "classification_dict": CLASSIFICATION_DICT,
+    "cls_2_threshold_1000m": True,
+    "cls_2_threshold_500m": True,
+    "cls_2_threshold_250m": False,
+    "cls_2_threshold_125m": True
+
+}
+
+GRID_COLS = ['ID125m', 'ID250m', 'ID500m', 'ID1000m', 'p', 'h',
+             'dissolve_id']
+
+
+@pytest.fixture
+def dfs():
+    """Makes grid joined to points by not agrregated - i.e. RAW"""
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg,
+        CLASSIFICATION_DICT)
+    yield df_grid, df_grid_pt
+
+
+def thin_points(df_grid_pt, seed):
+    """Returns df_grid_pt with random populations and points removed from
+    random 250m cells (leaving empty 125m cells in place) to make cells of
+    all classes"""
+    rng = np.random.RandomState(seed)
+    df_pt = df_grid_pt[df_grid_pt.h > 0]
+    ids_250 = df_pt.ID250m.unique()
+    keep = (rng.rand(len(df_pt)) < 0.4) & ~df_pt.ID250m.isin(
+        ids_250[rng.rand(len(ids_250)) < 0.5]).values
+    df_pt = df_pt[keep].copy()
+    df_pt['p'] = rng.randint(0, 7, len(df_pt)).astype(df_pt.p.dtype)
+    df_empty = df_grid_pt[~df_grid_pt.ID125m.isin(
+        df_pt.ID125m)].drop_duplicates('ID125m').copy()
+    df_empty['p'] = 0
+    df_empty['h'] = 0
+    return pd.concat([df_pt, df_empty]).sort_values('ID125m', kind='stable')
+
+
+def run_checker(checker, df_grid_pt, seed, cls_2_prp=0):
+    """Returns output of checker run on df_grid_pt with seeded random
+    number generators"""
+    df_grid = gridgran.aggregrid(df_grid_pt, CLASSIFICATION_DICT,
+                                 level='ID125m', template=True)
+    df = gridgran.aggregrid(df_grid_pt, CLASSIFICATION_DICT, level='ID500m')
+    random.seed(seed)
+    np.random.seed(seed)
+    return checker(df, df_grid, df_grid_pt, CLASSIFICATION_SETTINGS,
+                   cls_2_prp=cls_2_prp).execute()
+
+
+def test_get_leaf_numbers():
+    leaves = gridgran.get_leaf_numbers(['J80070856111', 'J80070856114',
+                                        'J80070856141', 'J80070856444'])
+    assert leaves.tolist() == [0, 3, 12, 63]
+    codes = gridgran.encode_ids(['J80070856111', 'J80070856444'])
+    assert gridgran.get_leaf_numbers(codes).tolist() == [0, 63]
+
+
+def test_leaf_numbers_are_in_id_order(dfs):
+    df_grid, _ = dfs
+    leaves = gridgran.get_leaf_numbers(df_grid.ID125m.values)
+    assert leaves.tolist() == list(range(64))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_classify_quadrant_arrays_matches_aggregrid(dfs, seed):
+    _, df_grid_pt = dfs
+    df_grid_pt = thin_points(df_grid_pt, seed)
+    df_grid_pt = df_grid_pt[df_grid_pt.ID500m == df_grid_pt.ID500m.iloc[0]]
+    points = {'leaf': gridgran.get_leaf_numbers(df_grid_pt.ID125m.values),
+              'p': df_grid_pt.p.values,
+              'h': df_grid_pt.h.values}
+    classes = gridgran.classify_quadrant_arrays(points, 'ID250m',
+                                                CLASSIFICATION_DICT,
+                                                cls_2_prp=0.5)
+    df = gridgran.aggregrid(df_grid_pt, CLASSIFICATION_DICT, level='ID250m',
+                            cls_2_prp=0.5)
+    quadrants = (gridgran.get_id_digits(df.ID250m.values) // 10) % 10 - 1
+    assert classes[quadrants].tolist() == df.classification.tolist()
+
+
+def test_execute(dfs):
+    df_grid, df_grid_pt = dfs
+    grid_final, point_final = run_checker(
+        gridgran.QuadtreeDisclosureChecker, df_grid_pt, 0)
+    assert len(grid_final) == len(df_grid)
+    assert grid_final.p.sum() == df_grid.p.sum()
+    assert grid_final.dissolve_id.notna().all()
+    assert len(point_final) >= len(df_grid_pt)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_execute_matches_grid_disclosure_checker(dfs, seed):
+    _, df_grid_pt = dfs
+    if seed:
+        df_grid_pt = thin_points(df_grid_pt, seed)
+    cls_2_prp = [0, 0.05, 0.5][seed % 3]
+    grid_df, point_df = run_checker(gridgran.GridDisclosureChecker,
+                                    df_grid_pt, seed, cls_2_prp=cls_2_prp)
+    state_df = (random.random(), np.random.rand())
+    grid_qt, point_qt = run_checker(gridgran.QuadtreeDisclosureChecker,
+                                    df_grid_pt, seed, cls_2_prp=cls_2_prp)
+    state_qt = (random.random(), np.random.rand())
+    assert_frame_equal(grid_qt[GRID_COLS].reset_index(drop=True),
+                       grid_df[GRID_COLS].reset_index(drop=True))
+    assert_frame_equal(point_qt, point_df)
+    assert state_qt == state_df  # Same random numbers were drawn
@@ -0,0 +1,140 @@
+"""Unit tests for readers.py"""
+from pathlib import Path
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+
+@pytest.fixture
+def parquet_dir(tmp_path):
+    """Writes test layers to GeoParquet files in folder"""
+    pytest.importorskip('pyarrow')
+    for layer in gridgran.READ_COLUMN_PREFIXES:
+        gpd.read_file(gpkg, layer=layer).to_parquet(
+            tmp_path.joinpath(f'{layer}.parquet'))
+    yield tmp_path
+
+
+def test_get_reader_name(tmp_path):
+    assert gridgran.get_reader_name(gpkg) == 'fiona'
+    assert gridgran.get_reader_name(gpkg, 'pyogrio') == 'pyogrio'
+    assert gridgran.get_reader_name(tmp_path.joinpath('a.parquet')) == \
+        'parquet'
+    # Folders are only GeoParquet if they hold parquet files
+    assert gridgran.get_reader_name(tmp_path) == 'fiona'
+    tmp_path.joinpath('points.parquet').touch()
+    assert gridgran.get_reader_name(tmp_path) == 'parquet'
+
+
+@pytest.mark.parametrize('reader', ['fiona', 'pyogrio', 'parquet'])
+@pytest.mark.parametrize('layer, columns',
+                         [('points', ['uprn', 'people']),
+                          ('1000m', ['GridID1km']),
+                          ('125m', ['GridID125m'])])
+def test_read_layer_matches_read_file(parquet_dir, reader, layer, columns):
+    path = parquet_dir if reader == 'parquet' else gpkg
+    gdf = gridgran.read_layer(
+        path, layer=layer, reader=reader,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES[layer])
+    expected = gpd.read_file(gpkg, layer=layer)
+    assert list(gdf.columns) == columns + ['geometry']
+    assert gdf.crs == expected.crs
+    for col in columns:
+        assert (gdf[col].values == expected[col].values).all()
+    assert gdf.geometry.geom_equals(expected.geometry).all()
+
+
+@pytest.mark.parametrize('reader', ['fiona', 'pyogrio', 'parquet'])
+def test_read_layer_picks_columns_by_prefix(tmp_path, reader):
+    if reader == 'parquet':
+        pytest.importorskip('pyarrow')
+    points = gpd.read_file(gpkg, layer='points').rename(
+        columns={'people': 'people_total'})
+    path = tmp_path.joinpath('points.parquet' if reader == 'parquet' else
+                             'points.gpkg')
+    if reader == 'parquet':
+        points.to_parquet(path)
+    else:
+        points.to_file(path, layer='points', driver='GPKG')
+    assert gridgran.get_columns_by_prefix(
+        path, gridgran.READ_COLUMN_PREFIXES['points'], layer='points',
+        reader=reader) == ['uprn', 'people_total']
+    gdf = gridgran.read_layer(
+        path, layer='points', reader=reader,
+        column_prefixes=gridgran.READ_COLUMN_PREFIXES['points'])
+    assert list(gdf.columns) == ['uprn', 'people_total', 'geometry']
+    assert (gdf.people_total.values == points.people_total.values).all()
+
+
+@pytest.mark.parametrize('reader', ['fiona', 'pyogrio', 'parquet'])
+def test_read_layer_with_bbox_and_mask(parquet_dir, reader):
+    path = parquet_dir if reader == 'parquet' else gpkg
+    points = gpd.read_file(gpkg, layer='points')
+    minx, miny, maxx, maxy = points.total_bounds
+    bbox = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+    gdf = gridgran.read_layer(path, layer='points', bbox=bbox,
+                              reader=reader)
+    expected = points[points.intersects(box(*bbox))]
+    assert 0 < len(gdf) < len(points)
+    assert sorted(gdf.uprn) == sorted(expected.uprn)
+    mask = gpd.GeoDataFrame(geometry=[box(*bbox).buffer(-50)], crs=27700)
+    gdf = gridgran.read_layer(path, layer='points', mask=mask, reader=reader)
+    expected = points[points.intersects(mask.unary_union)]
+    assert sorted(gdf.uprn) == sorted(expected.uprn)
+
+
+def test_read_layer_parquet_with_renamed_geometry(tmp_path):
+    pytest.importorskip('pyarrow')
+    expected = gpd.read_file(gpkg, layer='125m')
+    path = tmp_path.joinpath('125m.parquet')
+    expected.rename_geometry('geom').to_parquet(path)
+    assert gridgran.get_parquet_geometry_column(path) == 'geom'
+    gdf = gridgran.read_layer(path, column_prefixes=('Grid',))
+    assert list(gdf.columns) == ['GridID125m', 'geometry']
+    assert (gdf.GridID125m.values == expected.GridID125m.values).all()
+    assert gdf.geometry.geom_equals(expected.geometry).all()
+    bbox = expected.total_bounds
+    assert len(gridgran.read_layer(path, columns=['GridID125m'],
+                                   bbox=bbox)) == len(expected)
+
+
+def test_read_layer_parquet_with_filters(parquet_dir):
+    points = gpd.read_file(gpkg, layer='points')
+    gdf = gridgran.read_layer_parquet(parquet_dir, layer='points',
+                                      filters=[('people', '>', 2)])
+    assert sorted(gdf.uprn) == sorted(points[points.people > 2].uprn)
+
+
+def test_read_layer_parquet_with_bbox_covering(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import json
+    import pyarrow.parquet as pq
+    points = gpd.read_file(gpkg, layer='points')
+    path = tmp_path.joinpath('points.parquet')
+    points.to_parquet(path)
+    # Add GeoParquet 1.1 bbox covering column
+    table = pq.read_table(path)
+    bounds = points.bounds
+    table = table.append_column('bbox', pa.StructArray.from_arrays(
+        [pa.array(bounds[col].values) for col in
+         ['minx', 'miny', 'maxx', 'maxy']],
+        names=['xmin', 'ymin', 'xmax', 'ymax']))
+    geo = json.loads(table.schema.metadata[b'geo'])
+    geo['columns']['geometry']['covering'] = {
+        'bbox': {key: ['bbox', key] for key in
+                 ['xmin', 'ymin', 'xmax', 'ymax']}}
+    table = table.replace_schema_metadata(
+        {**table.schema.metadata, b'geo': json.dumps(geo).encode()})
+    pq.write_table(table, path, row_group_size=100)
+    minx, miny, maxx, maxy = points.total_bounds
+    bbox = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+    assert gridgran.get_parquet_bbox_filter(path, bbox) is not None
+    gdf = gridgran.read_layer(path, columns=['uprn'], bbox=bbox)
+    expected = points[points.intersects(box(*bbox))]
+    assert sorted(gdf.uprn) == sorted(expected.uprn)
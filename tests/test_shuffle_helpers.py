@@ -469,3 +469,117 @@ def test_make_cls_3_to_cls_4_FAIL(dfs, cell_configs):
             "ID500m",
             CLASSIFICATION_DICT,
         )
+
+
+def test_get_sample_sizes():
+    sizes = gridgran.get_sample_sizes(3, 100, num_iterations=25,
+                                      sample_increase_frequency=10,
+                                      number_to_increase_sample=2)
+    assert sizes.tolist() == [3] * 10 + [5] * 10 + [7] * 5
+    # Stops once fewer than twice the sample size rows remain
+    assert gridgran.get_sample_sizes(3, 12, num_iterations=100,
+                                     sample_increase_frequency=10).tolist() \
+        == [3] * 10 + [4] * 10 + [5] * 10 + [6] * 10
+
+
+def test_draw_sample_matrix():
+    sizes = np.array([2, 2, 5])
+    idx = gridgran.draw_sample_matrix(8, sizes, np.random.default_rng(0))
+    assert idx.shape == (3, 5)
+    assert all(len(set(row)) == 5 for row in idx)
+    assert np.all((idx >= 0) & (idx < 8))
+
+
+def test_select_best_sample_matches_iterating_over_samples():
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        p = rng.randint(0, 6, rng.randint(10, 60)).astype(float)
+        p_pos = p[p > 0]
+        threshold_p = rng.randint(5, 40)
+        sizes = gridgran.get_sample_sizes(rng.randint(2, 8), len(p_pos))
+        if not len(sizes):
+            continue
+        idx = gridgran.draw_sample_matrix(len(p_pos), sizes,
+                                          np.random.default_rng(0))
+        # Loop from original separate_excess_rows_in_df_cls_4()
+        best_match, expected, counter = 1000, None, 0
+        for i, size in enumerate(sizes):
+            pop = p_pos[idx[i, :size]].sum()
+            counter += 1
+            if pop - threshold_p >= 0:
+                if pop - threshold_p < best_match:
+                    best_match, expected = pop - threshold_p, i
+                if (pop / size - p.mean()) / p.mean() <= 0.05:
+                    break
+        assert gridgran.select_best_sample(p_pos, p.mean(), idx, sizes,
+                                           threshold_p) == (expected, counter)
+
+
+@pytest.mark.parametrize("cell_configs", [
+    ([0, 0, 0, 4]),
+    ([4, 4, 4, 4])
+])
+def test_separate_excess_rows_in_df_cls_4_rng(dfs, cell_configs):
+    df_grid, df_grid_pt, df = dfs
+    DF, DF_GRID_PT, DF_GRID = tests.make_any_combination(df, df_grid_pt,
+                                                         df_grid, cell_configs,
+                                                         upper_lower='upper')
+    ID = DF[DF.classification == 4].ID500m.to_list()[0]
+    df_pt = DF_GRID_PT[DF_GRID_PT.ID500m == ID]
+    df_pt_separated, _ = gridgran.separate_excess_rows_in_df_cls_4(df_pt,
+                                                                   rng=1)
+    df_pt_separated_2, _ = gridgran.separate_excess_rows_in_df_cls_4(
+        df_pt, rng=np.random.default_rng(1))
+    assert df_pt_separated.equals(df_pt_separated_2)
+
+
+def test_sample_excess_points_cls_3_keeps_first_sample_over_p_needed():
+    p = np.array([0, 3, 3, 3, 3, 3, 3, 0], dtype=float)
+    # Every sample of 2 populated rows has 6 - first sample is kept
+    sample_pos = gridgran.sample_excess_points_cls_3(p, 6, 2, rng=0)
+    assert len(sample_pos) == 2
+    assert np.all(p[sample_pos] > 0)
+    assert gridgran.sample_excess_points_cls_3(p, 100, 2, num_iterations=10,
+                                               rng=0) is None
+
+
+def test_sample_excess_points_cls_3_skips_samples_1000_over_p_needed():
+    # A communal establishment row exceeds p_needed by over 1000
+    p = np.array([2000, 10, 10, 10], dtype=float)
+    sample_pos = gridgran.sample_excess_points_cls_3(p, 10, 1, rng=0)
+    assert p[sample_pos].tolist() == [10]
+    assert gridgran.sample_excess_points_cls_3(p[:1], 10, 1, num_iterations=10,
+                                               rng=0) is None
+
+
+def test_sample_excess_points_cls_3_raises_when_sample_outgrows_rows():
+    p = np.array([1, 1, 1, 0], dtype=float)
+    with pytest.raises(gridgran.DataFrameNotOverDisclosureLimitException):
+        gridgran.sample_excess_points_cls_3(p, 2, 4, rng=0)
+    # Sample size reaches 4 on the 11th trial before p_needed is met
+    with pytest.raises(gridgran.DataFrameNotOverDisclosureLimitException):
+        gridgran.sample_excess_points_cls_3(p, 10, 3, num_iterations=20,
+                                            rng=0)
+    assert gridgran.sample_excess_points_cls_3(p, 10, 3, num_iterations=10,
+                                               rng=0) is None
+
+
+def test_change_to_random_ids():
+    points = pd.DataFrame({'ID125m': ['J80070856111'] * 500,
+                           'ID250m': ['J80070856011'] * 500,
+                           'ID500m': ['J80070856001'] * 500,
+                           'p': np.arange(500)},
+                          index=np.arange(500) + 7)
+    ids_to_change_to = [
+        {'ID125m': 'J80070856114', 'ID250m': 'J80070856014',
+         'ID500m': 'J80070856004', 'ID1000m': 'J80070856000'},
+        {'ID125m': 'J80070856224', 'ID250m': 'J80070856024',
+         'ID500m': 'J80070856004', 'ID1000m': 'J80070856000'},
+    ]
+    moved = gridgran.change_to_random_ids(points, ids_to_change_to, rng=0)
+    assert moved.index.equals(points.index)
+    assert moved.p.equals(points.p)
+    assert set(moved.ID125m) == {'J80070856114', 'J80070856224'}
+    assert np.all(moved.ID250m.str[-2:] == moved.ID125m.str[-2:])
+    assert np.all(moved.ID500m == 'J80070856004')
+    assert np.all(points.ID125m == 'J80070856111')  # Input not changed
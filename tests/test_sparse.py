@@ -0,0 +1,55 @@
+"""Unit tests for sparse.py"""
+from pathlib import Path
+
+from pandas.testing import assert_frame_equal
+import pytest
+
+import gridgran
+
+BASE = Path(__file__).resolve().parent.joinpath('data')
+gpkg = BASE.joinpath('GRID_1km_SUBSET.gpkg')
+
+CLASSIFICATION_DICT = {
+    'p_1': 10,
+    'p_2': 40,
+    'p_3': 50,
+    'h_1': 5,
+    'h_2': 20,
+    'h_3': 25,
+}
+
+
+@pytest.fixture(params=[False, True], ids=['default', 'compact_dtypes'])
+def dfs(request):
+    """Makes grid joined to points with and without sparse"""
+    df_grid, df_grid_pt = gridgran.prep_points_and_grid_dataframes(
+        gpkg, CLASSIFICATION_DICT, compact_dtypes=request.param)
+    df_grid_s, df_grid_pt_s = gridgran.prep_points_and_grid_dataframes(
+        gpkg, CLASSIFICATION_DICT, compact_dtypes=request.param, sparse=True)
+    yield df_grid, df_grid_pt, df_grid_s, df_grid_pt_s
+
+
+def test_make_sparse_removes_empty_rows(dfs):
+    df_grid, df_grid_pt, df_grid_s, df_grid_pt_s = dfs
+    assert df_grid_pt.uprn.isna().any()
+    assert df_grid_pt_s.uprn.notna().all()
+    assert_frame_equal(df_grid_pt_s, df_grid_pt[df_grid_pt.uprn.notna()])
+    assert gridgran.is_sparse(df_grid_s)
+    assert not gridgran.is_sparse(df_grid)
+    n_empty = (df_grid_s[gridgran.EMPTY_ROW_POSITION] >= 0).sum()
+    assert n_empty == df_grid_pt.uprn.isna().sum()
+
+
+def test_add_empty_rows_matches_full_cell(dfs):
+    df_grid, df_grid_pt, df_grid_s, df_grid_pt_s = dfs
+    df_grid_s, grid_offsets = gridgran.partition_by_id(df_grid_s, 'ID1000m')
+    df_grid_pt_s, pt_offsets = gridgran.partition_by_id(df_grid_pt_s,
+                                                        'ID1000m')
+    for cell_id in gridgran.get_populated_ids(df_grid_pt_s, 'ID1000m'):
+        df_grid_in_cell, df_grid_pt_in_cell = gridgran.add_empty_rows(
+            gridgran.get_partition(df_grid_s, grid_offsets, cell_id),
+            gridgran.get_partition(df_grid_pt_s, pt_offsets, cell_id))
+        assert_frame_equal(df_grid_in_cell,
+                           df_grid[df_grid.ID1000m == cell_id])
+        assert_frame_equal(df_grid_pt_in_cell,
+                           df_grid_pt[df_grid_pt.ID1000m == cell_id])
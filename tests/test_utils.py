@@ -5,6 +5,9 @@ from pathlib import Path
 import pytest
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
 from shapely.geometry import Point, MultiPolygon
 
 import gridgran
@@ -329,3 +332,69 @@ def test_get_list_of_rowsIDS_for_list_of_IDS(dfs, cell_configs):
 
     assert len(id_dicts1) == (len(ids1) * 16)
     assert len(id_dicts4) == (len(ids4) * 16)
+
+
+def test_get_id_hierarchy_for_list_of_IDS(dfs):
+    df_grid, df_grid_pt, df = dfs
+    ids = list(df.ID500m.unique()[:2])
+    df_ids = gridgran.get_id_hierarchy_for_list_of_IDS(df_grid_pt, ids,
+                                                       'ID500m')
+    ids_125 = df_grid_pt.ID125m[df_grid_pt.ID500m.isin(ids)].unique()
+    assert df_ids.ID125m.tolist() == list(ids_125)
+    for row in df_ids.itertuples():
+        first = df_grid_pt[df_grid_pt.ID125m == row.ID125m].iloc[0]
+        assert (row.ID250m, row.ID500m, row.ID1000m) == \
+            (first.ID250m, first.ID500m, first.ID1000m)
+    assert gridgran.get_list_of_rowIDS_for_list_of_IDS(
+        df_grid_pt, ids, 'ID500m') == df_ids.to_dict('records')
+
+
+def test_join_pts_to_grid_arithmetic(gdf, gdf_pt, gdf_125_pt):
+    """Test arithmetic join matches spatial join"""
+    df_grid_pt = gridgran.join_pts_to_grid(gdf, gdf_pt, method='arithmetic')
+    df_sjoin = gridgran.remove_duplicates(gdf_125_pt)
+    assert list(df_grid_pt.columns) == list(df_sjoin.columns)
+    assert len(df_grid_pt) == len(df_sjoin)
+    assert not df_grid_pt.uprn.dropna().duplicated().any()
+    assert set(df_grid_pt.ID125m) == set(gdf.ID125m)
+    sums = df_grid_pt.groupby('ID125m').p.sum()
+    sums_sjoin = df_sjoin.groupby('ID125m').p.sum()
+    assert sums.sort_index().equals(sums_sjoin.sort_index())
+
+
+@pytest.mark.parametrize("value, expected, expected_no_cls_2", [
+    (0, 0, 0),
+    (1, 1, 1),
+    (10, 1, 1),
+    (11, 2, 3),
+    (40, 2, 3),
+    (41, 3, 3),
+    (49, 3, 3),
+    (50, 4, 4),
+])
+def test_classify_values(value, expected, expected_no_cls_2):
+    """Test vectorised classification boundaries match classify_pop()"""
+    row = pd.Series({'p': value})
+    cls = gridgran.classify_values(np.array([value]), 10, 40, 49)
+    cls_no_2 = gridgran.classify_values(np.array([value]), 10, None, 49)
+    assert cls[0] == expected == gridgran.classify_pop(row,
+                                                       CLASSIFICATION_DICT)
+    assert cls_no_2[0] == expected_no_cls_2 == gridgran.classify_pop(
+        row, CLASSIFICATION_DICT_NO_CLS_2)
+
+
+@pytest.mark.parametrize("classification_dict", [
+    CLASSIFICATION_DICT,
+    CLASSIFICATION_DICT_NO_CLS_2
+])
+def test_classify_matches_row_wise_classification(gdf_125_pt,
+                                                  classification_dict):
+    """Test classify() matches applying classify functions on each row"""
+    df = gdf_125_pt.groupby('ID125m')[['p', 'h']].sum()
+    df_cls = gridgran.classify(df.copy(), classification_dict)
+    df['p_cls'] = df.apply(gridgran.classify_pop,
+                           classification_dict=classification_dict, axis=1)
+    df['h_cls'] = df.apply(gridgran.classify_households,
+                           classification_dict=classification_dict, axis=1)
+    df['classification'] = df.apply(gridgran.classify_cells, axis=1)
+    assert_frame_equal(df_cls, df)
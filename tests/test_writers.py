@@ -0,0 +1,139 @@
+"""Unit tests for writers.py"""
+import sys
+
+import numpy as np
+import geopandas as gpd
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from shapely.geometry import box
+
+import gridgran
+
+
+@pytest.fixture
+def tables():
+    """Two batches of output tables - move origin columns are all null in
+    the first batch"""
+    grids = [gpd.GeoDataFrame(
+        {'GridID': [f'J8007085600{i}', f'J8007085601{i}'],
+         'p': np.array(['*', 12.0 + i], dtype=object),
+         'h': np.array([1234.5678901234567, '*'], dtype=object)},
+        geometry=[box(i, 0, i + 1, 1), box(i, 1, i + 1, 2)], crs=27700)
+        for i in range(2)]
+    points = [
+        pd.DataFrame({'ID125m': ['J80070856311', 'J80070856111'],
+                      'uprn': [np.nan, np.nan],
+                      'p': [0.0, 0.0],
+                      'ID500m_LEVEL_MOVE_ORIGIN': [np.nan, np.nan],
+                      'dist_moved': [0.0, 0.0]}),
+        pd.DataFrame({'ID125m': ['J80070856211'],
+                      'uprn': [10],
+                      'p': [3.0],
+                      'ID500m_LEVEL_MOVE_ORIGIN': ['J80070856001'],
+                      'dist_moved': [12.5]}),
+    ]
+    yield grids, points
+
+
+def test_format_object_columns_matches_fiona(tables, tmp_path):
+    grid = tables[0][0]
+    grid.to_file(tmp_path.joinpath('fiona.gpkg'), layer='grid',
+                 driver='GPKG')
+    expected = gpd.read_file(tmp_path.joinpath('fiona.gpkg'))
+    formatted = gridgran.format_object_columns(grid)
+    assert formatted.p.tolist() == expected.p.tolist() == ['*', '12']
+    assert formatted.h.tolist() == expected.h.tolist()
+    assert grid.p.tolist() == ['*', 12.0]
+
+
+@pytest.mark.parametrize('pyogrio_installed', [True, False])
+def test_gpkg_backend_appends_and_keeps_other_layers(tables, tmp_path,
+                                                     monkeypatch,
+                                                     pyogrio_installed):
+    if not pyogrio_installed:
+        # Layers are written with fiona (gdf.to_file()) instead
+        monkeypatch.setitem(sys.modules, 'pyogrio', None)
+    grids, points = tables
+    out = tmp_path.joinpath('out.gpkg')
+    grids[0].to_file(out, layer='other', driver='GPKG')
+    backend = gridgran.GPKGOutputBackend(out, 'grid',
+                                         tmp_path.joinpath('pts.csv'))
+    for grid, pts in zip(grids, points):
+        backend.write(grid, pts, pts)
+    backend.close()
+    assert len(gpd.read_file(out, layer='other')) == 2
+    assert gpd.read_file(out, layer='grid').GridID.tolist() == \
+        pd.concat(grids).GridID.tolist()
+    assert_frame_equal(pd.read_csv(tmp_path.joinpath('pts.csv')),
+                       pd.concat(points, ignore_index=True),
+                       check_dtype=False)
+    assert tmp_path.joinpath(gridgran.POINTS_WITHOUT_EMPTY_GRIDS_CSV).exists()
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'flatgeobuf'])
+def test_backend_writes_batches(tables, tmp_path, output_format):
+    pytest.importorskip('pyarrow')
+    grids, points = tables
+    out = tmp_path.joinpath('out')
+    backend = gridgran.OUTPUT_BACKENDS[output_format](
+        out, 'grid', tmp_path.joinpath('pts.csv'))
+    for grid, pts in zip(grids, points):
+        backend.write(grid, pts, pts)
+    backend.write_layer(grids[0], gridgran.WATER_MASK_LAYER)
+    backend.close()
+    suffix = backend.layer_suffix
+    grid = gpd.read_file(out.joinpath(f'grid{suffix}')) if \
+        output_format == 'flatgeobuf' else \
+        gridgran.read_layer(out, layer='grid')
+    assert sorted(grid.GridID) == sorted(pd.concat(grids).GridID)
+    assert grid.crs == 27700
+    assert out.joinpath(f'{gridgran.WATER_MASK_LAYER}{suffix}').exists()
+    pts = pd.read_parquet(tmp_path.joinpath('pts.parquet'))
+    assert pts.ID500m_LEVEL_MOVE_ORIGIN.tolist() == \
+        [None, None, 'J80070856001']
+    assert pts.uprn.dtype == 'float64'
+    assert_frame_equal(pts, pd.concat(points, ignore_index=True),
+                       check_dtype=False)
+    assert not tmp_path.joinpath('pts.csv').exists()
+    assert tmp_path.joinpath('points_without_empty_grids.parquet').exists()
+
+
+@pytest.mark.parametrize('output_format', ['gpkg', 'parquet'])
+@pytest.mark.parametrize('point_partitions, tile',
+                         [('1km', 'J80070856'), ('10km', 'SU41')])
+def test_backend_writes_point_partitions(tables, tmp_path, output_format,
+                                         point_partitions, tile):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    grids, points = tables
+    for pts in points:
+        pts['ID1000m'] = 'J80070856000'
+    km_origins = pd.DataFrame({'x': [448000], 'y': [112000]},
+                              index=['J80070856'])
+    out = tmp_path.joinpath('out.gpkg' if output_format == 'gpkg' else
+                            'out')
+    suffix = gridgran.OUTPUT_BACKENDS[output_format].points_suffix
+    # Parts of earlier runs are removed by the first write
+    stale = tmp_path.joinpath('pts', 'tile=OLD', f'part-00000{suffix}')
+    stale.parent.mkdir(parents=True)
+    stale.touch()
+    backend = gridgran.OUTPUT_BACKENDS[output_format](
+        out, 'grid', tmp_path.joinpath('pts.csv'), point_partitions,
+        km_origins)
+    for grid, pts in zip(grids, points):
+        backend.write(grid, pts, pts)
+    backend.close()
+    dataset = tmp_path.joinpath('pts')
+    assert not stale.parent.exists()
+    parts = sorted(dataset.joinpath(f'tile={tile}').iterdir())
+    assert [x.name for x in parts] == [f'part-00000{suffix}',
+                                       f'part-00001{suffix}']
+    read = pd.read_csv if output_format == 'gpkg' else pd.read_parquet
+    assert_frame_equal(pd.concat([read(x) for x in parts],
+                                 ignore_index=True),
+                       pd.concat(points, ignore_index=True),
+                       check_dtype=False)
+    assert tmp_path.joinpath('points_without_empty_grids',
+                             f'tile={tile}').is_dir()
+    assert not tmp_path.joinpath(f'pts{suffix}').exists()